@@ -0,0 +1,87 @@
+import importlib.util
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+DATA_FORMATS = ['npy', 'parquet', 'csv']
+DATA_FORMATS_EXTENSIONS = {'npy': '', 'parquet': '.parquet', 'csv': '.csv'}
+
+
+COLUMNS_FILE = 'columns.txt'
+NULLS_FILE_SUFFIX = '.nulls'
+NUMERIC_INFERRED_TYPES = ['empty', 'integer', 'floating', 'mixed-integer-float']
+
+
+def get_data_path(base_path, data_format):
+    if data_format not in DATA_FORMATS:
+        raise Exception(f'Unknown data format "{data_format}". Use one of: {DATA_FORMATS}')
+    if data_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise Exception('The "parquet" data format needs pyarrow installed (pip install pyarrow).')
+    return base_path + DATA_FORMATS_EXTENSIONS[data_format]
+
+
+def get_typed_column(values):
+    # object columns are saved as float (numbers, with nulls as NaN) or as fixed width unicode (strings, with a
+    # separate nulls mask), so that they can also be memory mapped. Returns the values and the nulls mask (or None)
+    values = np.asarray(values)
+    if values.dtype != object:
+        return values, None
+    nulls = pd.isna(values)
+    if pd.api.types.infer_dtype(values[~nulls], skipna=True) in NUMERIC_INFERRED_TYPES:
+        return np.where(nulls, np.nan, values).astype(np.float64), None
+    values = np.where(nulls, '', values).astype(str)
+    return values, nulls if nulls.any() else None
+
+
+def save_columns(columns, path):
+    # each column is saved as a .npy file inside the path directory
+    if os.path.exists(path):
+        # only a previous output of this function is replaced
+        if not os.path.isfile(os.path.join(path, COLUMNS_FILE)):
+            raise Exception(f'Can not save the columns on "{path}": it already exists and is not a columns directory.')
+        shutil.rmtree(path)
+    os.makedirs(path)
+    for column, values in columns.items():
+        values, nulls = get_typed_column(values)
+        np.save(os.path.join(path, f'{column}.npy'), values, allow_pickle=False)
+        if nulls is not None:
+            np.save(os.path.join(path, f'{column}{NULLS_FILE_SUFFIX}.npy'), nulls, allow_pickle=False)
+    with open(os.path.join(path, COLUMNS_FILE), 'w') as f:
+        f.write('\n'.join(columns.keys()))
+
+
+def load_column(path, column, mmap_mode='r'):
+    values = np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+    nulls_file = os.path.join(path, f'{column}{NULLS_FILE_SUFFIX}.npy')
+    if os.path.exists(nulls_file):
+        values = values.astype(object)
+        values[np.load(nulls_file, allow_pickle=False)] = None
+    return values
+
+
+def load_columns(path, mmap_mode='r'):
+    with open(os.path.join(path, COLUMNS_FILE), 'r') as f:
+        columns = [column for column in f.read().split('\n') if column]
+    return {column: load_column(path, column, mmap_mode=mmap_mode) for column in columns}
+
+
+def save_data_frame(data_frame, base_path, data_format):
+    path = get_data_path(base_path, data_format)
+    if data_format == 'npy':
+        save_columns({column: data_frame[column].to_numpy() for column in data_frame.columns}, path)
+    elif data_format == 'parquet':
+        data_frame.to_parquet(path, index=False)
+    else:
+        data_frame.to_csv(path, index=False)
+    return path
+
+
+def load_data_frame(path, mmap_mode='r'):
+    if os.path.isdir(path):
+        return pd.DataFrame(load_columns(path, mmap_mode=mmap_mode))
+    if path.endswith(DATA_FORMATS_EXTENSIONS['parquet']):
+        return pd.read_parquet(path, memory_map=mmap_mode is not None)
+    return pd.read_csv(path)
@@ -1,18 +1,46 @@
 #!/usr/bin/env python
+import concurrent.futures
+import datetime
 import functools
 import hashlib
 import importlib
+import inspect
 import json
+import shutil
 import sys
+import tempfile
 
 import requests
 
+from benchmark_tools.traces.metrics_engine import TraceMetricsEngine
+from benchmark_tools.traces.trace_store import JaegerTraceStore
+
+
+EVALUATION_EXECUTORS = {
+    'thread': concurrent.futures.ThreadPoolExecutor,
+    'process': concurrent.futures.ProcessPoolExecutor,
+}
+DEFAULT_EVALUATION_EXECUTOR = 'thread'
+
 
 def replace_args_kwargs_vals_with_target_systems_confs(value, benchmark):
     return value
 
 
-def get_tasks(benchmark):
+def add_run_function_injected_kwargs(run_function, run_kwargs, injected_kwargs):
+    # injects run-scoped objects (eg: trace_store) only on the run functions that accept them,
+    # without changing the original kwargs (those are part of the benchmark results)
+    run_parameters = inspect.signature(run_function).parameters
+    run_kwargs = dict(run_kwargs)
+    for kwarg, value in injected_kwargs.items():
+        if kwarg in run_parameters:
+            run_kwargs.setdefault(kwarg, value)
+    return run_kwargs
+
+
+def get_tasks(benchmark, injected_kwargs=None):
+    if injected_kwargs is None:
+        injected_kwargs = {}
     # 'benchmark_tools.task_generator.'
     for task in benchmark.get('tasks', []):
         task_python_path = task.get('module')
@@ -22,12 +50,15 @@ def get_tasks(benchmark):
         # task_actions = task.get('actions', [])
         # task_kwargs['actions'] = task_actions
         task_run_function = getattr(task_module, 'run')
+        task_kwargs = add_run_function_injected_kwargs(task_run_function, task_kwargs, injected_kwargs)
         task_function_prepared = functools.partial(task_run_function, *task_args, **task_kwargs)
         # task['function'] = task_function_prepared
         yield (task, task_function_prepared)
 
 
-def get_evaluations(benchmark):
+def get_evaluations(benchmark, injected_kwargs=None):
+    if injected_kwargs is None:
+        injected_kwargs = {}
     # 'benchmark_tools.task_generator.'
     for evaluation in benchmark.get('evaluations', []):
         evaluation_python_path = evaluation.get('module')
@@ -37,26 +68,149 @@ def get_evaluations(benchmark):
         # threshold_functions = evaluation.get('threshold_functions', {})
         # task_kwargs['threshold_functions'] = threshold_functions
         evaluation_run_function = getattr(evaluation_module, 'run')
+        evaluation_kwargs = add_run_function_injected_kwargs(
+            evaluation_run_function, evaluation_kwargs, injected_kwargs)
         evaluation_function_prepared = functools.partial(
             evaluation_run_function, *evaluation_args, **evaluation_kwargs)
         # evaluation['function'] = evaluation_function_prepared
         yield (evaluation, evaluation_function_prepared)
 
 
-def run_tasks(benchmark, target_system):
-    for task_data, task in get_tasks(benchmark):
+def register_evaluations_aggregations(benchmark, injected_kwargs):
+    # evaluations register their trace aggregations before any of them runs,
+    # so that each query traces are streamed only once for all of them
+    for evaluation in benchmark.get('evaluations', []):
+        evaluation_module = importlib.import_module(evaluation.get('module'))
+        register_function = getattr(evaluation_module, 'register_aggregations', None)
+        if register_function is None:
+            continue
+        evaluation_kwargs = add_run_function_injected_kwargs(
+            register_function, evaluation.get('kwargs', {}), injected_kwargs)
+        try:
+            register_function(*evaluation.get('args', []), **evaluation_kwargs)
+        except Exception as e:
+            # the evaluation will still register (and report any error) when it runs
+            print(f'Failed to register aggregations for evaluation {evaluation["module"]}: {e}')
+
+
+def run_tasks(benchmark, target_system, injected_kwargs=None):
+    for task_data, task in get_tasks(benchmark, injected_kwargs=injected_kwargs):
         print(f'Running task: {task_data["module"]}')
         task()
 
 
-def run_evaluations(benchmark, target_system):
-    evaluations_result = {'passed': True}
-    for evaluation_data, evaluation in get_evaluations(benchmark):
-        print(f'Running evaluation: {evaluation_data["module"]}')
+def stop_background_tasks(background_tasks):
+    # background tasks (eg: subscriptions exporters) are stopped and drained before the evaluations start
+    for task in background_tasks:
+        print(f'Stopping background task: {task.__class__.__name__}')
         try:
-            result = evaluation()
+            task.stop()
         except Exception as e:
-            result = {'passed': False, 'error': str(e)}
+            print(f'Failed to stop background task {task.__class__.__name__}: {e}')
+
+
+def run_evaluation(evaluation):
+    try:
+        result = evaluation()
+    except Exception as e:
+        result = {'passed': False, 'error': str(e)}
+    return result
+
+
+def run_evaluations_sequentially(evaluations):
+    results = []
+    for evaluation_data, evaluation in evaluations:
+        print(f'Running evaluation: {evaluation_data["module"]}')
+        results.append((evaluation_data, run_evaluation(evaluation)))
+    return results
+
+
+def get_evaluation_executor(executors, evaluation_data, max_workers):
+    executor_type = evaluation_data.get('executor', DEFAULT_EVALUATION_EXECUTOR)
+    if executor_type not in EVALUATION_EXECUTORS:
+        raise Exception(f'Unknown evaluation executor "{executor_type}". Use one of: {list(EVALUATION_EXECUTORS)}')
+    if executor_type not in executors:
+        executors[executor_type] = EVALUATION_EXECUTORS[executor_type](max_workers=max_workers)
+    return executors[executor_type]
+
+
+def run_evaluations_concurrently(evaluations, max_workers):
+    executors = {}
+    submitted = []
+    try:
+        for evaluation_data, evaluation in evaluations:
+            print(f'Submitting evaluation: {evaluation_data["module"]}')
+            try:
+                executor = get_evaluation_executor(executors, evaluation_data, max_workers)
+                future = executor.submit(run_evaluation, evaluation)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            submitted.append((evaluation_data, future))
+
+        results = []
+        for evaluation_data, future in submitted:
+            try:
+                result = future.result()
+            except Exception as e:
+                # errors raised outside of the evaluation itself, e.g.: a broken process pool
+                result = {'passed': False, 'error': str(e)}
+            results.append((evaluation_data, result))
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+    return results
+
+
+def create_trace_store(benchmark, start_time=None, end_time=None):
+    trace_store_configs = benchmark.get('trace_store', {})
+    cache_dir = trace_store_configs.get('cache_dir')
+    if cache_dir is None:
+        # run-scoped cache, so each query is fetched from jaeger only once for all the passes and evaluations
+        # (including the ones on other processes), removed by remove_trace_store_run_cache
+        cache_dir = tempfile.mkdtemp(prefix='trace_store_')
+    return JaegerTraceStore(
+        cache_dir=cache_dir,
+        slice_seconds=trace_store_configs.get('slice_seconds'),
+        max_workers=trace_store_configs.get('max_workers'),
+        connect_timeout=trace_store_configs.get('connect_timeout'),
+        read_timeout=trace_store_configs.get('read_timeout'),
+        start_time=start_time,
+        end_time=end_time,
+        logging_level=trace_store_configs.get('logging_level', 'ERROR')
+    )
+
+
+def remove_trace_store_run_cache(benchmark, trace_store):
+    if benchmark.get('trace_store', {}).get('cache_dir') is None:
+        shutil.rmtree(trace_store.cache_dir, ignore_errors=True)
+
+
+def create_metrics_engine(benchmark, trace_store):
+    trace_store_configs = benchmark.get('trace_store', {})
+    return TraceMetricsEngine(
+        trace_store=trace_store,
+        chunk_size=trace_store_configs.get('chunk_size'),
+        logging_level=trace_store_configs.get('logging_level', 'ERROR')
+    )
+
+
+def run_evaluations(benchmark, target_system, trace_store=None, metrics_engine=None):
+    evaluations_result = {'passed': True}
+    injected_kwargs = {}
+    if trace_store is not None:
+        injected_kwargs['trace_store'] = trace_store
+    if metrics_engine is not None:
+        injected_kwargs['metrics_engine'] = metrics_engine
+        register_evaluations_aggregations(benchmark, injected_kwargs)
+    evaluations = list(get_evaluations(benchmark, injected_kwargs=injected_kwargs))
+    max_workers = int(benchmark.get('evaluations_max_workers', 1))
+    if max_workers > 1 and len(evaluations) > 1:
+        results = run_evaluations_concurrently(evaluations, max_workers)
+    else:
+        results = run_evaluations_sequentially(evaluations)
+
+    for evaluation_data, result in results:
         evaluations_result[evaluation_data['module']] = result
         if result['passed'] is False:
             evaluations_result['passed'] = False
@@ -65,8 +219,26 @@ def run_evaluations(benchmark, target_system):
 
 # this is just a mocked method for running the benchmark
 def start_benchmark(benchmark, target_system):
-    run_tasks(benchmark, target_system)
-    evaluation = run_evaluations(benchmark, target_system)
+    benchmark_start_time = datetime.datetime.now().timestamp()
+    background_tasks = []
+    run_tasks(benchmark, target_system, injected_kwargs={
+        'benchmark_start_time': benchmark_start_time,
+        'background_tasks': background_tasks,
+    })
+    stop_background_tasks(background_tasks)
+    benchmark_end_time = datetime.datetime.now().timestamp()
+    print(f'Finished tasks. Benchmark time window: {benchmark_start_time} -> {benchmark_end_time}')
+    trace_store = create_trace_store(benchmark, start_time=benchmark_start_time, end_time=benchmark_end_time)
+    try:
+        metrics_engine = create_metrics_engine(benchmark, trace_store)
+        evaluation = run_evaluations(
+            benchmark, target_system, trace_store=trace_store, metrics_engine=metrics_engine)
+        for query_key, stats in trace_store.ingestion_stats.items():
+            print(f'Traces ingestion for {query_key[1:4]}: {stats}')
+        for query_key, passes in metrics_engine.query_passes.items():
+            print(f'Trace aggregations passes for {query_key[1:4]}: {passes}')
+    finally:
+        remove_trace_store_run_cache(benchmark, trace_store)
     return evaluation
 
 
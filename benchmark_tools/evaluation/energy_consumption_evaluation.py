@@ -8,6 +8,7 @@ import statistics
 import requests
 
 from benchmark_tools.evaluation.base import BaseEvaluation
+from benchmark_tools.traces.trace_store import JaegerTraceStore
 
 
 class EnergyConsumptionEvaluation(BaseEvaluation):
@@ -15,17 +16,13 @@ class EnergyConsumptionEvaluation(BaseEvaluation):
     ENERGY_GRID_WEBSERVICE_GET_ENERGY_ENDPOINT = (
         '/api/get-energy?starttimestamp={start_timestamp}&endtimestamp={end_timestamp}&device={device_id}'
     )
-    JAEGER_TRACES_URL_FORMAT = (
-        'api/traces?'
-        'limit=700000000&lookback=10h&maxDuration&minDuration&'
-        'service={service}&operation={operation}'
-    )
-    JAEGER_TAGS_URL_FORMAT = '&tags={tags}'
-    JAEGER_TRACES_URL_WITH_TAGS_FORMAT = JAEGER_TRACES_URL_FORMAT + JAEGER_TAGS_URL_FORMAT
 
     def __init__(self, *args, **kwargs):
         super(EnergyConsumptionEvaluation, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs.get('jaeger_api_host')
+        self.trace_store = kwargs.get('trace_store')
+        if self.trace_store is None:
+            self.trace_store = JaegerTraceStore(logging_level=self.logging_level)
 
         self.jaeger_traces_configs = kwargs.get('jaeger_traces_configs', None)
         if self.jaeger_traces_configs is None:
@@ -85,17 +82,8 @@ class EnergyConsumptionEvaluation(BaseEvaluation):
             f'Geting event trace ts (start={first})'
             f' from Jaeger "{self.jaeger_api_host}" first "{operation}" on service "{service}"'
         )
-        if tags is None:
-            end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-                service=service, operation=operation)
-        else:
-            tags_json = json.dumps(tags)
-            end_point = self.JAEGER_TRACES_URL_WITH_TAGS_FORMAT.format(
-                service=service, operation=operation, tags=tags_json)
-
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
-        req = requests.get(traces_url)
-        traces = req.json()['data']
+        traces = self.trace_store.get_traces(
+            self.jaeger_api_host, service=service, operation=operation, tags=tags, lookback='10h')
         ordered_traces = self.order_traces(traces)
         trace_timestamp = None
         if first:
@@ -189,10 +177,12 @@ def run(
         save_readings_on=None,
         end_time=None,
         jaeger_api_host=None,
-        jaeger_traces_configs=None):
+        jaeger_traces_configs=None,
+        trace_store=None):
 
     evaluation = EnergyConsumptionEvaluation(
         jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
         jaeger_traces_configs=jaeger_traces_configs,
         energy_grid_api_host=energy_grid_api_host,
         start_time=start_time,
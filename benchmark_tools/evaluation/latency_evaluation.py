@@ -1,61 +1,58 @@
-import statistics
-from functools import reduce
-import requests
-
 from benchmark_tools.evaluation.base import BaseEvaluation
+from benchmark_tools.traces.metrics_engine import TraceLatencyAggregation, TraceMetricsEngine
+from benchmark_tools.traces.trace_store import JaegerTraceStore
 
 
 class LatencyEvaluation(BaseEvaluation):
-    JAEGER_TRACES_URL_FORMAT = (
-        'api/traces?'
-        'limit=700000000&lookback=6h&maxDuration&minDuration&'
-        'operation={operation}&service={service}'
-    )
 
     def __init__(self, *args, **kwargs):
         super(LatencyEvaluation, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.trace_store = kwargs.get('trace_store')
+        if self.trace_store is None:
+            self.trace_store = JaegerTraceStore(logging_level=self.logging_level)
+        self.metrics_engine = kwargs.get('metrics_engine')
+        if self.metrics_engine is None:
+            self.metrics_engine = TraceMetricsEngine(trace_store=self.trace_store, logging_level=self.logging_level)
+        self.latency_aggregation = None
 
-    def calculate_average(self, values):
-        return reduce(lambda a, b: a + b, values) / len(values)
-
-    def get_trace_latency(self, trace):
-        first_start_time = trace['spans'][0]['startTime']
-        last_start_time = trace['spans'][-1]['startTime']
-        last_duration = trace['spans'][-1]['duration']
-        total_trace_time_mm_sec = (last_start_time + last_duration) - first_start_time
-        total_trace_time_sec = total_trace_time_mm_sec / 10**6
-        return total_trace_time_sec
+    def register_aggregations(self):
+        self.latency_aggregation = self.metrics_engine.register(
+            TraceLatencyAggregation(),
+            self.jaeger_api_host, service='Forwarder', operation='tracer_injection', lookback='6h')
 
-    def get_traces(self):
-        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-            operation='tracer_injection', service='Forwarder')
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
-        req = requests.get(traces_url)
-        traces = req.json()['data']
-        return traces
-
-    def calculate_latency_metrics(self, traces):
-        self.logger.debug(f'Total event traces being analysed: {len(traces)} ')
-        latencies = [self.get_trace_latency(trace) for trace in traces]
-        latency_avg = self.calculate_average(latencies)
-        latency_std = statistics.stdev(latencies)
+    def calculate_latency_metrics(self, latencies):
+        self.logger.debug(f'Total event traces being analysed: {latencies["count"]} ')
         return {
-            'latency_avg': latency_avg,
-            'latency_std': latency_std,
-            'data_points': len(latencies),
+            'latency_avg': latencies['avg'],
+            'latency_std': latencies['std'],
+            'data_points': latencies['count'],
         }
 
     def run(self):
         self.logger.debug('Evaluation for Latency is running...')
-        traces = self.get_traces()
-        results = self.calculate_latency_metrics(traces)
+        self.register_aggregations()
+        latencies = self.metrics_engine.get_result(self.latency_aggregation)
+        results = self.calculate_latency_metrics(latencies)
         return self.verify_thresholds(results)
 
 
-def run(jaeger_api_host, threshold_functions, logging_level):
+def register_aggregations(jaeger_api_host, threshold_functions, logging_level, trace_store=None, metrics_engine=None):
+    evaluation = LatencyEvaluation(
+        jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
+        threshold_functions=threshold_functions,
+        logging_level=logging_level
+    )
+    evaluation.register_aggregations()
+
+
+def run(jaeger_api_host, threshold_functions, logging_level, trace_store=None, metrics_engine=None):
     evaluation = LatencyEvaluation(
         jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
         threshold_functions=threshold_functions,
         logging_level=logging_level
     )
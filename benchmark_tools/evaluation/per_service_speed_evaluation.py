@@ -1,68 +1,45 @@
-import statistics
-from functools import reduce
 import requests
 
 from benchmark_tools.evaluation.base import BaseEvaluation
+from benchmark_tools.traces.metrics_engine import OperationDurationsAggregation, TraceMetricsEngine
+from benchmark_tools.traces.trace_store import JaegerTraceStore
 
 
 class PerServiceSpeedEvaluation(BaseEvaluation):
-    JAEGER_TRACES_URL_FORMAT = (
-        'api/traces?'
-        'limit=700000000&lookback=6h&maxDuration&minDuration&'
-        'service={service}'
-    )
     JAEGER_OPERATIONS_URL_FORMAT = 'api/services/{service}/operations'
     JAEGER_SERVICES_URL = 'api/services'
 
     def __init__(self, *args, **kwargs):
         super(PerServiceSpeedEvaluation, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.trace_store = kwargs.get('trace_store')
+        if self.trace_store is None:
+            self.trace_store = JaegerTraceStore(logging_level=self.logging_level)
+        self.metrics_engine = kwargs.get('metrics_engine')
+        if self.metrics_engine is None:
+            self.metrics_engine = TraceMetricsEngine(trace_store=self.trace_store, logging_level=self.logging_level)
         services = kwargs['services']
         if services == 'all':
             services = self.get_services()
         self.services = services
+        self.durations_aggregations = {}
 
-    def calculate_average(self, values):
-        return reduce(lambda a, b: a + b, values) / len(values)
-
-    def get_service_process_id(self, trace, service):
-        for p_id, process in trace['processes'].items():
-            if process['serviceName'] == service:
-                return p_id
-
-    def get_traces_operations_speed(self, traces, service):
-        results_per_operation = {}
-        for trace in traces:
-            service_process_id = self.get_service_process_id(trace, service)
-            for span in trace['spans']:
-                if span['processID'] == service_process_id:
-                    duration_micro_sec = span['duration']
-                    operation = span['operationName']
-                    results_per_operation.setdefault(operation, []).append(duration_micro_sec)
-        return results_per_operation
+    def register_aggregations(self):
+        for service in self.services:
+            if 'jaeger' in service:
+                continue
+            self.durations_aggregations[service] = self.metrics_engine.register(
+                OperationDurationsAggregation(service), self.jaeger_api_host, service=service, lookback='6h')
 
     def calculate_service_operations_average_and_std(self, results_per_operation, service):
         results = {}
-        for operation, values in results_per_operation.items():
-            # avg = self.calculate_average(values)
-            # std = statistics.stdev(values)
-            avg = self.calculate_average(values) / 10**6
-            results[f'{service}_{operation}_avg'] = avg
-            try:
-                std = statistics.stdev([v / 10**6 for v in values])
-                results[f'{service}_{operation}_std'] = std
-            except:
-                pass
+        for operation, durations in results_per_operation.items():
+            results[f'{service}_{operation}_avg'] = durations['avg']
+            if durations['std'] is not None:
+                results[f'{service}_{operation}_std'] = durations['std']
 
         return results
 
-    def get_traces_per_service(self, service):
-        end_point = self.JAEGER_TRACES_URL_FORMAT.format(service=service)
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
-        req = requests.get(traces_url)
-        traces = req.json()['data']
-        return traces
-
     def get_traces_from_file(self, service):
         with open('....e2e_early_filtering_pipeline/AnyCars/cloudseg/AdaptivePublisher-process_next_frame.json', 'r') as f:
             return json.load(f)['data']
@@ -81,33 +58,35 @@ class PerServiceSpeedEvaluation(BaseEvaluation):
         services = req.json()['data']
         return services
 
-    def calculate_service_operations_latency_metrics(self, traces, service):
-        self.logger.debug(f'Total event traces being analysed: {len(traces)} ')
-        latencies = [self.get_trace_latency(trace) for trace in traces]
-        latency_avg = self.calculate_average(latencies)
-        latency_std = statistics.stdev(latencies)
-        return {
-            'latency_avg': latency_avg,
-            'latency_std': latency_std,
-        }
-
     def run(self):
         self.logger.debug('Evaluation for Services Speed is running...')
         results = {}
-        for service in self.services:
-            if 'jaeger' in service:
-                continue
-            traces = self.get_traces_per_service(service)
-            # traces = self.get_traces_from_file(service)
-            results_per_operation = self.get_traces_operations_speed(traces, service)
+        self.register_aggregations()
+        for service, durations_aggregation in self.durations_aggregations.items():
+            results_per_operation = self.metrics_engine.get_result(durations_aggregation)
             averaged_results = self.calculate_service_operations_average_and_std(results_per_operation, service)
             results.update(averaged_results)
         return self.verify_thresholds(results)
 
 
-def run(jaeger_api_host, services, threshold_functions, logging_level):
+def register_aggregations(jaeger_api_host, services, threshold_functions, logging_level,
+                          trace_store=None, metrics_engine=None):
+    evaluation = PerServiceSpeedEvaluation(
+        jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
+        services=services,
+        threshold_functions=threshold_functions,
+        logging_level=logging_level
+    )
+    evaluation.register_aggregations()
+
+
+def run(jaeger_api_host, services, threshold_functions, logging_level, trace_store=None, metrics_engine=None):
     evaluation = PerServiceSpeedEvaluation(
         jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
         services=services,
         threshold_functions=threshold_functions,
         logging_level=logging_level
@@ -1,41 +1,30 @@
-import requests
-
 from benchmark_tools.evaluation.base import BaseEvaluation
+from benchmark_tools.traces.metrics_engine import TraceMetricsEngine, TracesWithOperationAggregation
+from benchmark_tools.traces.trace_store import JaegerTraceStore
 
 
 class SchedulerLoadSheddingEvaluation(BaseEvaluation):
-    JAEGER_TRACES_URL_FORMAT = (
-        'api/traces?'
-        'limit=700000000&lookback=6h&maxDuration&minDuration&'
-        'operation={operation}&service={service}'
-    )
 
     def __init__(self, *args, **kwargs):
         super(SchedulerLoadSheddingEvaluation, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.trace_store = kwargs.get('trace_store')
+        if self.trace_store is None:
+            self.trace_store = JaegerTraceStore(logging_level=self.logging_level)
+        self.metrics_engine = kwargs.get('metrics_engine')
+        if self.metrics_engine is None:
+            self.metrics_engine = TraceMetricsEngine(trace_store=self.trace_store, logging_level=self.logging_level)
+        self.load_shedding_aggregation = None
 
-    def get_traces(self):
-        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-            operation='process_data_event', service='Scheduler')
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
-        req = requests.get(traces_url)
-        traces = req.json()['data']
-        return traces
-
-    def has_load_shedding(self, trace):
-        for span in trace['spans']:
-            if 'log_event_load_shedding' == span['operationName']:
-                return True
-        return False
+    def register_aggregations(self):
+        self.load_shedding_aggregation = self.metrics_engine.register(
+            TracesWithOperationAggregation('log_event_load_shedding'),
+            self.jaeger_api_host, service='Scheduler', operation='process_data_event', lookback='6h')
 
-    def get_total_load_shedding(self, traces):
-        traces_with_load_shedding = [t for t in traces if self.has_load_shedding(t)]
-        return len(traces_with_load_shedding)
-
-    def calculate_load_shedding_rate(self, traces):
-        total_traces = len(traces)
+    def calculate_load_shedding_rate(self, load_shedding):
+        total_traces = load_shedding['total_traces']
         self.logger.debug(f'Total event traces being analysed: {total_traces} ')
-        total_load_shedding = self.get_total_load_shedding(traces)
+        total_load_shedding = load_shedding['traces_with_operation']
         load_shedding_rate = total_load_shedding / total_traces
         return {
             'load_shedding_rate': load_shedding_rate,
@@ -44,14 +33,28 @@ class SchedulerLoadSheddingEvaluation(BaseEvaluation):
 
     def run(self):
         self.logger.debug('Evaluation for Scheduler overall Load Shedding Rate is running...')
-        traces = self.get_traces()
-        results = self.calculate_load_shedding_rate(traces)
+        self.register_aggregations()
+        load_shedding = self.metrics_engine.get_result(self.load_shedding_aggregation)
+        results = self.calculate_load_shedding_rate(load_shedding)
         return self.verify_thresholds(results)
 
 
-def run(jaeger_api_host, threshold_functions, logging_level):
+def register_aggregations(jaeger_api_host, threshold_functions, logging_level, trace_store=None, metrics_engine=None):
+    evaluation = SchedulerLoadSheddingEvaluation(
+        jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
+        threshold_functions=threshold_functions,
+        logging_level=logging_level
+    )
+    evaluation.register_aggregations()
+
+
+def run(jaeger_api_host, threshold_functions, logging_level, trace_store=None, metrics_engine=None):
     evaluation = SchedulerLoadSheddingEvaluation(
         jaeger_api_host=jaeger_api_host,
+        trace_store=trace_store,
+        metrics_engine=metrics_engine,
         threshold_functions=threshold_functions,
         logging_level=logging_level
     )
@@ -1,28 +1,134 @@
+import concurrent.futures
 import json
 import copy
 import os
-import random
 
-import requests
+import numpy as np
 import pandas as pd
 
+from benchmark_tools.columnar_data import get_data_path, save_columns, save_data_frame
 from benchmark_tools.evaluation.base import BaseEvaluation
+from benchmark_tools.traces.trace_store import JaegerTraceStore
+
+
+def draw_delta_variations(random_generator, size):
+    return random_generator.integers(-100, 101, size=size) / 100
+
+
+def simulate_workers_queues(worker_codes, processing_time, workers_last_end_time):
+    # worker_codes are sorted, and the events of each worker are ordered by their scheduled time.
+    # Each event starts 4 micro seconds after the previous event of its worker ends (or after its last processed event).
+    # The start and end times are a prefix-sum of [last_end_time, 4, processing_time, 4, processing_time, ...],
+    # which accumulates in the same order as a sequential queue does. The loop is only over the workers: a single
+    # grouped cumsum over all of them would subtract prefix sums of other workers absolute timestamps (~10**15 us),
+    # losing the exact sequential queue times.
+    # processing_time may have leading dimensions (e.g.: monte carlo samples), the queues are on its last axis.
+    worker_start_time = np.empty(processing_time.shape)
+    worker_end_time = np.empty(processing_time.shape)
+    workers_boundaries = np.flatnonzero(np.diff(worker_codes)) + 1
+    workers_starts = np.concatenate(([0], workers_boundaries)) if len(worker_codes) else []
+    workers_ends = np.concatenate((workers_boundaries, [len(worker_codes)])) if len(worker_codes) else []
+    for start, end in zip(workers_starts, workers_ends):
+        queue_steps = np.empty(processing_time.shape[:-1] + (2 * (end - start) + 1,))
+        queue_steps[..., 0] = workers_last_end_time[worker_codes[start]]
+        queue_steps[..., 1::2] = 4
+        queue_steps[..., 2::2] = processing_time[..., start:end]
+        queue_times = np.cumsum(queue_steps, axis=-1)
+        worker_start_time[..., start:end] = queue_times[..., 1::2]
+        worker_end_time[..., start:end] = queue_times[..., 2::2]
+    return worker_start_time, worker_end_time
+
+
+def get_samples_mean_and_std(constant_values, samples_values):
+    # mean and sample std of the constant values together with each sample values (parallel variance)
+    count = len(constant_values) + samples_values.shape[-1]
+    constant_sum = constant_values.sum()
+    constant_mean = constant_sum / len(constant_values) if len(constant_values) else 0
+    samples_mean = samples_values.mean(axis=-1) if samples_values.shape[-1] else np.zeros(samples_values.shape[0])
+    mean = (constant_sum + samples_values.sum(axis=-1)) / count
+    m2 = (
+        ((constant_values - constant_mean) ** 2).sum() + len(constant_values) * (constant_mean - mean) ** 2 +
+        ((samples_values - samples_mean[:, None]) ** 2).sum(axis=-1) +
+        samples_values.shape[-1] * (samples_mean - mean) ** 2
+    )
+    return mean, np.sqrt(m2 / (count - 1))
+
+
+def simulate_monte_carlo_samples(schedule, n_samples, seed):
+    # replays the trace-derived schedule n_samples times (one per row) with independent worker profile variations
+    random_generator = np.random.default_rng(seed)
+    profile = schedule['workers_profile']
+    n_workers = len(profile['throughput'])
+    proc_codes = schedule['proc_worker_codes']
+    proc_time_sec = schedule['proc_processing_time_sec']
+    non_proc_codes = schedule['non_proc_worker_codes']
+
+    # processed events only vary on their energy consumption
+    proc_energy_consumption = profile['energy_consumption'][proc_codes] + profile['energy_consumption_std'][
+        proc_codes] * draw_delta_variations(random_generator, (n_samples, len(proc_codes)))
+    proc_energy_w_s = proc_time_sec * proc_energy_consumption
+
+    # non processed events vary on their throughput (and so on their queues times) and energy consumption
+    non_proc_throughput = profile['throughput'][non_proc_codes] + profile['throughput_std'][
+        non_proc_codes] * draw_delta_variations(random_generator, (n_samples, len(non_proc_codes)))
+    non_proc_processing_time = (10**6) / non_proc_throughput
+    _, non_proc_end_time = simulate_workers_queues(
+        non_proc_codes, non_proc_processing_time, schedule['workers_last_end_time'])
+    non_proc_time_sec = non_proc_processing_time / 10**6
+    non_proc_energy_consumption = profile['energy_consumption'][non_proc_codes] + profile['energy_consumption_std'][
+        non_proc_codes] * draw_delta_variations(random_generator, (n_samples, len(non_proc_codes)))
+    non_proc_energy_w_s = non_proc_time_sec * non_proc_energy_consumption
+
+    if len(non_proc_codes):
+        extended_exp_time = non_proc_end_time.max(axis=-1) / 10**6 - schedule['init_exp_timestamp_sec']
+    else:
+        extended_exp_time = np.full(n_samples, np.nan)
+    ext_sys_throughput = schedule['total_processed'] / extended_exp_time
+
+    processing_energy_kwh = (proc_energy_w_s.sum(axis=-1) + non_proc_energy_w_s.sum(axis=-1)) / 1000 / 3600
+    workers_processing_time_sec = np.zeros((n_samples, n_workers))
+    workers_processing_time_sec += np.bincount(proc_codes, weights=proc_time_sec, minlength=n_workers)
+    if len(non_proc_codes):
+        workers_starts = np.concatenate(([0], np.flatnonzero(np.diff(non_proc_codes)) + 1))
+        workers_processing_time_sec[:, non_proc_codes[workers_starts]] += np.add.reduceat(
+            non_proc_time_sec, workers_starts, axis=-1)
+    used_workers = np.zeros(n_workers, dtype=bool)
+    used_workers[proc_codes] = True
+    used_workers[non_proc_codes] = True
+    standby_kw = profile['energy_consumption_standby'] / 1000
+    used_workers_standby_kwh = (
+        (extended_exp_time[:, None] - workers_processing_time_sec[:, used_workers]) / 3600 * standby_kw[used_workers]
+    ).sum(axis=-1)
+    non_used_workers_standby_kwh = standby_kw[~used_workers].sum() * extended_exp_time / 3600
+    total_energy_kwh = processing_energy_kwh + used_workers_standby_kwh + non_used_workers_standby_kwh
+
+    non_proc_latency = (non_proc_end_time - schedule['non_proc_init_time']) / 10**6
+    ext_latency_avg, ext_latency_std = get_samples_mean_and_std(schedule['proc_latency'], non_proc_latency)
+    return {
+        'total_energy_kwh': total_energy_kwh,
+        'ext_sys_throughput': ext_sys_throughput,
+        'ext_latency_avg': ext_latency_avg,
+        'ext_latency_std': ext_latency_std,
+    }
 
 
 class WorkersSchedulingEvaluation(BaseEvaluation):
 
     W_TO_KW = 1 / 1000
     KW_TO_KWH = 1 / 3600
-
-    JAEGER_TRACES_URL_FORMAT = (
-        'api/traces?'
-        'limit=700000000&lookback=6h&maxDuration&minDuration&'
-        'operation={operation}&service={service}'
-    )
+    WORKER_STREAM_KEY_TAG = 'message_bus.destination'
+    MONTE_CARLO_CHUNK_SAMPLES = 50
+    EVENT_DETAILS_FIELDS = [
+        'worker_stream_key', 'init_time', 'worker_start_time', 'worker_end_time', 'worker_end_time_sec',
+        'worker_duration', 'worker_finished_process', 'scheduled_time',
+    ]
 
     def __init__(self, *args, **kwargs):
         super(WorkersSchedulingEvaluation, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.trace_store = kwargs.get('trace_store')
+        if self.trace_store is None:
+            self.trace_store = JaegerTraceStore(logging_level=self.logging_level)
         self.output_path = kwargs['output_path']
         self.workers_configuration_profile = kwargs['workers_configuration_profile']
 
@@ -40,15 +146,26 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
         self.apply_worker_config_variation = kwargs['apply_worker_config_variation']
         if self.apply_worker_config_variation is None:
             self.apply_worker_config_variation = False
-
-        self.output_events_csv_file = os.path.join(self.output_path, f'events_results.csv')
-        self.output_non_proc_events_csv_file = os.path.join(self.output_path, f'non_proc_events_results.csv')
-        self.output_all_events_csv_file = os.path.join(self.output_path, f'all_events_results.csv')
-        self.output_non_proc_events_json_file = os.path.join(self.output_path, f'non_processed_events.json')
+        self.random_seed = kwargs.get('random_seed')
+        self.random_generator = np.random.default_rng(self.random_seed)
+        self.monte_carlo_samples = kwargs.get('monte_carlo_samples') or 0
+        self.monte_carlo_max_workers = kwargs.get('monte_carlo_max_workers') or 1
+        self.monte_carlo_confidence = kwargs.get('monte_carlo_confidence') or 0.95
+
+        # columnar binary formats (npy/parquet) are much faster to write and load than csv on big runs
+        self.intermediary_data_format = kwargs.get('intermediary_data_format') or 'npy'
+        get_data_path(self.output_path, self.intermediary_data_format)
+        self.output_events_base_path = os.path.join(self.output_path, 'events_results')
+        self.output_non_proc_events_base_path = os.path.join(self.output_path, 'non_proc_events_results')
+        self.output_all_events_base_path = os.path.join(self.output_path, 'all_events_results')
+        self.output_non_proc_events_json_file = os.path.join(self.output_path, 'non_processed_events.json')
+        self.output_non_proc_events_columns_path = os.path.join(self.output_path, 'non_processed_events')
 
         self.total_hours_in_year = 8760
         self.total_traces = 0
         self.non_proccessed_traces_by_workers = {k: [] for k in self.workers_configuration_profile.keys()}
+        self.non_proc_events_details = None
+        self.queued_non_proc_events_details = None
         self.base_results_df = None
         self.non_proc_base_results_df = None
         self.merged_df = None
@@ -87,113 +204,118 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
             self.standby_kw += worker_profile['energy_consumption_standby']
         self.standby_kw = self.standby_kw / 1000
 
-    def get_traces(self):
-        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-            operation='process_data_event', service='Scheduler')
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
-        req = requests.get(traces_url)
-        traces = req.json()['data']
-        return traces
-
-    def get_trace_processes_to_name_map(self, trace):
-        return {
-            proc: p_data['serviceName']
-            for proc, p_data in trace['processes'].items()
-        }
-
-    def get_span_worker_stream_destination_from_tags(self, span):
-        worker_stream_key = None
-        for tag in span['tags']:
-            if tag['key'] == 'message_bus.destination':
-                worker_stream_key = tag['value']
-                break
-        return worker_stream_key
+    def get_span_table(self):
+        return self.trace_store.get_span_table(
+            self.jaeger_api_host, service='Scheduler', operation='process_data_event', lookback='6h',
+            tag_keys=(self.WORKER_STREAM_KEY_TAG,))
 
     def get_trace_latency(self, init_time, worker_start_time, worker_duration):
         total_trace_time_mm_sec = (worker_start_time + worker_duration) - init_time
         total_trace_time_sec = total_trace_time_mm_sec / 10**6
         return total_trace_time_sec
 
-    def get_consumer_stream_event_details(self, trace):
-        proc_names = self.get_trace_processes_to_name_map(trace)
-        ordered_spans = sorted(trace['spans'], key=lambda s: s['startTime'])
-
-        worker_stream_key = None
-        init_time = ordered_spans[0]['startTime']
-        scheduled_time = None
-        worker_start_time = None
-        worker_duration = None
-        worker_end_time = None
-        worker_end_time_sec = None
-        worker_finished_process = False
-        for span in ordered_spans:
-            if proc_names[span['processID']] == 'Scheduler':
-                if span['operationName'] == self.pre_consume_stream_process_name:
-                    worker_stream_key = self.get_span_worker_stream_destination_from_tags(span)
-                    scheduled_time = span['startTime'] + span['duration']
-            elif proc_names[span['processID']] in self.workers_service_types:
-                if span['operationName'] == self.consume_stream_process_name:
-                    worker_start_time = span['startTime']
-                    worker_duration = span['duration']
-                    worker_end_time = (worker_start_time + worker_duration)
-                    worker_end_time_sec = worker_end_time / 10**6
-                    worker_finished_process = True
-                    # can stop loop since we reached the last span we need
-                    break
-
-        event_processing_details = None
-        if worker_stream_key:
-            event_processing_details = {
-                'worker_stream_key': worker_stream_key,
-                'init_time': init_time,
-                'worker_start_time': worker_start_time,
-                'worker_end_time': worker_end_time,
-                'worker_end_time_sec': worker_end_time_sec,
-                'worker_duration': worker_duration,
-                'worker_finished_process': worker_finished_process,
-                'scheduled_time': scheduled_time,
-            }
-            if not worker_finished_process:
-                self.non_proccessed_traces_by_workers[worker_stream_key].append(event_processing_details)
-
-        return event_processing_details
-
-    def get_delta_variation(self):
-        return random.randint(-100, 100) / 100
-
-    def calculate_results_for_event_details(self, event_details):
-        worker_stream_key = event_details['worker_stream_key']
-        w_throughput = self.workers_configuration_profile[worker_stream_key]['throughput']
-        w_accuracy = self.workers_configuration_profile[worker_stream_key]['accuracy']
-        w_energy_consumption = self.workers_configuration_profile[worker_stream_key]['energy_consumption']
-        w_energy_consumption_standby = self.workers_configuration_profile[worker_stream_key]['energy_consumption_standby']
+    def get_consumer_stream_events_details(self, span_table):
+        # columnar details of the scheduled events: the worker consumption is the first worker consume span
+        # of each trace (by start time), and the scheduling is the last Scheduler pre-consume span before it
+        ordered_spans = span_table.spans_ordered_by_start_time()
+        span_position = np.empty(span_table.n_spans, dtype=np.int64)
+        span_position[ordered_spans] = np.arange(span_table.n_spans)
+
+        workers_service_types = [s for s in self.workers_service_types if s != 'Scheduler']
+        consume_spans_mask = span_table.span_mask(
+            services=workers_service_types, operation=self.consume_stream_process_name)
+        worker_spans = span_table.first_span_per_trace(ordered_spans[consume_spans_mask[ordered_spans]])
+        worker_finished_process = worker_spans != -1
+        consume_positions = np.where(worker_finished_process, span_position[worker_spans], span_table.n_spans)
+
+        pre_consume_spans_mask = span_table.span_mask(
+            services=['Scheduler'], operation=self.pre_consume_stream_process_name)
+        pre_consume_spans = ordered_spans[pre_consume_spans_mask[ordered_spans]]
+        pre_consume_spans = pre_consume_spans[
+            span_position[pre_consume_spans] < consume_positions[span_table.trace_index[pre_consume_spans]]
+        ]
+        scheduling_spans = span_table.last_span_per_trace(pre_consume_spans)
+        was_scheduled = scheduling_spans != -1
+
+        worker_stream_keys = np.full(span_table.n_traces, None, dtype=object)
+        worker_stream_keys[was_scheduled] = span_table.tags[self.WORKER_STREAM_KEY_TAG][scheduling_spans[was_scheduled]]
+        scheduled_events = worker_stream_keys.astype(bool)
+
+        worker_spans = worker_spans[scheduled_events]
+        worker_start_time = span_table.start_time[worker_spans]
+        worker_duration = span_table.duration[worker_spans]
+        worker_end_time = worker_start_time + worker_duration
+        return {
+            'worker_stream_key': worker_stream_keys[scheduled_events],
+            'init_time': span_table.trace_min_start_times()[scheduled_events],
+            'worker_start_time': worker_start_time,
+            'worker_end_time': worker_end_time,
+            'worker_end_time_sec': worker_end_time / 10**6,
+            'worker_duration': worker_duration,
+            'worker_finished_process': worker_finished_process[scheduled_events],
+            'scheduled_time': span_table.end_time[scheduling_spans[scheduled_events]],
+        }
 
-        scheduled_time_sec =  event_details['scheduled_time'] / 10**6
+    def filter_events_details(self, events_details, mask):
+        return {field: values[mask] for field, values in events_details.items()}
+
+    def iter_events_details(self, events_details):
+        # missing fields (e.g.: worker times not estimated yet) are None
+        for i in range(len(events_details['worker_stream_key'])):
+            event_details = {}
+            for field in self.EVENT_DETAILS_FIELDS:
+                value = events_details[field][i] if field in events_details else None
+                event_details[field] = value.item() if isinstance(value, np.generic) else value
+            yield event_details
+
+    def get_worker_codes(self, worker_stream_keys):
+        # position of each event worker on the workers configuration profile
+        workers = list(self.workers_configuration_profile.keys())
+        worker_codes = pd.Categorical(worker_stream_keys, categories=workers).codes.astype(np.int64)
+        if (worker_codes == -1).any():
+            unknown_workers = set(np.asarray(worker_stream_keys)[worker_codes == -1])
+            raise KeyError(f'Workers not in the workers configuration profile: {unknown_workers}')
+        return worker_codes
+
+    def get_workers_profile_column(self, worker_codes, field):
+        profile_values = np.array([
+            worker_profile.get(field, np.nan) for worker_profile in self.workers_configuration_profile.values()
+        ])
+        return profile_values[worker_codes]
+
+    def get_delta_variations(self, size):
+        return draw_delta_variations(self.random_generator, size)
+
+    def calculate_results_for_events_details(self, events_details):
+        # all the events results are calculated as whole columns
+        worker_stream_key = events_details['worker_stream_key']
+        worker_codes = self.get_worker_codes(worker_stream_key)
+        w_throughput = self.get_workers_profile_column(worker_codes, 'throughput')
+        w_accuracy = self.get_workers_profile_column(worker_codes, 'accuracy')
+        w_energy_consumption = self.get_workers_profile_column(worker_codes, 'energy_consumption')
+        w_energy_consumption_standby = self.get_workers_profile_column(worker_codes, 'energy_consumption_standby')
+
+        scheduled_time_sec = events_details['scheduled_time'] / 10**6
         if self.apply_worker_config_variation:
-            delta_variation = self.get_delta_variation()
-            energy_consumption_variation = self.workers_configuration_profile[worker_stream_key]['energy_consumption_std'] * delta_variation
-            w_energy_consumption += energy_consumption_variation
-
+            delta_variation = self.get_delta_variations(len(worker_stream_key))
+            energy_consumption_variation = self.get_workers_profile_column(
+                worker_codes, 'energy_consumption_std') * delta_variation
+            w_energy_consumption = w_energy_consumption + energy_consumption_variation
 
         w_energy_consumption_kw = w_energy_consumption * self.W_TO_KW
 
         accuracy = w_accuracy
 
-        processing_time_sec = event_details['worker_duration'] / 10**6
+        processing_time_sec = events_details['worker_duration'] / 10**6
         throughput = 1 / processing_time_sec
 
         latency = self.get_trace_latency(
-            event_details['init_time'], event_details['worker_start_time'], event_details['worker_duration'])
+            events_details['init_time'], events_details['worker_start_time'], events_details['worker_duration'])
 
         energy_consumption_w_s = processing_time_sec * w_energy_consumption
         energy_consumption_w_h = energy_consumption_w_s / 3600
 
-        worker_finished_process = event_details['worker_finished_process']
-        worker_end_time_sec = event_details['worker_end_time_sec']
-        # df_line['energy_consumption_kwh'] = df_line['worker_energy_usage_kw'] * df_line['total_processing_time_hour']
-        # df_line['energy_consumption_joules'] = df_line['worker_energy_usage'] * df_line['total_processing_time_sec']
-        # df_line['energy_consumption_coe'] = df_line['energy_consumption_kwh'] * KHW_TO_COE_RATE
-        results = {
+        return pd.DataFrame({
             'worker_stream_key': worker_stream_key,
             'w_throughput': w_throughput,
             'w_energy_consumption': w_energy_consumption,
@@ -205,21 +327,22 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
             'energy_consumption_w_s': energy_consumption_w_s,
             'energy_consumption_w_h': energy_consumption_w_h,
             'processing_time_sec': processing_time_sec,
-            'worker_finished_process': worker_finished_process,
-            'worker_end_time_sec': worker_end_time_sec,
+            'worker_finished_process': events_details['worker_finished_process'],
+            'worker_end_time_sec': events_details['worker_end_time_sec'],
             'scheduled_time_sec': scheduled_time_sec
-        }
-        return results
+        })
 
-    def get_base_results_data_frame(self, traces):
-        base_results_df = pd.DataFrame(self._get_base_results_df_dict())
-        for trace in traces:
-            event_details = self.get_consumer_stream_event_details(trace)
-            if event_details is not None and event_details['worker_finished_process']:
-                event_results = self.calculate_results_for_event_details(event_details)
-                base_results_df = base_results_df.append(event_results, ignore_index=True)
+    def get_base_results_data_frame(self, span_table):
+        self.total_traces = span_table.n_traces
+        events_details = self.get_consumer_stream_events_details(span_table)
+        worker_finished_process = events_details['worker_finished_process']
+        self.non_proc_events_details = {
+            field: values[~worker_finished_process] for field, values in events_details.items()
+            if field in ['worker_stream_key', 'init_time', 'scheduled_time', 'worker_finished_process']
+        }
 
-        return base_results_df
+        processed_events_details = self.filter_events_details(events_details, worker_finished_process)
+        return self.calculate_results_for_events_details(processed_events_details)
 
     # def get_total_energy_kwh(self, base_results_df, standby=False, override_time=None):
     #     total_time = self.experiment_time
@@ -239,15 +362,15 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
     #         non_used_workers_standby_kwh = non_used_workers_standby_kw_sum * total_time / 3600
 
     #         used_workers_standby_time_hour = (
-    #             total_time - base_results_df.groupby(['worker_stream_key']).sum()['processing_time_sec']
+    #             total_time - base_results_df.groupby(['worker_stream_key'])['processing_time_sec'].sum()
     #         ) / 3600
 
     #         used_workers_standby_kwh_values = used_workers_standby_time_hour * used_workers_standby_kw_values
     #         total_energy = used_workers_standby_kwh_values.sum() + non_used_workers_standby_kwh
 
     #     else:
-    #         energy_kws_values = base_results_df.groupby(['worker_stream_key']).sum()['energy_consumption_w_s'] / 1000
-    #         # proc_time_hour = base_results_df.groupby(['worker_stream_key']).sum()['processing_time_sec'] / 3600
+    #         energy_kws_values = base_results_df.groupby(['worker_stream_key'])['energy_consumption_w_s'].sum() / 1000
+    #         # proc_time_hour = base_results_df.groupby(['worker_stream_key'])['processing_time_sec'].sum() / 3600
     #         energy_kwh_values = energy_kws_values / 3600
     #         total_energy = energy_kwh_values.sum()
     #     return total_energy
@@ -258,50 +381,64 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
     #     total_energy_year = total_kwh * energy_multiply
     #     return total_energy_year
 
-    def calculate_estimates_for_non_processed(self, event_details, previous_queued_event):
-        worker_stream_key = event_details['worker_stream_key']
-        w_throughput = self.workers_configuration_profile[worker_stream_key]['throughput']
+    def calculate_estimates_for_non_processed(self, events_details, workers_last_end_time):
+        # events_details are the non processed events of all workers, sorted by worker and then by scheduled time
+        worker_codes = self.get_worker_codes(events_details['worker_stream_key'])
+        w_throughput = self.get_workers_profile_column(worker_codes, 'throughput')
         if self.apply_worker_config_variation:
-            delta_variation = self.get_delta_variation()
-            throughput_variation = self.workers_configuration_profile[worker_stream_key]['throughput_std'] * delta_variation
-            w_throughput += throughput_variation
+            delta_variation = self.get_delta_variations(len(worker_codes))
+            throughput_variation = self.get_workers_profile_column(worker_codes, 'throughput_std') * delta_variation
+            w_throughput = w_throughput + throughput_variation
 
         processing_time = (10**6) / w_throughput
 
         # the pc process will imediatly go after the previous, not exactly what happens, should probably add more
         # but it is something (based on one event that I've measured)
-        worker_start_time = previous_queued_event['worker_end_time'] + 4
-
-        worker_end_time = worker_start_time + processing_time
-        worker_end_time_sec = worker_end_time / 10**6
-
-        event_details['worker_start_time'] = worker_start_time
-        event_details['worker_duration'] = processing_time
-        event_details['worker_end_time'] = worker_end_time
-        event_details['worker_end_time_sec'] = worker_end_time_sec
-        return event_details
+        worker_start_time, worker_end_time = simulate_workers_queues(
+            worker_codes, processing_time, workers_last_end_time)
+
+        events_details['worker_start_time'] = worker_start_time
+        events_details['worker_duration'] = processing_time
+        events_details['worker_end_time'] = worker_end_time
+        events_details['worker_end_time_sec'] = worker_end_time / 10**6
+        return events_details
+
+    def concat_results_data_frames(self, results_dfs, ignore_index=False):
+        results_dfs = [results_df for results_df in results_dfs if not results_df.empty]
+        if not results_dfs:
+            return pd.DataFrame(self._get_base_results_df_dict())
+        return pd.concat(results_dfs, ignore_index=ignore_index)
+
+    def get_workers_last_end_time(self):
+        workers = list(self.workers_configuration_profile.keys())
+        workers_last_end_time_sec = self.base_results_df.groupby('worker_stream_key')['worker_end_time_sec'].max()
+        return workers_last_end_time_sec.reindex(workers).to_numpy(dtype=float) * (10**6)
 
     def get_non_processes_results_data_frame(self):
-        non_proc_results_df = pd.DataFrame(self._get_base_results_df_dict())
-
-        for worker_key, w_events in self.non_proccessed_traces_by_workers.items():
-            previous_queued_event = {
-                'worker_end_time': self.base_results_df[
-                    self.base_results_df['worker_stream_key'] == worker_key
-                ].max()['worker_end_time_sec'] * (10**6)
-            }
-            sorted_events = sorted(w_events, key=lambda e: e['scheduled_time'])
-            for event_details in sorted_events:
-                event_details = self.calculate_estimates_for_non_processed(event_details, previous_queued_event)
-                event_row = self.calculate_results_for_event_details(event_details)
-                non_proc_results_df = non_proc_results_df.append(event_row, ignore_index=True)
-                previous_queued_event = event_details
+        events_details = self.non_proc_events_details
+        worker_codes = self.get_worker_codes(events_details['worker_stream_key'])
+        queue_order = np.lexsort((events_details['scheduled_time'], worker_codes))
+        queued_events_details = self.filter_events_details(events_details, queue_order)
+        queued_events_details = self.calculate_estimates_for_non_processed(
+            queued_events_details, self.get_workers_last_end_time())
+        self.queued_non_proc_events_details = queued_events_details
+
+        # the estimates are also kept on the non processed events (in their original order), saved as json
+        for field in ['worker_start_time', 'worker_duration', 'worker_end_time', 'worker_end_time_sec']:
+            events_details[field] = np.empty(len(queue_order))
+            events_details[field][queue_order] = queued_events_details[field]
 
         # self.max_workers_end_time = non_proc_results_df.max()['worker_end_time_sec']
         # last_scheduled_time_sec = non_proc_results_df.max()['scheduled_time_sec']
         # self.non_proc_exp_time = self.max_workers_end_time - last_scheduled_time_sec
         # self.ext_experiment_time = self.experiment_time + self.non_proc_exp_time
-        return non_proc_results_df
+        return self.calculate_results_for_events_details(queued_events_details)
+
+    def get_non_processed_traces_by_workers(self):
+        non_proccessed_traces_by_workers = {k: [] for k in self.workers_configuration_profile.keys()}
+        for event_details in self.iter_events_details(self.non_proc_events_details):
+            non_proccessed_traces_by_workers[event_details['worker_stream_key']].append(event_details)
+        return non_proccessed_traces_by_workers
 
     # def get_non_proc_final_results(self, base_results_accs, base_results_lats, total_processed, non_proc_results_df):
     #     import ipdb; ipdb.set_trace()
@@ -356,7 +493,7 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
         if standby:
             used_workers_standby_kw_values = results_df.groupby(
                 ['worker_stream_key']
-            ).mean()['w_energy_consumption_standby'] / 1000
+            )['w_energy_consumption_standby'].mean() / 1000
 
             non_used_workers_standby_kw_sum = 0
             for worker_stream_key, worker_profile in self.workers_configuration_profile.items():
@@ -366,36 +503,36 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
             non_used_workers_standby_kwh = non_used_workers_standby_kw_sum * total_time / 3600
 
             used_workers_standby_time_hour = (
-                total_time - results_df.groupby(['worker_stream_key']).sum()['processing_time_sec']
+                total_time - results_df.groupby(['worker_stream_key'])['processing_time_sec'].sum()
             ) / 3600
 
             used_workers_standby_kwh_values = used_workers_standby_time_hour * used_workers_standby_kw_values
             total_energy = used_workers_standby_kwh_values.sum() + non_used_workers_standby_kwh
         else:
-            energy_kws_values = results_df.groupby(['worker_stream_key']).sum()['energy_consumption_w_s'] / 1000
+            energy_kws_values = results_df.groupby(['worker_stream_key'])['energy_consumption_w_s'].sum() / 1000
             energy_kwh_values = energy_kws_values / 3600
             total_energy = energy_kwh_values.sum()
         return total_energy
 
 
     def get_final_results(self, base_results_df, non_proc_results_df):
-        self.merged_df = base_results_df.append(non_proc_results_df)
+        self.merged_df = self.concat_results_data_frames([base_results_df, non_proc_results_df])
 
         processed_only = self.merged_df[self.merged_df['worker_finished_process'] == True]
         proc_processing_energy_kwh = self.get_total_energy_kwh(processed_only, total_time=self.proc_exp_time)
         proc_standby_energy_kwh = self.get_total_energy_kwh(processed_only, total_time=self.proc_exp_time, standby=True)
 
-        accuracy_avg = processed_only.mean()['accuracy']
-        accuracy_std = processed_only.std()['accuracy']
-        latency_avg = processed_only.mean()['latency']
-        latency_std = processed_only.std()['latency']
+        accuracy_avg = processed_only['accuracy'].mean()
+        accuracy_std = processed_only['accuracy'].std()
+        latency_avg = processed_only['latency'].mean()
+        latency_std = processed_only['latency'].std()
         total_processed = len(base_results_df.index)
         sys_throughput = total_processed / self.experiment_time
 
-        ext_accuracy_avg = self.merged_df.mean()['accuracy']
-        ext_accuracy_std = self.merged_df.std()['accuracy']
-        ext_latency_avg = self.merged_df.mean()['latency']
-        ext_latency_std = self.merged_df.std()['latency']
+        ext_accuracy_avg = self.merged_df['accuracy'].mean()
+        ext_accuracy_std = self.merged_df['accuracy'].std()
+        ext_latency_avg = self.merged_df['latency'].mean()
+        ext_latency_std = self.merged_df['latency'].std()
         ext_total_processed = len(self.merged_df.index)
         ext_sys_throughput = total_processed / self.extended_exp_time
 
@@ -431,34 +568,93 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
         return final_results
 
     def calculate_experiment_times(self):
-        self.init_exp_timestamp_sec = self.base_results_df.min()['scheduled_time_sec']
+        self.init_exp_timestamp_sec = self.base_results_df['scheduled_time_sec'].min()
 
-        self.end_proc_exp_timestamp_sec = self.base_results_df.max()['worker_end_time_sec']
+        self.end_proc_exp_timestamp_sec = self.base_results_df['worker_end_time_sec'].max()
         self.proc_exp_time = self.end_proc_exp_timestamp_sec - self.init_exp_timestamp_sec
 
-        self.end_non_proc_exp_timestamp_sec = self.non_proc_base_results_df.max()['worker_end_time_sec']
+        self.end_non_proc_exp_timestamp_sec = self.non_proc_base_results_df['worker_end_time_sec'].max()
         self.extended_exp_time = self.end_non_proc_exp_timestamp_sec - self.init_exp_timestamp_sec
 
-    def calculate_results(self, traces):
-        self.base_results_df = self.get_base_results_data_frame(traces)
+    def get_monte_carlo_schedule(self):
+        workers_profile = {
+            field: self.get_workers_profile_column(np.arange(len(self.workers_configuration_profile)), field)
+            for field in [
+                'throughput', 'throughput_std', 'energy_consumption', 'energy_consumption_std',
+                'energy_consumption_standby'
+            ]
+        }
+        return {
+            'workers_profile': workers_profile,
+            'proc_worker_codes': self.get_worker_codes(self.base_results_df['worker_stream_key'].to_numpy()),
+            'proc_processing_time_sec': self.base_results_df['processing_time_sec'].to_numpy(dtype=float),
+            'proc_latency': self.base_results_df['latency'].to_numpy(dtype=float),
+            'non_proc_worker_codes': self.get_worker_codes(self.queued_non_proc_events_details['worker_stream_key']),
+            'non_proc_init_time': self.queued_non_proc_events_details['init_time'],
+            'workers_last_end_time': self.get_workers_last_end_time(),
+            'init_exp_timestamp_sec': self.init_exp_timestamp_sec,
+            'total_processed': len(self.base_results_df.index),
+        }
+
+    def run_monte_carlo_samples(self, schedule):
+        # samples are simulated in chunks (bounding the memory used), each with its own independent random generator
+        chunks_samples = [self.MONTE_CARLO_CHUNK_SAMPLES] * (self.monte_carlo_samples // self.MONTE_CARLO_CHUNK_SAMPLES)
+        if self.monte_carlo_samples % self.MONTE_CARLO_CHUNK_SAMPLES:
+            chunks_samples.append(self.monte_carlo_samples % self.MONTE_CARLO_CHUNK_SAMPLES)
+        chunks_seeds = np.random.SeedSequence(self.random_seed).spawn(len(chunks_samples))
+        chunks_schedules = [schedule] * len(chunks_samples)
+        if self.monte_carlo_max_workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.monte_carlo_max_workers) as executor:
+                chunks_results = list(executor.map(
+                    simulate_monte_carlo_samples, chunks_schedules, chunks_samples, chunks_seeds))
+        else:
+            chunks_results = list(map(simulate_monte_carlo_samples, chunks_schedules, chunks_samples, chunks_seeds))
+        return {
+            metric: np.concatenate([chunk_results[metric] for chunk_results in chunks_results])
+            for metric in chunks_results[0].keys()
+        }
+
+    def get_monte_carlo_results(self, samples):
+        # average, std and the (percentile) confidence interval of each metric over the samples
+        ci_percentile = (1 - self.monte_carlo_confidence) / 2 * 100
+        results = {'monte_carlo_samples': self.monte_carlo_samples}
+        for metric, values in samples.items():
+            results[f'{metric}_mc_avg'] = float(values.mean())
+            results[f'{metric}_mc_std'] = float(values.std(ddof=1)) if len(values) > 1 else None
+            results[f'{metric}_mc_ci_low'] = float(np.percentile(values, ci_percentile))
+            results[f'{metric}_mc_ci_high'] = float(np.percentile(values, 100 - ci_percentile))
+        return results
+
+    def calculate_results(self, span_table):
+        self.base_results_df = self.get_base_results_data_frame(span_table)
         self.non_proc_base_results_df = self.get_non_processes_results_data_frame()
         self.calculate_experiment_times()
         final_results = self.get_final_results(self.base_results_df, self.non_proc_base_results_df)
+        if self.monte_carlo_samples > 0:
+            samples = self.run_monte_carlo_samples(self.get_monte_carlo_schedule())
+            final_results.update(self.get_monte_carlo_results(samples))
         return final_results
 
     def save_intermediary_data(self):
-        self.base_results_df.to_csv(self.output_events_csv_file, index=False)
-        self.non_proc_base_results_df.to_csv(self.output_non_proc_events_csv_file, index=False)
-        self.merged_df.to_csv(self.output_all_events_csv_file, index=False)
-
-        with open(self.output_non_proc_events_json_file, 'w') as f:
-            json.dump(self.non_proccessed_traces_by_workers, f, indent=4)
+        save_data_frame(self.base_results_df, self.output_events_base_path, self.intermediary_data_format)
+        save_data_frame(self.non_proc_base_results_df, self.output_non_proc_events_base_path, self.intermediary_data_format)
+        save_data_frame(self.merged_df, self.output_all_events_base_path, self.intermediary_data_format)
+
+        if self.intermediary_data_format == 'csv':
+            self.non_proccessed_traces_by_workers = self.get_non_processed_traces_by_workers()
+            with open(self.output_non_proc_events_json_file, 'w') as f:
+                json.dump(self.non_proccessed_traces_by_workers, f, indent=4)
+        else:
+            non_proc_events_columns = {
+                field: self.non_proc_events_details[field]
+                for field in self.EVENT_DETAILS_FIELDS if field in self.non_proc_events_details
+            }
+            save_columns(non_proc_events_columns, self.output_non_proc_events_columns_path)
 
     def run(self):
         self.logger.debug('Evaluation for Scheduler results for list of workers...')
-        traces = self.get_traces()
-        self.total_traces = len(traces)
-        results = self.calculate_results(traces)
+        span_table = self.get_span_table()
+        results = self.calculate_results(span_table)
         self.save_intermediary_data()
         return self.verify_thresholds(results)
 
@@ -466,7 +662,9 @@ class WorkersSchedulingEvaluation(BaseEvaluation):
 def run(jaeger_api_host, output_path, workers_configuration_profile, workers_service_types,
         pre_consume_stream_process_name, consume_stream_process_name, experiment_time,
         threshold_functions, logging_level,
-        khw_to_coe_rate=None, energy_cost=None, apply_worker_config_variation=False):
+        khw_to_coe_rate=None, energy_cost=None, apply_worker_config_variation=False,
+        monte_carlo_samples=None, monte_carlo_max_workers=None, monte_carlo_confidence=None, random_seed=None,
+        intermediary_data_format=None, trace_store=None):
         # "output_path": "./outputs",
         # "workers_configuration_profile": {
         #     'worker-000-data': {
@@ -497,6 +695,12 @@ def run(jaeger_api_host, output_path, workers_configuration_profile, workers_ser
         khw_to_coe_rate=khw_to_coe_rate,
         energy_cost=energy_cost,
         apply_worker_config_variation=apply_worker_config_variation,
+        monte_carlo_samples=monte_carlo_samples,
+        monte_carlo_max_workers=monte_carlo_max_workers,
+        monte_carlo_confidence=monte_carlo_confidence,
+        random_seed=random_seed,
+        intermediary_data_format=intermediary_data_format,
+        trace_store=trace_store,
         threshold_functions=threshold_functions,
         logging_level=logging_level
     )
@@ -612,7 +816,3 @@ if __name__ == '__main__':
         "logging_level": "ERROR"
     }
     print(json.dumps(run(**kwargs), indent=4))
-
-
-
-
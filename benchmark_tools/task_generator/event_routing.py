@@ -0,0 +1,35 @@
+import zlib
+
+
+ROUTINGS = ['round_robin', 'by_field', 'broadcast']
+
+
+class EventRouter():
+    # chooses to which of the output streams each processed event is forwarded:
+    # round_robin alternates between them, by_field always sends the events with the same routing_field value
+    # to the same stream, and broadcast sends the events to all of them
+
+    def __init__(self, output_streams, routing='round_robin', routing_field=None):
+        if routing not in ROUTINGS:
+            raise Exception(f'Unknown routing "{routing}". Use one of: {ROUTINGS}')
+        if routing == 'by_field' and routing_field is None:
+            raise Exception('by_field routing needs a routing_field.')
+        self.output_streams = output_streams
+        self.routing = routing
+        self.routing_field = routing_field
+        self.total_routed_events = 0
+        self.forwarded_events = {stream.key: 0 for stream in self.output_streams}
+
+    def get_event_output_streams(self, event_data):
+        if self.routing == 'broadcast':
+            output_streams = self.output_streams
+        elif self.routing == 'by_field':
+            # crc32 instead of hash, so the routing is the same on every process
+            field_value = str(event_data.get(self.routing_field)).encode('utf-8')
+            output_streams = [self.output_streams[zlib.crc32(field_value) % len(self.output_streams)]]
+        else:
+            output_streams = [self.output_streams[self.total_routed_events % len(self.output_streams)]]
+        self.total_routed_events += 1
+        for stream in output_streams:
+            self.forwarded_events[stream.key] += 1
+        return output_streams
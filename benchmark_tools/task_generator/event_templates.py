@@ -0,0 +1,58 @@
+import json
+import time
+
+
+SEQUENCE_NUMBER_FIELD = 'sequence_number'
+SEND_TIMESTAMP_FIELD = 'send_timestamp'
+PER_EVENT_FIELDS = [SEQUENCE_NUMBER_FIELD, SEND_TIMESTAMP_FIELD]
+
+
+class PreSerializedEventTemplate():
+    # the event template is serialized to json only once, with placeholders on the fields that change on each event,
+    # so creating an event is only joining the serialized parts with the event id (and optional per event fields)
+    PLACEHOLDER_FORMAT = '__per_event_field_{}__'
+
+    def __init__(self, event_template, pub_id, per_event_fields=None):
+        self.per_event_fields = list(per_event_fields or [])
+        for field in self.per_event_fields:
+            if field not in PER_EVENT_FIELDS:
+                raise Exception(f'Unknown per event field "{field}". Use one of: {PER_EVENT_FIELDS}')
+        event_data = event_template.copy()
+        for field in ['id'] + self.per_event_fields:
+            event_data[field] = self.PLACEHOLDER_FORMAT.format(field)
+        self.fields, self.parts = self.split_on_placeholders(json.dumps(event_data))
+        # the event id is "{pub_id}:{event_index}", so only the event index has to be serialized for each event
+        id_index = self.fields.index('id')
+        self.parts[id_index] += json.dumps(f'{pub_id}:')[:-1].encode('utf-8')
+        self.parts[id_index + 1] = b'"' + self.parts[id_index + 1]
+
+    def split_on_placeholders(self, serialized_event):
+        placeholders_positions = []
+        for field in ['id'] + self.per_event_fields:
+            placeholder = json.dumps(self.PLACEHOLDER_FORMAT.format(field))
+            if serialized_event.count(placeholder) != 1:
+                raise Exception(f'Event template already has the "{field}" field placeholder: {placeholder}')
+            placeholders_positions.append((serialized_event.index(placeholder), field, len(placeholder)))
+        placeholders_positions.sort()
+
+        fields = []
+        parts = []
+        part_start = 0
+        for position, field, placeholder_length in placeholders_positions:
+            fields.append(field)
+            parts.append(serialized_event[part_start:position].encode('utf-8'))
+            part_start = position + placeholder_length
+        parts.append(serialized_event[part_start:].encode('utf-8'))
+        return fields, parts
+
+    def get_field_value(self, field, event_index):
+        if field in ['id', SEQUENCE_NUMBER_FIELD]:
+            return str(event_index).encode('utf-8')
+        return repr(time.time()).encode('utf-8')
+
+    def serialize(self, event_index):
+        serialized_parts = [self.parts[0]]
+        for field, part in zip(self.fields, self.parts[1:]):
+            serialized_parts.append(self.get_field_value(field, event_index))
+            serialized_parts.append(part)
+        return b''.join(serialized_parts)
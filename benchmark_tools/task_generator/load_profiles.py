@@ -0,0 +1,147 @@
+import json
+import math
+
+import numpy as np
+
+from benchmark_tools.traces.span_table import SpanTable
+
+
+# the load profiles are precomputed as the events publishing times (in seconds since the publishing start),
+# so the publishing loop only has to follow them
+
+
+def limit_schedule(schedule, max_events=None, max_time=None):
+    schedule = schedule[np.isfinite(schedule)]
+    if max_time is not None:
+        schedule = schedule[schedule < max_time]
+    if max_events is not None:
+        schedule = schedule[:max_events]
+    return schedule
+
+
+def check_publishing_limits(profile_type, max_events, max_time):
+    if max_events is None and max_time is None:
+        raise Exception(f'"{profile_type}" load profile needs max_events or max_time to be defined.')
+
+
+def get_constant_schedule(fps, max_events=None, max_time=None):
+    check_publishing_limits('constant', max_events, max_time)
+    total_events = max_events if max_events is not None else math.ceil(max_time * fps)
+    return limit_schedule(np.arange(total_events) / fps, max_events, max_time)
+
+
+def get_ramp_schedule(start_fps, end_fps, ramp_time, max_events=None, max_time=None):
+    # the rate changes linearly from start_fps to end_fps during ramp_time, and then stays at end_fps
+    check_publishing_limits('ramp', max_events, max_time)
+    if ramp_time <= 0:
+        raise Exception(f'"ramp" load profile needs a positive ramp_time, got: {ramp_time}')
+    ramp_events = (start_fps + end_fps) * ramp_time / 2
+    if max_events is not None:
+        total_events = max_events
+    elif max_time <= ramp_time:
+        total_events = math.ceil(start_fps * max_time + (end_fps - start_fps) * max_time ** 2 / (2 * ramp_time))
+    else:
+        total_events = math.ceil(ramp_events + end_fps * (max_time - ramp_time))
+
+    events = np.arange(total_events, dtype=np.float64)
+    fps_change = (end_fps - start_fps) / ramp_time
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # root of start_fps * t + fps_change * t**2 / 2 = event index, in a form that also works without fps change
+        ramp_schedule = 2 * events / (start_fps + np.sqrt(start_fps ** 2 + 2 * fps_change * events))
+        after_ramp_schedule = ramp_time + (events - ramp_events) / end_fps
+    ramp_schedule[events == 0] = 0
+    schedule = np.where(events <= ramp_events, ramp_schedule, after_ramp_schedule)
+    return limit_schedule(schedule, max_events, max_time)
+
+
+def get_step_schedule(steps, max_events=None, max_time=None):
+    # each step publishes at its fps during its duration
+    step_schedules = []
+    step_start_time = 0
+    for step in steps:
+        fps = step['fps']
+        duration = step['duration']
+        if fps > 0:
+            step_schedule = step_start_time + np.arange(math.ceil(duration * fps)) / fps
+            step_schedules.append(step_schedule[step_schedule < step_start_time + duration])
+        step_start_time += duration
+    if not step_schedules:
+        return np.array([])
+    return limit_schedule(np.concatenate(step_schedules), max_events, max_time)
+
+
+def get_poisson_schedule(fps, seed=None, max_events=None, max_time=None):
+    check_publishing_limits('poisson', max_events, max_time)
+    random_generator = np.random.default_rng(seed)
+    if max_events is not None:
+        total_events = max_events
+    else:
+        # enough events to pass max_time with a very high probability, the extra ones are dropped
+        total_events = math.ceil(fps * max_time + 10 * math.sqrt(fps * max_time) + 10)
+    inter_arrival_times = random_generator.exponential(1 / fps, size=total_events)
+    schedule = np.cumsum(inter_arrival_times) - inter_arrival_times[0]
+    if max_events is None:
+        while schedule[-1] < max_time:
+            inter_arrival_times = random_generator.exponential(1 / fps, size=total_events)
+            schedule = np.concatenate([schedule, schedule[-1] + np.cumsum(inter_arrival_times)])
+    return limit_schedule(schedule, max_events, max_time)
+
+
+def get_bursty_schedule(on_fps, on_time, off_time, max_events=None, max_time=None):
+    # bursts publishing at on_fps during on_time, followed by off_time without events
+    check_publishing_limits('bursty', max_events, max_time)
+    on_schedule = np.arange(math.ceil(on_time * on_fps)) / on_fps
+    on_schedule = on_schedule[on_schedule < on_time]
+    if len(on_schedule) == 0:
+        return np.array([])
+    cycle_time = on_time + off_time
+    if max_events is not None:
+        total_cycles = math.ceil(max_events / len(on_schedule))
+    else:
+        total_cycles = math.ceil(max_time / cycle_time)
+    schedule = (np.arange(total_cycles)[:, np.newaxis] * cycle_time + on_schedule).ravel()
+    return limit_schedule(schedule, max_events, max_time)
+
+
+def load_traces_file(traces_file):
+    with open(traces_file, 'r') as f:
+        traces = json.load(f)
+    # jaeger api (and exportTraces) json has the traces list in "data"
+    if isinstance(traces, dict):
+        traces = traces['data']
+    return traces
+
+
+def get_trace_replay_schedule(traces_file, service=None, operation=None, speedup=1,
+                              max_events=None, max_time=None):
+    # replays the arrival times of the traces (or of the spans of the service operation) from a jaeger json export
+    span_table = SpanTable.from_traces(load_traces_file(traces_file))
+    if service is None and operation is None:
+        arrival_times = span_table.trace_min_start_times()
+    else:
+        services = [service] if service is not None else None
+        arrival_times = span_table.start_time[span_table.span_mask(services=services, operation=operation)]
+    if len(arrival_times) == 0:
+        return np.array([])
+    arrival_times = np.sort(arrival_times)
+    schedule = (arrival_times - arrival_times[0]) / 10**6 / speedup
+    return limit_schedule(schedule, max_events, max_time)
+
+
+LOAD_PROFILES_SCHEDULES = {
+    'constant': get_constant_schedule,
+    'ramp': get_ramp_schedule,
+    'step': get_step_schedule,
+    'poisson': get_poisson_schedule,
+    'bursty': get_bursty_schedule,
+    'trace_replay': get_trace_replay_schedule,
+}
+
+
+def get_load_profile_schedule(load_profile, max_events=None, max_time=None):
+    profile_kwargs = load_profile.copy()
+    profile_type = profile_kwargs.pop('type')
+    if profile_type not in LOAD_PROFILES_SCHEDULES:
+        raise Exception(
+            f'Unknown load profile type "{profile_type}". Use one of: {list(LOAD_PROFILES_SCHEDULES.keys())}')
+    return LOAD_PROFILES_SCHEDULES[profile_type](max_events=max_events, max_time=max_time, **profile_kwargs)
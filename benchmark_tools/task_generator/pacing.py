@@ -0,0 +1,86 @@
+import bisect
+import time
+
+import numpy as np
+
+
+# upper limits (in milliseconds) of the lateness histogram bins, the last bin has all the events later than that
+LATENESS_HISTOGRAM_BINS_MS = [0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class EventPacer():
+    # paces the events on absolute deadlines (init time + event index / fps, or + the event precomputed schedule time),
+    # so the sleep and sending delays don't accumulate, and after a stall the late events are sent right away
+    # until the pace is caught up
+
+    def __init__(self, fps=None, schedule=None, init_ts=None):
+        self.fps = fps
+        self.schedule = schedule
+        if self.schedule is None:
+            self.expected_event_pub_time = 1 / fps
+        self.init_ts = init_ts if init_ts is not None else time.monotonic()
+        self.total_events = 0
+        self.total_batches = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.lateness_histogram = [0] * (len(LATENESS_HISTOGRAM_BINS_MS) + 1)
+
+    def get_event_deadline(self, event_index):
+        if self.schedule is not None:
+            return self.init_ts + self.schedule[event_index]
+        return self.init_ts + event_index * self.expected_event_pub_time
+
+    def has_next_event(self):
+        return self.schedule is None or self.total_events < len(self.schedule)
+
+    def get_wait_time(self, batch_size=1):
+        # time until the last event of the next batch is due
+        return self.get_event_deadline(self.total_events + batch_size - 1) - time.monotonic()
+
+    def get_batch_size(self, max_batch_size, max_batch_latency):
+        # next events that are due until max_batch_latency after the next event, so they can be sent together
+        if max_batch_size <= 1:
+            return 1
+        if self.schedule is not None:
+            batch_deadline = self.schedule[self.total_events] + max_batch_latency
+            batch_size = np.searchsorted(self.schedule, batch_deadline, side='right') - self.total_events
+        else:
+            batch_size = int(max_batch_latency * self.fps) + 1
+        return int(min(batch_size, max_batch_size))
+
+    def get_total_time(self):
+        return time.monotonic() - self.init_ts
+
+    def register_event_sent(self, send_ts=None):
+        self.register_events_sent(1, send_ts=send_ts)
+
+    def register_events_sent(self, batch_size, send_ts=None):
+        if send_ts is None:
+            send_ts = time.monotonic()
+        for _ in range(batch_size):
+            lateness = max(send_ts - self.get_event_deadline(self.total_events), 0)
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.lateness_histogram[bisect.bisect_left(LATENESS_HISTOGRAM_BINS_MS, lateness * 1000)] += 1
+            self.total_events += 1
+        self.total_batches += 1
+
+    def get_lateness_histogram(self):
+        bins_labels = [f'<={limit}ms' for limit in LATENESS_HISTOGRAM_BINS_MS]
+        bins_labels.append(f'>{LATENESS_HISTOGRAM_BINS_MS[-1]}ms')
+        return dict(zip(bins_labels, self.lateness_histogram))
+
+    def get_stats(self):
+        total_time = self.get_total_time()
+        return {
+            'fps': self.fps,
+            'scheduled_events': len(self.schedule) if self.schedule is not None else None,
+            'total_events': self.total_events,
+            'total_time': total_time,
+            'achieved_fps': self.total_events / total_time if total_time > 0 else None,
+            'lateness_avg': self.total_lateness / self.total_events if self.total_events > 0 else None,
+            'lateness_max': self.max_lateness,
+            'lateness_histogram': self.get_lateness_histogram(),
+            'total_round_trips': self.total_batches,
+            'events_per_round_trip': self.total_events / self.total_batches if self.total_batches > 0 else None,
+        }
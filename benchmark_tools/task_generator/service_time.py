@@ -0,0 +1,127 @@
+import math
+import time
+
+import numpy as np
+
+from benchmark_tools.task_generator.load_profiles import load_traces_file
+from benchmark_tools.traces.span_table import SpanTable
+
+
+SERVICE_TIME_MODES = ['sleep', 'cpu']
+# the working set is touched in chunks of this size (in bytes), one write for each cache line
+WORKING_SET_CHUNK_SIZE = 64 * 1024
+CACHE_LINE_SIZE = 64
+
+
+class ServiceTimeEmulator():
+    # emulates the missing service time of each event, either sleeping or burning cpu (optionally touching a
+    # working set of memory, so that co-located mocked workers also compete for the cpu caches and memory bandwidth)
+
+    def __init__(self, mode='sleep', working_set_size=0):
+        if mode not in SERVICE_TIME_MODES:
+            raise Exception(f'Unknown service time mode "{mode}". Use one of: {SERVICE_TIME_MODES}')
+        self.mode = mode
+        self.working_set = None
+        if working_set_size:
+            # filled with ones so that all its pages are already allocated
+            self.working_set = np.ones(working_set_size, dtype=np.uint8)
+        self.working_set_position = 0
+        self.total_events = 0
+        self.total_target_time = 0.0
+        self.total_achieved_time = 0.0
+        self.max_service_time_error = 0.0
+
+    def touch_working_set(self):
+        chunk_end = self.working_set_position + WORKING_SET_CHUNK_SIZE
+        self.working_set[self.working_set_position:chunk_end:CACHE_LINE_SIZE] += 1
+        self.working_set_position = chunk_end if chunk_end < len(self.working_set) else 0
+
+    def burn_cpu(self, missing_time):
+        end_time = time.perf_counter() + missing_time
+        while time.perf_counter() < end_time:
+            if self.working_set is not None:
+                self.touch_working_set()
+            else:
+                sum(range(100))
+
+    def emulate(self, missing_time):
+        if missing_time <= 0:
+            return
+        if self.mode == 'cpu':
+            self.burn_cpu(missing_time)
+        else:
+            time.sleep(missing_time)
+
+    def register_service_time(self, target_time, achieved_time):
+        self.total_events += 1
+        self.total_target_time += target_time
+        self.total_achieved_time += achieved_time
+        self.max_service_time_error = max(self.max_service_time_error, abs(achieved_time - target_time))
+
+    def get_stats(self):
+        return {
+            'service_time_mode': self.mode,
+            'service_time_target_avg': self.total_target_time / self.total_events if self.total_events else None,
+            'service_time_achieved_avg': self.total_achieved_time / self.total_events if self.total_events else None,
+            'service_time_error_max': self.max_service_time_error,
+        }
+
+
+class ServiceTimeSampler():
+    # samples the events service times (in seconds) from a distribution, drawn in blocks so that getting the
+    # service time of each event is only reading the next value of the block
+
+    def __init__(self, distribution, block_size=10000):
+        distribution = distribution.copy()
+        self.distribution_type = distribution.pop('type')
+        self.random_generator = np.random.default_rng(distribution.pop('seed', None))
+        self.block_size = block_size
+        draw_methods = {
+            'lognormal': self.get_lognormal_draw,
+            'gamma': self.get_gamma_draw,
+            'histogram': self.get_histogram_draw,
+            'trace_replay': self.get_trace_replay_draw,
+        }
+        if self.distribution_type not in draw_methods:
+            raise Exception(
+                f'Unknown service time distribution "{self.distribution_type}". Use one of: {list(draw_methods.keys())}')
+        self.draw_block = draw_methods[self.distribution_type](**distribution)
+        self.block = self.draw_block(self.block_size)
+        self.block_position = 0
+
+    def get_lognormal_draw(self, mean, std):
+        # parameters of the underlying normal distribution that has the service time mean and std
+        sigma = math.sqrt(math.log(1 + std ** 2 / mean ** 2))
+        mu = math.log(mean) - sigma ** 2 / 2
+        return lambda size: self.random_generator.lognormal(mu, sigma, size=size)
+
+    def get_gamma_draw(self, mean, std):
+        shape = mean ** 2 / std ** 2
+        scale = std ** 2 / mean
+        return lambda size: self.random_generator.gamma(shape, scale, size=size)
+
+    def get_histogram_draw(self, bins, counts):
+        # bins are the edges of the histogram (one more than the counts), uniform inside each bin
+        bins = np.asarray(bins, dtype=np.float64)
+        probabilities = np.asarray(counts, dtype=np.float64) / np.sum(counts)
+
+        def draw(size):
+            bin_indexes = self.random_generator.choice(len(probabilities), size=size, p=probabilities)
+            return self.random_generator.uniform(bins[bin_indexes], bins[bin_indexes + 1])
+        return draw
+
+    def get_trace_replay_draw(self, traces_file, service='MockedStreamConsumer', operation='consume_stream'):
+        # durations of the service operation spans on a jaeger json export
+        span_table = SpanTable.from_traces(load_traces_file(traces_file))
+        durations = span_table.duration[span_table.span_mask(services=[service], operation=operation)] / 10**6
+        if len(durations) == 0:
+            raise Exception(f'No "{service}" "{operation}" spans on the traces file: {traces_file}')
+        return lambda size: self.random_generator.choice(durations, size=size)
+
+    def sample(self):
+        if self.block_position == self.block_size:
+            self.block = self.draw_block(self.block_size)
+            self.block_position = 0
+        service_time = self.block[self.block_position]
+        self.block_position += 1
+        return float(service_time)
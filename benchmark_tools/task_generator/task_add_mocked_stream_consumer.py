@@ -1,8 +1,12 @@
 #!/usr/bin/env python
+import copy
 import random
 import datetime
 import json
+import multiprocessing
 from multiprocessing import Process
+import queue
+import threading
 import time
 
 from opentracing.ext import tags
@@ -11,9 +15,14 @@ from event_service_utils.tracing.jaeger import init_tracer
 from event_service_utils.streams.redis import RedisStreamFactory
 
 from benchmark_tools.task_generator.base import BaseTask
+from benchmark_tools.task_generator.event_routing import EventRouter
+from benchmark_tools.task_generator.service_time import ServiceTimeEmulator, ServiceTimeSampler
 
 
+MOCKED_CONSUMER_SERVICE_NAME = 'MockedStreamConsumer'
 EVENT_ID_TAG = 'event-id'
+SERVICE_TIME_TARGET_TAG = 'service-time-target'
+SERVICE_TIME_ACHIEVED_TAG = 'service-time-achieved'
 
 class TaskAddBackgroundMockedStreamConsumer(BaseTask):
 
@@ -23,6 +32,11 @@ class TaskAddBackgroundMockedStreamConsumer(BaseTask):
         self.stream_factory = kwargs['stream_factory']
         self.tracer_configs = kwargs['tracer_configs']
         self.tracer = None
+        # seconds after max_time that a consumers pool waits for its consumers to finish
+        self.pool_stop_timeout = 10
+        # reads block for at most this time (in milliseconds), so max_time and a pool scale down are noticed
+        # even when the stream is idle
+        self.read_block_time = 1000
         self.processes = []
 
     def get_event_tracer_kwargs(self, event_data):
@@ -62,16 +76,35 @@ class TaskAddBackgroundMockedStreamConsumer(BaseTask):
     def get_delta_variation(self, variation):
         return (random.randint(-100, 100) / 100) * variation
 
-    def process_data_event(self, event_data, json_msg, processing_time, variation, time_before_deserialization):
+    def forward_event(self, event_data, event_router):
+        # the forwarded event carries the consume span context, so the next service span is its child
+        tracer_headers = {}
+        self.tracer.inject(self.tracer.active_span.context, Format.HTTP_HEADERS, tracer_headers)
+        event_data = event_data.copy()
+        event_data['tracer'] = {'headers': tracer_headers}
+        event_msg = {'event': json.dumps(event_data)}
+        for stream in event_router.get_event_output_streams(event_data):
+            stream.write_events(event_msg)
+
+    def process_data_event(self, event_data, json_msg, processing_time, variation, time_before_deserialization,
+                           service_time_emulator, event_router=None):
         current_processing_time = datetime.datetime.now().timestamp() - time_before_deserialization
         if variation != 0:
             processing_time += self.get_delta_variation(variation)
         missing_processing_time = processing_time - current_processing_time
-        if missing_processing_time > 0:
-            time.sleep(missing_processing_time)
+        service_time_emulator.emulate(missing_processing_time)
         # this is a fake method
+        achieved_processing_time = datetime.datetime.now().timestamp() - time_before_deserialization
+        service_time_emulator.register_service_time(processing_time, achieved_processing_time)
+        active_span = self.tracer.active_span
+        if active_span is not None:
+            active_span.set_tag(SERVICE_TIME_TARGET_TAG, processing_time)
+            active_span.set_tag(SERVICE_TIME_ACHIEVED_TAG, achieved_processing_time)
+        if event_router is not None:
+            self.forward_event(event_data, event_router)
 
-    def process_data_event_wrapper(self, event_data, json_msg, processing_time, variation, time_before_deserialization):
+    def process_data_event_wrapper(self, event_data, json_msg, processing_time, variation, time_before_deserialization,
+                                   service_time_emulator, event_router=None):
         self.event_trace_for_method_with_event_data(
             method=self.process_data_event,
             method_args=(),
@@ -81,6 +114,8 @@ class TaskAddBackgroundMockedStreamConsumer(BaseTask):
                 'processing_time': processing_time,
                 'variation': variation,
                 'time_before_deserialization': time_before_deserialization,
+                'service_time_emulator': service_time_emulator,
+                'event_router': event_router,
             },
             get_event_tracer=True,
             tracer_tags={
@@ -95,42 +130,219 @@ class TaskAddBackgroundMockedStreamConsumer(BaseTask):
         event_data = json.loads(event_json)
         return event_data
 
-    def consume_events(self, stream_key, processing_time, max_time, variation):
-        self.tracer = init_tracer('MockedStreamConsumer', **self.tracer_configs)
+    def read_events_batch(self, stream, read_batch_size):
+        events = []
+        streams_events_list = stream.input_consumer_group.read(count=read_batch_size, block=self.read_block_time)
+        for stream_id, event_list in streams_events_list:
+            events.extend(event_list)
+        return events
 
-        stream = self.stream_factory.create(
-            stream_key
-        )
+    def ack_events(self, stream, event_ids):
+        # a single XACK for all the events ids
+        return stream.redis_db.xack(stream.key, stream.input_consumer_group.name, *event_ids)
+
+    def init_consumer_tracer(self, service_name):
+        # the tracer is initialized only once for each process, and shared by its consumer threads
+        if self.tracer is None:
+            self.tracer = init_tracer(service_name, **self.tracer_configs)
+
+    def get_event_router(self, output_streams, routing, routing_field):
+        if not output_streams:
+            return None
+        streams = [self.stream_factory.create(stream_key, stype='streamOnly') for stream_key in output_streams]
+        return EventRouter(streams, routing=routing, routing_field=routing_field)
+
+    def get_consumer_stream(self, stream, consumer_name):
+        # same consumer group stream, but reading as another consumer of the group
+        consumer_stream = copy.copy(stream)
+        consumer_stream.input_consumer_group = stream.input_consumer_group.consumer(consumer_name)
+        return consumer_stream
+
+    def consume_stream_events(self, stream, processing_time, max_time, variation, read_batch_size=1,
+                              ack_batch_size=None, service_time_mode='sleep', working_set_size=0,
+                              service_time_distribution=None, output_streams=None, routing='round_robin',
+                              routing_field=None, stop_event=None):
+        if ack_batch_size is None:
+            ack_batch_size = read_batch_size
+        service_time_emulator = ServiceTimeEmulator(mode=service_time_mode, working_set_size=working_set_size)
+        service_time_sampler = None
+        if service_time_distribution is not None:
+            service_time_sampler = ServiceTimeSampler(service_time_distribution)
+        event_router = self.get_event_router(output_streams, routing, routing_field)
         init_time = datetime.datetime.now()
         total_time = 0
         total_events = 0
-        while total_time < max_time:
-            event_list = stream.read_events(count=1)
-            for event_tuple in event_list:
-                event_id, json_msg = event_tuple
-                time_before_deserialization = datetime.datetime.now().timestamp()
-                try:
-                    event_data = self.default_event_deserializer(json_msg)
-                    self.process_data_event_wrapper(event_data, json_msg, processing_time, variation, time_before_deserialization)
-                    total_events += 1
-                    self.logger.debug(f'Consumed new event: {json_msg}')
-                finally:
-                    if self.ack_data_stream_events:
-                        stream.ack(event_id)
-
-            total_time = datetime.datetime.now().timestamp() - init_time.timestamp()
+        total_reads = 0
+        total_acks = 0
+        busy_time = 0
+        pending_ack_event_ids = []
+        try:
+            while total_time < max_time and not (stop_event is not None and stop_event.is_set()):
+                event_list = self.read_events_batch(stream, read_batch_size)
+                total_reads += 1
+                for event_tuple in event_list:
+                    event_id, json_msg = event_tuple
+                    time_before_deserialization = datetime.datetime.now().timestamp()
+                    event_processing_time = processing_time
+                    if service_time_sampler is not None:
+                        event_processing_time = service_time_sampler.sample()
+                    try:
+                        event_data = self.default_event_deserializer(json_msg)
+                        self.process_data_event_wrapper(
+                            event_data, json_msg, event_processing_time, variation, time_before_deserialization,
+                            service_time_emulator, event_router)
+                        total_events += 1
+                        self.logger.debug(f'Consumed new event: {json_msg}')
+                    finally:
+                        if self.ack_data_stream_events:
+                            pending_ack_event_ids.append(event_id)
+                        busy_time += datetime.datetime.now().timestamp() - time_before_deserialization
+
+                if len(pending_ack_event_ids) >= ack_batch_size:
+                    self.ack_events(stream, pending_ack_event_ids)
+                    total_acks += 1
+                    pending_ack_event_ids = []
+                total_time = datetime.datetime.now().timestamp() - init_time.timestamp()
+        finally:
+            if pending_ack_event_ids:
+                self.ack_events(stream, pending_ack_event_ids)
+                total_acks += 1
+        consumer_stats = {
+            'total_events': total_events,
+            'total_time': total_time,
+            'busy_time': busy_time,
+            'total_reads': total_reads,
+            'total_acks': total_acks,
+        }
+        consumer_stats.update(service_time_emulator.get_stats())
+        if event_router is not None:
+            consumer_stats['forwarded_events'] = event_router.forwarded_events
+        return consumer_stats
+
+    def consume_events(self, stream_key, consume_kwargs, service_name=MOCKED_CONSUMER_SERVICE_NAME):
+        self.init_consumer_tracer(service_name)
+
+        stream = self.stream_factory.create(
+            stream_key
+        )
+        consumer_stats = self.consume_stream_events(stream, **consume_kwargs)
+        total_events = consumer_stats['total_events']
+        total_time = consumer_stats['total_time']
         self.logger.info(
             f'Finished consuming on stream "{stream_key}".'
             f'Total events consummed: {total_events}. Total Time: {total_time}'
-            f' Time for each event: expected={processing_time} real={total_time/total_events}.'
+            f' Time for each event: expected={consume_kwargs["processing_time"]} real={total_time/total_events}.'
+            f' Redis reads: {consumer_stats["total_reads"]}. Redis acks: {consumer_stats["total_acks"]}.'
+            f' Service time ({consumer_stats["service_time_mode"]}):'
+            f' target={consumer_stats["service_time_target_avg"]} achieved={consumer_stats["service_time_achieved_avg"]}'
+            f' max error={consumer_stats["service_time_error_max"]}.'
+            f' Forwarded events: {consumer_stats.get("forwarded_events")}.'
         )
+        return consumer_stats
+
+    def run_pool_consumer(self, stream, consumer_name, consume_kwargs, service_name, stop_event, stats_queue):
+        consumer_stats = {'consumer_name': consumer_name}
+        try:
+            self.init_consumer_tracer(service_name)
+            consumer_stream = self.get_consumer_stream(stream, consumer_name)
+            consumer_stats.update(self.consume_stream_events(consumer_stream, stop_event=stop_event, **consume_kwargs))
+        except Exception as e:
+            self.logger.exception(f'Error on consumer "{consumer_name}"')
+            consumer_stats['error'] = str(e)
+        finally:
+            stats_queue.put(consumer_stats)
 
-    def background_consume_events(self, stream_key, processing_time, max_time, variation):
-        pub_sub_proc = Process(
-            target=self.consume_events,
-            args=(stream_key, processing_time, max_time, variation),
+    def start_pool_consumer(self, stream, consumer_name, consume_kwargs, service_name, concurrency_mode, stats_queue):
+        if concurrency_mode == 'thread':
+            stop_event = threading.Event()
+            worker_class = threading.Thread
+        else:
+            stop_event = multiprocessing.Event()
+            worker_class = Process
+        worker = worker_class(
+            target=self.run_pool_consumer,
+            args=(stream, consumer_name, consume_kwargs, service_name, stop_event, stats_queue),
             daemon=True
         )
+        worker.start()
+        return worker, stop_event
+
+    def consume_events_with_pool(self, stream_key, consume_kwargs, concurrency, concurrency_mode, scaling,
+                                 service_name=MOCKED_CONSUMER_SERVICE_NAME):
+        # runs "concurrency" consumers on the same consumer group, and changes the number of active consumers
+        # at each scaling time (seconds since the consumers start) to its new concurrency
+        if concurrency_mode not in ['thread', 'process']:
+            raise Exception(f'Unknown concurrency mode "{concurrency_mode}". Use "thread" or "process".')
+        stream = self.stream_factory.create(
+            stream_key
+        )
+        if concurrency_mode == 'thread':
+            self.init_consumer_tracer(service_name)
+            stats_queue = queue.Queue()
+        else:
+            stats_queue = multiprocessing.Queue()
+        max_time = consume_kwargs['max_time']
+        init_ts = datetime.datetime.now().timestamp()
+        active_consumers = []
+        started_consumers = []
+
+        def scale_consumers(new_concurrency):
+            while len(active_consumers) < new_concurrency:
+                consumer_name = f'{stream_key}-consumer-{len(started_consumers)}'
+                consumer_kwargs = consume_kwargs.copy()
+                consumer_kwargs['max_time'] = max_time - (datetime.datetime.now().timestamp() - init_ts)
+                consumer = self.start_pool_consumer(
+                    stream, consumer_name, consumer_kwargs, service_name, concurrency_mode, stats_queue)
+                active_consumers.append(consumer)
+                started_consumers.append(consumer)
+            while len(active_consumers) > new_concurrency:
+                worker, stop_event = active_consumers.pop()
+                stop_event.set()
+            self.logger.info(f'Consumers on stream "{stream_key}": {len(active_consumers)}')
+
+        scale_consumers(concurrency)
+        for scaling_event in sorted(scaling, key=lambda scaling_event: scaling_event['time']):
+            if scaling_event['time'] >= max_time:
+                break
+            missing_time = init_ts + scaling_event['time'] - datetime.datetime.now().timestamp()
+            if missing_time > 0:
+                time.sleep(missing_time)
+            scale_consumers(scaling_event['concurrency'])
+
+        # the consumers reads are bounded by read_block_time, this is only a safety limit for the ones that hang
+        stop_timeout_ts = init_ts + max_time + self.pool_stop_timeout
+        consumers_stats = []
+        try:
+            for _ in started_consumers:
+                consumers_stats.append(
+                    stats_queue.get(timeout=max(stop_timeout_ts - datetime.datetime.now().timestamp(), 0)))
+        except queue.Empty:
+            self.logger.warning(
+                f'{len(started_consumers) - len(consumers_stats)} consumers on stream "{stream_key}" did not finish.')
+        consumers_stats.sort(key=lambda consumer_stats: int(consumer_stats['consumer_name'].rsplit('-', 1)[-1]))
+        for consumer_stats in consumers_stats:
+            self.logger.info(f'Consumer stats on stream "{stream_key}": {consumer_stats}')
+        self.logger.info(
+            f'Finished consuming on stream "{stream_key}" with {len(started_consumers)} consumers. '
+            f'Total events consummed: {sum(stats.get("total_events", 0) for stats in consumers_stats)}.'
+        )
+        return consumers_stats
+
+    def background_consume_events(self, stream_key, consume_kwargs, concurrency, concurrency_mode, scaling,
+                                  service_name):
+        if concurrency == 1 and not scaling:
+            pub_sub_proc = Process(
+                target=self.consume_events,
+                args=(stream_key, consume_kwargs, service_name),
+                daemon=True
+            )
+        else:
+            # daemon processes can't start the pool consumers processes
+            pub_sub_proc = Process(
+                target=self.consume_events_with_pool,
+                args=(stream_key, consume_kwargs, concurrency, concurrency_mode, scaling, service_name),
+                daemon=concurrency_mode == 'thread'
+            )
         pub_sub_proc.start()
         self.processes.append(pub_sub_proc)
         return
@@ -140,14 +352,32 @@ class TaskAddBackgroundMockedStreamConsumer(BaseTask):
             action = action_data.get('action', '')
             if action == 'consumeStream':
                 stream_key = action_data['stream_key']
-                processing_time = action_data['processing_time']
-                max_time = action_data['max_time']
-                variation = action_data.get('variation', 0)
+                consume_kwargs = {
+                    'processing_time': action_data.get('processing_time'),
+                    'max_time': action_data['max_time'],
+                    'variation': action_data.get('variation', 0),
+                    'read_batch_size': action_data.get('read_batch_size', 1),
+                    'ack_batch_size': action_data.get('ack_batch_size'),
+                    'service_time_mode': action_data.get('service_time_mode', 'sleep'),
+                    'working_set_size': action_data.get('working_set_size', 0),
+                    'service_time_distribution': action_data.get('service_time_distribution'),
+                    'output_streams': action_data.get('output_streams'),
+                    'routing': action_data.get('routing', 'round_robin'),
+                    'routing_field': action_data.get('routing_field'),
+                }
+                if consume_kwargs['processing_time'] is None and consume_kwargs['service_time_distribution'] is None:
+                    raise Exception('processing_time and service_time_distribution are undefined.')
+                concurrency = action_data.get('concurrency', 1)
+                concurrency_mode = action_data.get('concurrency_mode', 'process')
+                scaling = action_data.get('scaling', [])
+                service_name = action_data.get('service_name', MOCKED_CONSUMER_SERVICE_NAME)
                 self.logger.info(
-                    f'Consuming events from {stream_key} with a processing time of {processing_time} per event.'
-                    f' With max_time={max_time}.'
+                    f'Consuming events from {stream_key} with a processing time of '
+                    f'{consume_kwargs["processing_time"]} per event. With max_time={consume_kwargs["max_time"]}'
+                    f' and {concurrency} consumers ({concurrency_mode}).'
                 )
-                self.background_consume_events(stream_key, processing_time, max_time, variation)
+                self.background_consume_events(
+                    stream_key, consume_kwargs, concurrency, concurrency_mode, scaling, service_name)
                 return True
         return False
 
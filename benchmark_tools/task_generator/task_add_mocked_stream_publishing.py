@@ -1,6 +1,8 @@
 #!/usr/bin/env python
-import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
 import time
 from multiprocessing import Process
 import uuid
@@ -8,6 +10,9 @@ import uuid
 from event_service_utils.streams.redis import RedisStreamFactory
 
 from benchmark_tools.task_generator.base import BaseTask
+from benchmark_tools.task_generator.event_templates import PreSerializedEventTemplate
+from benchmark_tools.task_generator.load_profiles import get_load_profile_schedule
+from benchmark_tools.task_generator.pacing import EventPacer
 
 
 class TaskAddBackgroundMockedStream(BaseTask):
@@ -15,6 +20,17 @@ class TaskAddBackgroundMockedStream(BaseTask):
     def __init__(self, *args, **kwargs):
         super(TaskAddBackgroundMockedStream, self).__init__(*args, **kwargs)
         self.stream_factory = kwargs['stream_factory']
+        # if defined, the publishing stats (achieved FPS and send lateness histogram) of each stream are saved here
+        self.output_path = kwargs.get('output_path')
+        # when defined, all the streams are published by this fixed number of processes,
+        # each multiplexing its streams on an event loop instead of using one process per stream
+        self.publisher_workers = kwargs.get('publisher_workers')
+        # number of threads (and so pooled redis connections) used by each publisher worker to write the events
+        self.publisher_connections = kwargs.get('publisher_connections') or 4
+        # events due within max_batch_latency seconds are sent together (up to max_batch_size) in one redis pipeline
+        self.max_batch_size = kwargs.get('max_batch_size') or 1
+        self.max_batch_latency = kwargs.get('max_batch_latency') or 0.005
+        self.pending_publishers = []
         self.processes = []
 
     def should_keep_publishing(self, total_events, total_time, max_events, max_time):
@@ -26,62 +42,169 @@ class TaskAddBackgroundMockedStream(BaseTask):
                 return False
         return True
 
-    def create_event_from_template(self, proc_random_id, event_index, event_template):
-        event_data = event_template.copy()
-        event_data.update({
-            'id': self.event_index_and_random_event_id(proc_random_id, event_index),
-        })
-        return event_data
+    def process_random_id(self):
+        return str(uuid.uuid4())
 
-    def default_event_serializer(self, event_data):
-        event_msg = {'event': json.dumps(event_data)}
-        return event_msg
+    def log_publishing_stats(self, publishing_stats):
+        self.logger.info(
+            f'Finished publishing on stream "{publishing_stats["stream_key"]}". '
+            f'(process random id: "{publishing_stats["pub_id"]}"). '
+            f'Total events published: {publishing_stats["total_events"]}. '
+            f'Total Time: {publishing_stats["total_time"]}. '
+            f'Target FPS: {publishing_stats["fps"]}. Actual FPS: {publishing_stats["achieved_fps"]}. '
+            f'Send lateness: avg={publishing_stats["lateness_avg"]} max={publishing_stats["lateness_max"]} '
+            f'histogram={publishing_stats["lateness_histogram"]}. '
+            f'Events per redis round trip: {publishing_stats["events_per_round_trip"]}. '
+            f'Event creation time: {publishing_stats["event_creation_time_avg"]}'
+        )
 
-    def event_index_and_random_event_id(self, proc_random_id, event_index):
-        return f'{proc_random_id}:{event_index}'
+    def save_publishing_stats(self, publishing_stats):
+        output_file = os.path.join(self.output_path, f'publishing_stats_{publishing_stats["stream_key"]}.json')
+        with open(output_file, 'w') as f:
+            json.dump(publishing_stats, f, indent=4)
 
-    def process_random_id(self):
-        return str(uuid.uuid4())
+    def report_publishing_stats(self, pub_id, stream_key, pacer, events_creation_time):
+        publishing_stats = {'pub_id': pub_id, 'stream_key': stream_key}
+        publishing_stats.update(pacer.get_stats())
+        publishing_stats['event_creation_time_avg'] = (
+            events_creation_time / pacer.total_events if pacer.total_events > 0 else None)
+        self.log_publishing_stats(publishing_stats)
+        if self.output_path is not None:
+            self.save_publishing_stats(publishing_stats)
+        return publishing_stats
+
+    def get_events_batch_size(self, pacer, max_events):
+        batch_size = pacer.get_batch_size(self.max_batch_size, self.max_batch_latency)
+        if max_events is not None:
+            batch_size = min(batch_size, max_events - pacer.total_events)
+        return batch_size
+
+    def write_events_batch(self, stream, events):
+        if len(events) == 1:
+            return stream.write_events(*events)
+        pipeline = stream.redis_db.pipeline(transaction=False)
+        for event in events:
+            pipeline.xadd(stream.key, event, **stream.default_write_kwargs)
+        return pipeline.execute()
+
+    def create_events_batch(self, serialized_template, first_event_index, batch_size):
+        return [
+            {'event': serialized_template.serialize(event_index)}
+            for event_index in range(first_event_index, first_event_index + batch_size)
+        ]
+
+    def get_event_pacer(self, fps, load_profile, max_events, max_time):
+        if load_profile is None:
+            return EventPacer(fps=fps)
+        schedule = get_load_profile_schedule(load_profile, max_events=max_events, max_time=max_time)
+        return EventPacer(fps=fps, schedule=schedule)
 
-    def ensure_fps(self, expected_event_pub_time, last_event_ts):
-        current_ts = datetime.datetime.now().timestamp()
-        time_since_last_event = current_ts - last_event_ts
-        if time_since_last_event < expected_event_pub_time:
-            missing_event_interval = expected_event_pub_time - time_since_last_event
-            time.sleep(missing_event_interval * 0.85)
+    def should_keep_pacing(self, pacer, max_events, max_time):
+        return pacer.has_next_event() and self.should_keep_publishing(
+            pacer.total_events, pacer.get_total_time(), max_events, max_time)
 
-    def publish_events(self, pub_id, stream_key, fps, event_template, max_events=None, max_time=None):
+    def publish_events(self, pub_id, stream_key, fps, event_template, max_events=None, max_time=None,
+                       load_profile=None, per_event_fields=None):
         proc_random_id = pub_id
         stream = self.stream_factory.create(
             stream_key, stype='streamOnly'
         )
-        init_time = datetime.datetime.now()
-        total_time = 0
-        total_events = 0
-        event_index = 0
-        last_event_ts = init_time.timestamp()
-        expected_event_pub_time = 1 / fps
-        while self.should_keep_publishing(total_events, total_time, max_events, max_time):
-            self.ensure_fps(expected_event_pub_time, last_event_ts)
-
-            event_data = self.create_event_from_template(proc_random_id, event_index, event_template)
-            stream.write_events(self.default_event_serializer(event_data))
-            self.logger.debug(f'Published new event: {event_data}')
-            last_event_ts = datetime.datetime.now().timestamp()
-            event_index += 1
-            total_events += 1
-            total_time = datetime.datetime.now().timestamp() - init_time.timestamp()
-        self.logger.info(
-            f'Finished publishing on stream "{stream_key}". (process random id: "{proc_random_id}"). '
-            f'Total events published: {total_events}. Total Time: {total_time}'
-            f'Actual FPS: {total_events/total_time}'
-        )
+        serialized_template = PreSerializedEventTemplate(event_template, pub_id, per_event_fields)
+        events_creation_time = 0
+        pacer = self.get_event_pacer(fps, load_profile, max_events, max_time)
+        while self.should_keep_pacing(pacer, max_events, max_time):
+            batch_size = self.get_events_batch_size(pacer, max_events)
+            missing_event_interval = pacer.get_wait_time(batch_size)
+            if missing_event_interval > 0:
+                time.sleep(missing_event_interval)
+
+            creation_start_time = time.perf_counter()
+            events = self.create_events_batch(serialized_template, pacer.total_events, batch_size)
+            events_creation_time += time.perf_counter() - creation_start_time
+            pacer.register_events_sent(batch_size)
+            self.write_events_batch(stream, events)
+            self.logger.debug(f'Published new events: {events}')
+        return self.report_publishing_stats(proc_random_id, stream_key, pacer, events_creation_time)
+
+    async def async_publish_events(self, executor, pub_id, stream_key, fps, event_template, max_events=None,
+                                   max_time=None, load_profile=None, per_event_fields=None):
+        loop = asyncio.get_event_loop()
+        stream = await loop.run_in_executor(
+            executor, lambda: self.stream_factory.create(stream_key, stype='streamOnly'))
+        serialized_template = PreSerializedEventTemplate(event_template, pub_id, per_event_fields)
+        events_creation_time = 0
+        pacer = self.get_event_pacer(fps, load_profile, max_events, max_time)
+        while self.should_keep_pacing(pacer, max_events, max_time):
+            # each stream is paced by its own event deadlines, while the other streams use the loop
+            batch_size = self.get_events_batch_size(pacer, max_events)
+            missing_event_interval = pacer.get_wait_time(batch_size)
+            if missing_event_interval > 0:
+                await asyncio.sleep(missing_event_interval)
+
+            creation_start_time = time.perf_counter()
+            events = self.create_events_batch(serialized_template, pacer.total_events, batch_size)
+            events_creation_time += time.perf_counter() - creation_start_time
+            pacer.register_events_sent(batch_size)
+            await loop.run_in_executor(executor, self.write_events_batch, stream, events)
+        return self.report_publishing_stats(pub_id, stream_key, pacer, events_creation_time)
 
-    def background_publish_events(self, pub_id, stream_key, fps, event_template, max_events, max_time):
+    async def async_publish_many_streams(self, publishers):
+        executor = ThreadPoolExecutor(max_workers=self.publisher_connections)
+        try:
+            return await asyncio.gather(*[
+                self.async_publish_events(executor, **publisher) for publisher in publishers
+            ])
+        finally:
+            executor.shutdown(wait=True)
+
+    def multiplexed_publish_events(self, publishers):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            streams_stats = loop.run_until_complete(self.async_publish_many_streams(publishers))
+        finally:
+            loop.close()
+        return streams_stats
+
+    def get_publisher_workers_publishers(self, publishers):
+        total_workers = min(self.publisher_workers, len(publishers))
+        return [publishers[worker_index::total_workers] for worker_index in range(total_workers)]
+
+    def start_multiplexed_publishers(self):
+        if not self.pending_publishers:
+            return
+        for worker_publishers in self.get_publisher_workers_publishers(self.pending_publishers):
+            pub_sub_proc = Process(
+                target=self.multiplexed_publish_events,
+                args=(worker_publishers,),
+                daemon=True
+            )
+            pub_sub_proc.start()
+            self.processes.append(pub_sub_proc)
+        self.pending_publishers = []
+
+    def background_publish_events(self, pub_id, stream_key, fps, event_template, max_events, max_time, load_profile,
+                                  per_event_fields):
+        if self.publisher_workers:
+            # started together with the other consecutive publishToStream actions
+            self.pending_publishers.append({
+                'pub_id': pub_id,
+                'stream_key': stream_key,
+                'fps': fps,
+                'event_template': event_template,
+                'max_events': max_events,
+                'max_time': max_time,
+                'load_profile': load_profile,
+                'per_event_fields': per_event_fields,
+            })
+            return
         pub_sub_proc = Process(
             target=self.publish_events,
             args=(pub_id, stream_key, fps, event_template),
-            kwargs={'max_events': max_events, 'max_time': max_time},
+            kwargs={
+                'max_events': max_events, 'max_time': max_time,
+                'load_profile': load_profile, 'per_event_fields': per_event_fields
+            },
             daemon=True
         )
         pub_sub_proc.start()
@@ -89,31 +212,53 @@ class TaskAddBackgroundMockedStream(BaseTask):
         return
 
     def process_action(self, action_data):
+        if action_data.get('action', '') != 'publishToStream':
+            self.start_multiplexed_publishers()
         if not super(TaskAddBackgroundMockedStream, self).process_action(action_data):
             action = action_data.get('action', '')
             if action == 'publishToStream':
                 stream_key = action_data['stream_key']
-                fps = action_data['fps']
+                fps = action_data.get('fps')
+                load_profile = action_data.get('load_profile')
+                per_event_fields = action_data.get('per_event_fields')
                 event_template = action_data['event_template']
                 max_events = action_data.get('max_events')
                 max_time = action_data.get('max_time')
                 pub_id = action_data.get('pub_id', self.process_random_id())
-                if max_time is None and max_events is None:
+                if fps is None and load_profile is None:
+                    raise Exception('fps and load_profile are undefined. At least one should be defined.')
+                if max_time is None and max_events is None and load_profile is None:
                     raise Exception('max_events and max_time are undefined. At least one should be defined.')
+                if load_profile is not None:
+                    # invalid profiles fail here, instead of only inside the background publisher
+                    get_load_profile_schedule(load_profile, max_events=max_events, max_time=max_time)
                 self.logger.info((
                     f'"{pub_id}" Publishing "{event_template}" events into'
-                    f' {stream_key} stream at {fps} FPS. With max_events={max_events} and max_time={max_time}'
+                    f' {stream_key} stream at {fps} FPS (load profile: {load_profile}).'
+                    f' With max_events={max_events} and max_time={max_time}'
                 ))
-                self.background_publish_events(pub_id, stream_key, fps, event_template, max_events, max_time)
+                self.background_publish_events(
+                    pub_id, stream_key, fps, event_template, max_events, max_time, load_profile, per_event_fields)
                 return True
         return False
 
+    def execute_actions(self):
+        super(TaskAddBackgroundMockedStream, self).execute_actions()
+        self.start_multiplexed_publishers()
+
 
-def run(actions, redis_address, redis_port, logging_level, max_stream_length):
+def run(actions, redis_address, redis_port, logging_level, max_stream_length,
+        publisher_workers=None, publisher_connections=None, output_path=None,
+        max_batch_size=None, max_batch_latency=None):
     stream_factory = RedisStreamFactory(host=redis_address, port=redis_port, max_stream_length=max_stream_length)
     task = TaskAddBackgroundMockedStream(
         actions=actions,
         stream_factory=stream_factory,
+        publisher_workers=publisher_workers,
+        publisher_connections=publisher_connections,
+        output_path=output_path,
+        max_batch_size=max_batch_size,
+        max_batch_latency=max_batch_latency,
         logging_level=logging_level
     )
     task.execute_actions()
@@ -147,6 +292,7 @@ if __name__ == '__main__':
         "redis_port": "6379",
         "logging_level": "INFO",
         "max_stream_length": None,
+        "publisher_workers": 4,
         "actions": actions
     }
     run(**kwargs)
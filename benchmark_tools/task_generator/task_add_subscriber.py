@@ -1,52 +1,147 @@
 #!/usr/bin/env python
-import hashlib
+import atexit
+import datetime
+import json
+import multiprocessing
 import os
+import queue
 import threading
+from multiprocessing import Process
+
 from event_service_utils.streams.redis import RedisStreamFactory
 
 from benchmark_tools.task_generator.base import BaseTask
 
 
 class TaskAddBackgroundSubscriberEventsExporter(BaseTask):
+    OUTPUT_FILE_BUFFER_SIZE = 1024 * 1024
 
     def __init__(self, *args, **kwargs):
         super(TaskAddBackgroundSubscriberEventsExporter, self).__init__(*args, **kwargs)
         self.stream_factory = kwargs['stream_factory']
         self.output_path = kwargs['output_path']
-        self.threads = []
+        self.read_batch_size = kwargs.get('read_batch_size') or 100
+        # reads block for at most this time (in milliseconds), so the stop signal is noticed
+        self.read_block_time = kwargs.get('read_block_time') or 1000
+        self.drain_timeout = kwargs.get('drain_timeout') or 10
+        self.subscriptions = []
+        self.exporter_process = None
+        self.stop_event = multiprocessing.Event()
+        self.stats_queue = multiprocessing.Queue()
+        self.subscriptions_stats = None
 
-    def sub_event_handler(self, json_msg, output_file):
+    def get_event_json(self, json_msg):
         event_key = b'event' if b'event' in json_msg else 'event'
-        event_json = json_msg.get(event_key, '{}').decode('utf-8')
-        with open(output_file, 'a') as f:
-            f.write(event_json + '\n')
+        event_json = json_msg.get(event_key, b'{}')
+        if isinstance(event_json, str):
+            event_json = event_json.encode('utf-8')
+        return event_json
 
-    def subscription_export(self, subscriber_id, stream_key, output_file):
-        subscriber_query_output_stream = self.stream_factory.create(
-            stream_key, stype='streamAndConsumer'
-        )
-        if os.path.exists(output_file):
-            os.remove(output_file)
-        while True:
-            event_list = subscriber_query_output_stream.read_events(count=10)
-            for event_tuple in event_list:
-                event_id, json_msg = event_tuple
-                self.logger.debug(f'new event {json_msg}')
-                try:
-                    self.sub_event_handler(json_msg, output_file)
-                except Exception as e:
-                    self.logger.error(f'Error processing {json_msg}:')
-                    self.logger.exception(e)
-
-    def background_subscription_export(self, subscriber_id, stream_key, output_file):
-        subscriber_thread = threading.Thread(
-            target=self.subscription_export,
-            args=(subscriber_id, stream_key, output_file,),
+    def read_events_batch(self, subscriber_query_output_stream, block):
+        events = []
+        streams_events_list = subscriber_query_output_stream.input_consumer_group.read(
+            count=self.read_batch_size, block=block)
+        for stream_id, event_list in streams_events_list:
+            events.extend(event_list)
+        return events
+
+    def subscription_export(self, subscriber_id, subscriber_query_output_stream, output_file):
+        # blocking batched reads written through a single buffered writer, until the stop signal, after which
+        # the events still on the stream are drained (for at most drain_timeout seconds) before closing the file
+        total_events = 0
+        drain_timeout_ts = None
+        with open(output_file, 'wb', buffering=self.OUTPUT_FILE_BUFFER_SIZE) as f:
+            while True:
+                if drain_timeout_ts is None and self.stop_event.is_set():
+                    drain_timeout_ts = datetime.datetime.now().timestamp() + self.drain_timeout
+                draining = drain_timeout_ts is not None
+                event_list = self.read_events_batch(
+                    subscriber_query_output_stream, block=None if draining else self.read_block_time)
+                lines = []
+                for event_id, json_msg in event_list:
+                    self.logger.debug(f'new event {json_msg}')
+                    try:
+                        lines.append(self.get_event_json(json_msg))
+                    except Exception as e:
+                        self.logger.error(f'Error processing {json_msg}:')
+                        self.logger.exception(e)
+                if lines:
+                    f.write(b'\n'.join(lines) + b'\n')
+                    total_events += len(lines)
+                if draining and (not event_list or datetime.datetime.now().timestamp() > drain_timeout_ts):
+                    break
+        return {
+            'subscriber_id': subscriber_id,
+            'output_file': output_file,
+            'total_events': total_events,
+        }
+
+    def run_subscription_export(self, subscriber_id, subscriber_query_output_stream, output_file):
+        subscription_stats = {'subscriber_id': subscriber_id, 'output_file': output_file}
+        try:
+            subscription_stats.update(
+                self.subscription_export(subscriber_id, subscriber_query_output_stream, output_file))
+        except Exception as e:
+            self.logger.exception(f'Error exporting subscription "{subscriber_query_output_stream.key}"')
+            subscription_stats['error'] = str(e)
+        finally:
+            self.stats_queue.put((subscriber_query_output_stream.key, subscription_stats))
+
+    def subscriptions_export(self, subscriptions):
+        # runs on the exporter process, with one thread for each subscription
+        threads = []
+        for subscriber_id, subscriber_query_output_stream, output_file in subscriptions:
+            subscriber_thread = threading.Thread(
+                target=self.run_subscription_export,
+                args=(subscriber_id, subscriber_query_output_stream, output_file,),
+                daemon=True
+            )
+            subscriber_thread.start()
+            threads.append(subscriber_thread)
+        for subscriber_thread in threads:
+            subscriber_thread.join()
+
+    def start_exporter_process(self):
+        if not self.subscriptions:
+            return
+        # the exporter has its own process, so it doesn't compete with the controller for the GIL
+        self.exporter_process = Process(
+            target=self.subscriptions_export,
+            args=(self.subscriptions,),
             daemon=True
         )
-        subscriber_thread.start()
-        self.threads.append(subscriber_thread)
-        return
+        self.exporter_process.start()
+
+    def save_subscriptions_stats(self):
+        stats_file = os.path.join(self.output_path, 'subscriptions_stats.json')
+        with open(stats_file, 'w') as f:
+            json.dump(self.subscriptions_stats, f, indent=4)
+
+    def stop(self):
+        # stops the subscriptions, waiting for them to drain their streams and flush their files
+        if self.subscriptions_stats is not None:
+            return self.subscriptions_stats
+        self.stop_event.set()
+        self.subscriptions_stats = {}
+        if self.exporter_process is None:
+            return self.subscriptions_stats
+        stop_timeout_ts = datetime.datetime.now().timestamp() + self.read_block_time / 1000 + self.drain_timeout + 5
+        try:
+            for _ in self.subscriptions:
+                stream_key, subscription_stats = self.stats_queue.get(
+                    timeout=max(stop_timeout_ts - datetime.datetime.now().timestamp(), 0))
+                self.subscriptions_stats[stream_key] = subscription_stats
+        except queue.Empty:
+            self.logger.warning(
+                f'{len(self.subscriptions) - len(self.subscriptions_stats)} subscriptions did not finish exporting.')
+        self.exporter_process.join(timeout=max(stop_timeout_ts - datetime.datetime.now().timestamp(), 0))
+        for stream_key, subscription_stats in self.subscriptions_stats.items():
+            self.logger.info(
+                f'Subscription "{stream_key}" exported {subscription_stats.get("total_events")} events'
+                f' to: {subscription_stats["output_file"]}'
+            )
+        self.save_subscriptions_stats()
+        return self.subscriptions_stats
 
     def process_action(self, action_data):
         if not super(TaskAddBackgroundSubscriberEventsExporter, self).process_action(action_data):
@@ -54,26 +149,41 @@ class TaskAddBackgroundSubscriberEventsExporter(BaseTask):
             if action == 'exportSubscribeToQuery':
                 subscriber_id = action_data['subscriber_id']
                 stream_key = action_data['stream_key']
-                # if stream_key is None:
-                #     stream_key = hashlib.md5(f"{subscriber_id}_{query_num}".encode('utf-8')).hexdigest()
                 output_file = os.path.join(self.output_path, f'subscription_{stream_key}.jl')
                 self.logger.info(
                     f'Subscribing for {subscriber_id}: {stream_key} at stream "{stream_key}" and outputing to Json lines file: {output_file}'
                 )
-                self.background_subscription_export(subscriber_id, stream_key, output_file)
+                # the consumer group is created right away, so no event is lost until the exporter starts
+                subscriber_query_output_stream = self.stream_factory.create(
+                    stream_key, stype='streamAndConsumer'
+                )
+                self.subscriptions.append((subscriber_id, subscriber_query_output_stream, output_file))
                 return True
         return False
 
+    def execute_actions(self):
+        super(TaskAddBackgroundSubscriberEventsExporter, self).execute_actions()
+        self.start_exporter_process()
+
 
-def run(actions, redis_address, redis_port, output_path, logging_level):
+def run(actions, redis_address, redis_port, output_path, logging_level, read_batch_size=None,
+        read_block_time=None, drain_timeout=None, background_tasks=None):
     stream_factory = RedisStreamFactory(host=redis_address, port=redis_port)
     task = TaskAddBackgroundSubscriberEventsExporter(
         actions=actions,
         stream_factory=stream_factory,
         output_path=output_path,
+        read_batch_size=read_batch_size,
+        read_block_time=read_block_time,
+        drain_timeout=drain_timeout,
         logging_level=logging_level
     )
     task.execute_actions()
+    # the controller stops the background tasks before the evaluations, otherwise they are stopped on exit
+    if background_tasks is not None:
+        background_tasks.append(task)
+    else:
+        atexit.register(task.stop)
 
 
 if __name__ == '__main__':
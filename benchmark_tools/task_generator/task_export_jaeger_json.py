@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import datetime
 import json
 import os
 
@@ -11,17 +12,28 @@ from benchmark_tools.task_generator.base import BaseTask
 class JaegerExporter(BaseTask):
     JAEGER_TRACES_URL_FORMAT = (
         'api/traces?'
-        'limit=700000000&lookback=6h&maxDuration&minDuration&'
+        'limit=700000000&{time_window}&maxDuration&minDuration&'
         'operation={operation}&service={service}'
     )
+    JAEGER_LOOKBACK_URL_FORMAT = 'lookback=6h'
+    JAEGER_START_END_URL_FORMAT = 'start={start_mm_timestamp}&end={end_mm_timestamp}'
 
     def __init__(self, *args, **kwargs):
         super(JaegerExporter, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.benchmark_start_time = kwargs.get('benchmark_start_time')
+
+    def get_time_window(self):
+        if self.benchmark_start_time is None:
+            return self.JAEGER_LOOKBACK_URL_FORMAT
+        return self.JAEGER_START_END_URL_FORMAT.format(
+            start_mm_timestamp=int(self.benchmark_start_time * 10**6),
+            end_mm_timestamp=int(datetime.datetime.now().timestamp() * 10**6)
+        )
 
     def get_traces(self, service, operation):
         end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-            operation=operation, service=service)
+            time_window=self.get_time_window(), operation=operation, service=service)
         traces_url = f'{self.jaeger_api_host}/{end_point}'
         req = requests.get(traces_url)
         traces = req.json()
@@ -47,10 +59,11 @@ class JaegerExporter(BaseTask):
         return traces_js_file
 
 
-def run(actions, jaeger_api_host, logging_level):
+def run(actions, jaeger_api_host, logging_level, benchmark_start_time=None):
     task = JaegerExporter(
         actions=actions,
         jaeger_api_host=jaeger_api_host,
+        benchmark_start_time=benchmark_start_time,
         logging_level=logging_level
     )
     task.execute_actions()
@@ -1,49 +1,128 @@
 #!/usr/bin/env python
+import concurrent.futures
+import gzip
 import hashlib
 import os
+import time
+
 from event_service_utils.streams.redis import RedisStreamFactory
 
 from benchmark_tools.task_generator.base import BaseTask
 
 
 class TaskExportStreamContent(BaseTask):
+    OUTPUT_FILE_BUFFER_SIZE = 1024 * 1024
 
     def __init__(self, *args, **kwargs):
         super(TaskExportStreamContent, self).__init__(*args, **kwargs)
         self.stream_factory = kwargs['stream_factory']
         self.output_path = kwargs['output_path']
+        self.page_size = kwargs.get('page_size') or 10000
+        self.export_workers = kwargs.get('export_workers') or 4
+        self.compression = kwargs.get('compression')
+        if self.compression not in [None, 'gzip']:
+            raise Exception(f'Unknown export compression "{self.compression}". Use one of: [None, \'gzip\']')
+        self.pending_exports = []
+        self.exports_stats = {}
 
-    def sub_event_handler(self, json_msg, output_file):
+    def get_event_json(self, json_msg):
         event_key = b'event' if b'event' in json_msg else 'event'
-        event_json = json_msg.get(event_key, '{}').decode('utf-8')
-        with open(output_file, 'a') as f:
-            f.write(event_json + '\n')
+        event_json = json_msg.get(event_key, b'{}')
+        if isinstance(event_json, str):
+            event_json = event_json.encode('utf-8')
+        return event_json
+
+    def get_next_entry_id(self, entry_id):
+        # xrange min is inclusive, so the next page starts right after the last read entry id
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode('utf-8')
+        timestamp, sequence = entry_id.split('-')
+        return f'{timestamp}-{int(sequence) + 1}'
+
+    def open_output_file(self, output_file):
+        # a single buffered writer for the whole export
+        if self.compression == 'gzip':
+            return gzip.open(output_file, 'wb', compresslevel=6)
+        return open(output_file, 'wb', buffering=self.OUTPUT_FILE_BUFFER_SIZE)
+
+    def get_output_file(self, stream_key):
+        output_file = os.path.join(self.output_path, f'export_{stream_key}.jl')
+        if self.compression == 'gzip':
+            output_file += '.gz'
+        return output_file
 
     def stream_export(self, stream_key, output_file):
-        stream = self.stream_factory.create(
-            stream_key, stype='streamOnly'
-        )
-        last_entry_id = stream.last_msg_id
-        stream.last_msg_id = None
-        if os.path.exists(output_file):
-            os.remove(output_file)
-        read_all = False
+        # pages through the stream with xrange, up to the last entry when the export started
+        redis_db = self.stream_factory.redis_db
+        last_entries = redis_db.xrevrange(stream_key, count=1)
+        last_entry_id = last_entries[0][0] if last_entries else None
         self.logger.info(f'Last entry id: {last_entry_id}')
-        while not read_all:
-            event_list = stream.read_events(count=1)
-            for event_tuple in event_list:
-                event_id, json_msg = event_tuple
+
+        start_time = time.perf_counter()
+        total_events = 0
+        with self.open_output_file(output_file) as f:
+            min_id = '-'
+            while last_entry_id is not None:
+                events = redis_db.xrange(stream_key, min=min_id, max=last_entry_id, count=self.page_size)
+                if not events:
+                    break
+                lines = []
+                for event_id, json_msg in events:
+                    try:
+                        lines.append(self.get_event_json(json_msg))
+                    except Exception as e:
+                        self.logger.error(f'Error processing {json_msg}:')
+                        self.logger.exception(e)
+                if lines:
+                    f.write(b'\n'.join(lines) + b'\n')
+                total_events += len(lines)
+                last_read_id = events[-1][0]
+                if last_read_id == last_entry_id:
+                    break
+                min_id = self.get_next_entry_id(last_read_id)
+
+        total_time = time.perf_counter() - start_time
+        stats = {
+            'stream_key': stream_key,
+            'output_file': output_file,
+            'total_events': total_events,
+            'total_time': total_time,
+            'events_per_second': total_events / total_time if total_time > 0 else None,
+        }
+        self.logger.info(
+            f'Exported {total_events} events from "{stream_key}" stream in {total_time:.2f} seconds '
+            f'({stats["events_per_second"]} events/s)'
+        )
+        return stats
+
+    def export_pending_streams(self):
+        if not self.pending_exports:
+            return
+        start_time = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.export_workers) as executor:
+            futures = {
+                executor.submit(self.stream_export, stream_key, output_file): stream_key
+                for stream_key, output_file in self.pending_exports
+            }
+            for future in concurrent.futures.as_completed(futures):
+                stream_key = futures[future]
                 try:
-                    self.sub_event_handler(json_msg, output_file)
+                    self.exports_stats[stream_key] = future.result()
                 except Exception as e:
-                    self.logger.error(f'Error processing {json_msg}:')
+                    self.logger.error(f'Error exporting "{stream_key}" stream:')
                     self.logger.exception(e)
-                if event_id == last_entry_id:
-                    self.logger.info(f'Read event from Last entry id: {event_id}')
-                    read_all = True
-
+        total_time = time.perf_counter() - start_time
+        total_events = sum(self.exports_stats[stream_key]['total_events']
+                           for stream_key, _ in self.pending_exports if stream_key in self.exports_stats)
+        self.logger.info(
+            f'Exported {total_events} events from {len(self.pending_exports)} streams in {total_time:.2f} seconds '
+            f'({total_events / total_time if total_time > 0 else None} events/s)'
+        )
+        self.pending_exports = []
 
     def process_action(self, action_data):
+        if action_data.get('action', '') != 'exportQueryStream':
+            self.export_pending_streams()
         if not super(TaskExportStreamContent, self).process_action(action_data):
             action = action_data.get('action', '')
             if action == 'exportQueryStream':
@@ -52,21 +131,30 @@ class TaskExportStreamContent(BaseTask):
                 stream_key = action_data.get('stream_key')
                 if stream_key is None:
                     stream_key = hashlib.md5(f"{subscriber_id}_{query_name}".encode('utf-8')).hexdigest()
-                output_file = os.path.join(self.output_path, f'export_{stream_key}.jl')
+                output_file = self.get_output_file(stream_key)
                 self.logger.info(
                     f'Exporting stream content for {subscriber_id}-{query_name} ("{stream_key}" stream): outputing to Json lines file: {output_file}'
                 )
-                self.stream_export(stream_key, output_file)
+                # exported together with the other consecutive exportQueryStream actions
+                self.pending_exports.append((stream_key, output_file))
                 return True
         return False
 
+    def execute_actions(self):
+        super(TaskExportStreamContent, self).execute_actions()
+        self.export_pending_streams()
+
 
-def run(actions, redis_address, redis_port, output_path, logging_level):
+def run(actions, redis_address, redis_port, output_path, logging_level, page_size=None, export_workers=None,
+        compression=None):
     stream_factory = RedisStreamFactory(host=redis_address, port=redis_port)
     task = TaskExportStreamContent(
         actions=actions,
         stream_factory=stream_factory,
         output_path=output_path,
+        page_size=page_size,
+        export_workers=export_workers,
+        compression=compression,
         logging_level=logging_level
     )
     task.execute_actions()
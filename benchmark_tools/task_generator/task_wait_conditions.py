@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+import datetime
+import queue
+import threading
+
+from event_service_utils.streams.redis import RedisStreamFactory
+
+from benchmark_tools.task_generator.base import BaseTask
+from benchmark_tools.task_generator.task_wait_event_trace_timeout import WaitEventTraceTimeuot
+from benchmark_tools.task_generator.task_wait_redis_stream_size_timeout import WaitRedisStreamSizeTimeout
+from benchmark_tools.task_generator.wait_conditions import (
+    ElapsedTimeCondition,
+    EventTraceCountCondition,
+    EventTraceTimeoutCondition,
+    StreamSizeCondition,
+    evaluate_expression,
+    get_expression_conditions_names,
+)
+
+
+class WaitConditionsTimeout(BaseTask):
+    CONDITIONS_CLASSES = {
+        'elapsed': ElapsedTimeCondition,
+        'stream_size': StreamSizeCondition,
+        'event_trace_count': EventTraceCountCondition,
+        'event_trace_timeout': EventTraceTimeoutCondition,
+    }
+    BACKOFF_KEYS = ['min_retry_time', 'max_retry_time', 'backoff_factor']
+
+    def __init__(self, *args, **kwargs):
+        super(WaitConditionsTimeout, self).__init__(*args, **kwargs)
+        self.trace_task = None
+        if kwargs.get('jaeger_api_host') is not None:
+            self.trace_task = WaitEventTraceTimeuot(
+                actions=[],
+                jaeger_api_host=kwargs['jaeger_api_host'],
+                benchmark_start_time=kwargs.get('benchmark_start_time'),
+                logging_level=self.logging_level
+            )
+        self.stream_task = None
+        if kwargs.get('stream_factory') is not None:
+            self.stream_task = WaitRedisStreamSizeTimeout(
+                actions=[],
+                stream_factory=kwargs['stream_factory'],
+                logging_level=self.logging_level
+            )
+        self.wait_results = []
+
+    def create_condition(self, name, condition_data, backoff_kwargs, start_ts):
+        condition_kwargs = dict(backoff_kwargs)
+        condition_kwargs.update(condition_data)
+        condition_type = condition_kwargs.pop('type')
+        if condition_type not in self.CONDITIONS_CLASSES:
+            raise Exception(
+                f'Unknown wait condition type "{condition_type}". Use one of: {list(self.CONDITIONS_CLASSES.keys())}')
+        for key in self.BACKOFF_KEYS:
+            condition_kwargs[key] = float(condition_kwargs[key])
+
+        if condition_type == 'stream_size':
+            if self.stream_task is None:
+                raise Exception(f'"{name}" stream_size wait condition needs redis_address and redis_port.')
+            condition_kwargs['stream_task'] = self.stream_task
+            condition_kwargs.setdefault('stream_keys', [condition_kwargs.pop('stream_key', None)])
+        elif condition_type.startswith('event_trace'):
+            if self.trace_task is None:
+                raise Exception(f'"{name}" {condition_type} wait condition needs jaeger_api_host.')
+            condition_kwargs['trace_task'] = self.trace_task
+        if condition_type != 'stream_size':
+            condition_kwargs['start_ts'] = start_ts
+        return self.CONDITIONS_CLASSES[condition_type](name, **condition_kwargs)
+
+    def watch_condition(self, condition, results_queue, stop_event):
+        while not stop_event.is_set():
+            try:
+                result = condition.check()
+            except Exception as e:
+                # a failed check never ends the wait
+                self.logger.warning(f'Failed to check wait condition "{condition.name}": {e}')
+                result = False
+            results_queue.put((condition.name, result))
+            stop_event.wait(condition.get_retry_time(result))
+
+    def wait_conditions(self, action_data):
+        # the conditions are checked concurrently, each on its own thread with exponential backoff, and the wait
+        # ends as soon as the expression over their last results is true (or after forced_stop_timeout_limit),
+        # reporting the conditions that were met when it ended
+        expression = action_data['expression']
+        conditions_data = action_data['conditions']
+        forced_stop_timeout_limit = action_data.get('forced_stop_timeout_limit')
+        backoff_kwargs = {
+            'min_retry_time': action_data.get('min_retry_time', 0.5),
+            'max_retry_time': action_data.get('max_retry_time', 10),
+            'backoff_factor': action_data.get('backoff_factor', 2),
+        }
+
+        start_ts = datetime.datetime.now().timestamp()
+        conditions = []
+        for name in sorted(get_expression_conditions_names(expression)):
+            if name not in conditions_data:
+                raise Exception(f'Wait expression uses an undefined condition: "{name}"')
+            conditions.append(self.create_condition(name, conditions_data[name], backoff_kwargs, start_ts))
+
+        results_queue = queue.Queue()
+        stop_event = threading.Event()
+        for condition in conditions:
+            threading.Thread(
+                target=self.watch_condition, args=(condition, results_queue, stop_event), daemon=True).start()
+
+        results = {}
+        ended_by = None
+        while ended_by is None:
+            timeout = None
+            if forced_stop_timeout_limit is not None:
+                timeout = max(start_ts + float(forced_stop_timeout_limit) - datetime.datetime.now().timestamp(), 0)
+            try:
+                name, result = results_queue.get(timeout=timeout)
+            except queue.Empty:
+                ended_by = ['forced_stop_timeout_limit']
+                break
+            if results.get(name) != result:
+                self.logger.info(f'Wait condition "{name}": {result}')
+            results[name] = result
+            # only evaluated after all the conditions are checked at least once
+            if len(results) == len(conditions) and evaluate_expression(expression, results):
+                ended_by = sorted(condition_name for condition_name, met in results.items() if met)
+        stop_event.set()
+
+        total_wait = datetime.datetime.now().timestamp() - start_ts
+        wait_result = {
+            'ended_by': ended_by,
+            'conditions': results,
+            'conditions_status': {condition.name: condition.status for condition in conditions},
+            'total_wait': total_wait,
+        }
+        self.wait_results.append(wait_result)
+        self.logger.info(f'Stop waiting, ended by: {ended_by}; Conditions: {wait_result["conditions_status"]}')
+        self.logger.info(f'Total wait in seconds: {total_wait}')
+        return wait_result
+
+    def process_action(self, action_data):
+        if not super(WaitConditionsTimeout, self).process_action(action_data):
+            action = action_data.get('action', '')
+            if action == 'wait_conditions':
+                self.wait_conditions(action_data)
+                return True
+        return False
+
+
+def run(actions, logging_level, jaeger_api_host=None, redis_address=None, redis_port=None,
+        benchmark_start_time=None):
+    stream_factory = None
+    if redis_address is not None:
+        stream_factory = RedisStreamFactory(host=redis_address, port=redis_port)
+    task = WaitConditionsTimeout(
+        actions=actions,
+        jaeger_api_host=jaeger_api_host,
+        stream_factory=stream_factory,
+        benchmark_start_time=benchmark_start_time,
+        logging_level=logging_level
+    )
+    task.execute_actions()
+
+
+if __name__ == '__main__':
+    kwargs = {
+        "jaeger_api_host": "http://localhost:16686",
+        "redis_address": "localhost",
+        "redis_port": "6379",
+        "logging_level": "DEBUG",
+        "actions": [
+            {
+                'action': 'wait_conditions',
+                'conditions': {
+                    'workers_drained': {
+                        'type': 'stream_size',
+                        'stream_keys': ['object-detection-ssd-data', 'object-detection-ssd-gpu-data'],
+                        'stream_size': 0,
+                    },
+                    'scheduler_idle': {
+                        'type': 'event_trace_timeout',
+                        'service': 'Scheduler',
+                        'operation': 'process_data_event',
+                        'event_timeout': 10,
+                    },
+                    'max_time': {
+                        'type': 'elapsed',
+                        'seconds': 600,
+                    },
+                },
+                'expression': {'any': [{'all': ['workers_drained', 'scheduler_idle']}, 'max_time']},
+            }
+        ]
+    }
+    print(run(**kwargs))
@@ -7,25 +7,37 @@ import time
 import requests
 
 from benchmark_tools.task_generator.base import BaseTask
+from benchmark_tools.traces.trace_source import IncompleteJSONError, JaegerTraceSource
 
 
 class WaitEventTraceTimeuot(BaseTask):
     JAEGER_TRACES_URL_FORMAT = (
         'api/traces?'
-        'limit={limit}&start={start_mm_timestamp}&maxDuration&minDuration&'
+        'limit={limit}&start={start_mm_timestamp}&end={end_mm_timestamp}&maxDuration&minDuration&'
         'operation={operation}&service={service}'
     )
 
     def __init__(self, *args, **kwargs):
         super(WaitEventTraceTimeuot, self).__init__(*args, **kwargs)
         self.jaeger_api_host = kwargs['jaeger_api_host']
+        self.benchmark_start_time = kwargs.get('benchmark_start_time')
+        self.trace_source = JaegerTraceSource(logging_level=self.logging_level)
+
+    def get_traces_url(self, service, operation, start_mm_timestamp, end_mm_timestamp, limit):
+        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
+            start_mm_timestamp=start_mm_timestamp, end_mm_timestamp=end_mm_timestamp,
+            operation=operation, service=service, limit=limit)
+        return f'{self.jaeger_api_host}/{end_point}'
 
     def get_traces_last_seconds(self, service, operation, lookback_seconds, limit=1):
-        last_seconds_ts = datetime.datetime.now().timestamp() - lookback_seconds
+        now_ts = datetime.datetime.now().timestamp()
+        last_seconds_ts = now_ts - lookback_seconds
+        if self.benchmark_start_time is not None:
+            # never look for traces from before this benchmark started
+            last_seconds_ts = max(last_seconds_ts, self.benchmark_start_time)
         last_seconds_mm_ts = int(last_seconds_ts * 10**6)
-        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
-            start_mm_timestamp=last_seconds_mm_ts, operation=operation, service=service, limit=limit)
-        traces_url = f'{self.jaeger_api_host}/{end_point}'
+        now_mm_ts = int(now_ts * 10**6)
+        traces_url = self.get_traces_url(service, operation, last_seconds_mm_ts, now_mm_ts, limit)
         req = requests.get(traces_url)
         try:
             traces = req.json()
@@ -75,21 +87,58 @@ class WaitEventTraceTimeuot(BaseTask):
         total_wait = end_ts - start_ts
         self.logger.info(f'Total wait in seconds: {total_wait}')
 
+    def get_window_trace_ids(self, service, operation, start_mm_timestamp, end_mm_timestamp, limit):
+        # only the trace ids are kept from the streamed response, and a window with more traces than the limit
+        # is split in halves, so no trace is left out of the count
+        traces_url = self.get_traces_url(service, operation, start_mm_timestamp, end_mm_timestamp, limit)
+        trace_ids = set()
+        for trace in self.trace_source.iter_url_traces(traces_url):
+            trace_ids.add(trace['traceID'])
+        if len(trace_ids) < limit or end_mm_timestamp <= start_mm_timestamp:
+            return trace_ids
+        middle_mm_timestamp = (start_mm_timestamp + end_mm_timestamp) // 2
+        trace_ids = self.get_window_trace_ids(service, operation, start_mm_timestamp, middle_mm_timestamp, limit)
+        trace_ids.update(
+            self.get_window_trace_ids(service, operation, middle_mm_timestamp + 1, end_mm_timestamp, limit))
+        return trace_ids
+
+    def count_new_event_traces(self, service, operation, watermark_mm_ts, now_mm_ts, seen_trace_ids, limit):
+        new_trace_ids = self.get_window_trace_ids(service, operation, watermark_mm_ts, now_mm_ts, limit)
+        new_trace_ids.difference_update(seen_trace_ids)
+        seen_trace_ids.update(new_trace_ids)
+        return len(new_trace_ids)
+
     def wait_count_event_trace(self, action_data):
         service = action_data['service']
         operation = action_data['operation']
         wait_retry_time = float(action_data['wait_retry_time'])
         event_count = int(action_data['event_count'])
         forced_stop_timeout_limit = float(action_data['forced_stop_timeout_limit'])
+        # each poll only fetches the traces after the watermark (the previous poll time minus this overlap,
+        # for the spans that take a while to be stored by jaeger), and the trace ids already counted are skipped
+        watermark_overlap = float(action_data.get('watermark_overlap', 10))
+        poll_limit = int(action_data.get('poll_limit', 1000))
 
         start_ts = datetime.datetime.now().timestamp()
+        watermark_ts = start_ts - 18000
+        if self.benchmark_start_time is not None:
+            watermark_ts = max(watermark_ts, self.benchmark_start_time)
+        seen_trace_ids = set()
+        trace_count = 0
         keep_waiting = True
         while keep_waiting:
             self.logger.info(f'Waiting {wait_retry_time} before retry...')
             time.sleep(wait_retry_time)
-            traces_resp = self.get_traces_last_seconds(service, operation, 18000, limit=event_count)
-            traces = traces_resp['data']
-            trace_count = len(traces)
+            now_ts = datetime.datetime.now().timestamp()
+            try:
+                new_trace_count = self.count_new_event_traces(
+                    service, operation, int(watermark_ts * 10**6), int(now_ts * 10**6), seen_trace_ids, poll_limit)
+                trace_count += new_trace_count
+                watermark_ts = max(watermark_ts, now_ts - watermark_overlap)
+            except (requests.RequestException, IncompleteJSONError, ValueError) as e:
+                # the watermark is kept, so the next poll covers this same window again
+                self.logger.warning(f'Failed to fetch the event traces, retrying on the next poll: {e}')
+                new_trace_count = 0
             task_is_forced_timeout = False
             ts_now = datetime.datetime.now().timestamp()
 
@@ -99,7 +148,7 @@ class WaitEventTraceTimeuot(BaseTask):
                 self.logger.info(
                     f'Stop wainting..')
             self.logger.info(
-                f'Event trace count: {trace_count}; Forced Timeout {task_is_forced_timeout}; Forced Timeout limit {forced_stop_timeout_limit}'
+                f'Event trace count: {trace_count} (+{new_trace_count}); Forced Timeout {task_is_forced_timeout}; Forced Timeout limit {forced_stop_timeout_limit}'
             )
 
         end_ts = datetime.datetime.now().timestamp()
@@ -118,10 +167,11 @@ class WaitEventTraceTimeuot(BaseTask):
         return False
 
 
-def run(actions, jaeger_api_host, logging_level):
+def run(actions, jaeger_api_host, logging_level, benchmark_start_time=None):
     task = WaitEventTraceTimeuot(
         actions=actions,
         jaeger_api_host=jaeger_api_host,
+        benchmark_start_time=benchmark_start_time,
         logging_level=logging_level
     )
     task.execute_actions()
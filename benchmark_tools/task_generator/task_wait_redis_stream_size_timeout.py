@@ -17,52 +17,74 @@ class WaitRedisStreamSizeTimeout(BaseTask):
         super(WaitRedisStreamSizeTimeout, self).__init__(*args, **kwargs)
         self.stream_factory = kwargs['stream_factory']
 
-    def get_total_pending_cg_stream(self, stream_key):
+    def get_stream_consumer_group_info(self, stream_key):
+        cg_name = f'cg-{stream_key}'.encode('utf-8')
+        for cg in self.stream_factory.redis_db.xinfo_groups(stream_key):
+            if cg['name'] == cg_name:
+                return cg
+        return None
+
+    def count_not_delivered_events(self, stream_key, last_delivered_id, max_count):
+        # without the consumer group lag (redis < 7), only up to max_count + 1 of the events after the last
+        # delivered one are read, so it's enough to know if the backlog has more events than max_count
+        events = self.stream_factory.redis_db.xrange(stream_key, min=last_delivered_id, count=max_count + 2)
+        return len([event_id for event_id, _ in events if event_id != last_delivered_id])
+
+    def get_total_pending_cg_stream(self, stream_key, max_count):
+        # number of events not yet delivered to the stream consumer group, computed on the server side
         redis_db = self.stream_factory.redis_db
         bad_return_value = redis_db.xlen(stream_key)
-        cg_name = f'cg-{stream_key}'
+        if bad_return_value == 0:
+            return 0
         try:
-            cgroups_info = redis_db.xinfo_groups(stream_key)
-            if not cgroups_info:
-                return bad_return_value
-
-            cgroup = None
-            for cg in cgroups_info:
-                if cg['name'] == cg_name.encode('utf-8'):
-                    cgroup = cg
-                    break
-
+            cgroup = self.get_stream_consumer_group_info(stream_key)
             if not cgroup:
                 return bad_return_value
 
-            last_delivered_id = cgroup['last-delivered-id']
+            if cgroup.get('lag') is not None:
+                return cgroup['lag']
 
+            last_delivered_id = cgroup['last-delivered-id']
             if last_delivered_id is None:
                 return bad_return_value
 
-            not_consumed_stream_events_list = redis_db.xread({stream_key: last_delivered_id})
-            if len(not_consumed_stream_events_list) == 0:
-                return 0
-
-            return len(not_consumed_stream_events_list[0][1])
+            return self.count_not_delivered_events(stream_key, last_delivered_id, max_count)
         except redis.ResponseError:
             total_pending = bad_return_value
 
         return total_pending
 
+    def get_adaptive_wait_time(self, stream_size, current_stream_size, last_stream_size, last_check_time,
+                               min_retry_time, wait_retry_time):
+        # estimates when the stream will reach its size from how fast it changed since the last check
+        if last_stream_size is None or last_check_time == 0:
+            return min_retry_time
+        stream_size_change_rate = (current_stream_size - last_stream_size) / last_check_time
+        missing_stream_size = stream_size - current_stream_size
+        if stream_size_change_rate == 0 or (missing_stream_size > 0) != (stream_size_change_rate > 0):
+            return wait_retry_time
+        return min(max(missing_stream_size / stream_size_change_rate, min_retry_time), wait_retry_time)
+
     def wait_stream_size(self, action_data):
         stream_key = action_data['stream_key']
         stream_size = int(action_data['stream_size'])
         wait_retry_time = float(action_data['wait_retry_time'])
         forced_stop_timeout_limit = float(action_data['forced_stop_timeout_limit'])
+        # in the adaptive mode the stream size is checked right away, and then after the time it is estimated to
+        # take to reach its size (between min_retry_time and wait_retry_time), instead of every wait_retry_time
+        wait_mode = action_data.get('wait_mode', 'fixed')
+        min_retry_time = float(action_data.get('min_retry_time', 0.05))
 
         start_ts = datetime.datetime.now().timestamp()
+        retry_time = wait_retry_time if wait_mode == 'fixed' else 0
+        last_stream_size = None
+        last_check_ts = start_ts
         keep_waiting = True
         while keep_waiting:
-            self.logger.info(f'Waiting {wait_retry_time} before retry...')
-            time.sleep(wait_retry_time)
+            self.logger.info(f'Waiting {retry_time} before retry...')
+            time.sleep(retry_time)
 
-            current_stream_size = self.get_total_pending_cg_stream(stream_key)
+            current_stream_size = self.get_total_pending_cg_stream(stream_key, stream_size)
             stream_size_is_correct = current_stream_size == stream_size
 
             ts_now = datetime.datetime.now().timestamp()
@@ -77,6 +99,13 @@ class WaitRedisStreamSizeTimeout(BaseTask):
                     f'Forced Timeout {task_is_forced_timeout}; Forced Timeout limit {forced_stop_timeout_limit}'
                 )
             )
+            if wait_mode == 'adaptive':
+                retry_time = self.get_adaptive_wait_time(
+                    stream_size, current_stream_size, last_stream_size, ts_now - last_check_ts,
+                    min_retry_time, wait_retry_time)
+                retry_time = min(retry_time, max(start_ts + forced_stop_timeout_limit - ts_now, min_retry_time))
+                last_stream_size = current_stream_size
+                last_check_ts = ts_now
 
         end_ts = datetime.datetime.now().timestamp()
         total_wait = end_ts - start_ts
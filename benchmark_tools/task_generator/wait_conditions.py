@@ -0,0 +1,158 @@
+import datetime
+
+
+EXPRESSION_OPERATORS = ['all', 'any', 'not']
+
+
+class WaitCondition():
+    # a condition checked on its own thread, with a retry time that starts at min_retry_time and is multiplied
+    # by backoff_factor (up to max_retry_time) for as long as the check result doesn't change
+
+    def __init__(self, name, min_retry_time=0.5, max_retry_time=10, backoff_factor=2):
+        self.name = name
+        self.min_retry_time = min_retry_time
+        self.max_retry_time = max_retry_time
+        self.backoff_factor = backoff_factor
+        self.retry_time = None
+        self.last_result = None
+        self.status = None
+
+    def check(self):
+        raise NotImplementedError()
+
+    def get_max_retry_time(self):
+        # conditions that know when they can become true next are checked by then
+        return self.max_retry_time
+
+    def get_retry_time(self, result):
+        if self.retry_time is None or result != self.last_result:
+            self.retry_time = self.min_retry_time
+        else:
+            self.retry_time = min(self.retry_time * self.backoff_factor, self.max_retry_time)
+        self.last_result = result
+        return max(min(self.retry_time, self.get_max_retry_time()), 0)
+
+
+class ElapsedTimeCondition(WaitCondition):
+
+    def __init__(self, name, seconds, start_ts=None, **kwargs):
+        super(ElapsedTimeCondition, self).__init__(name, **kwargs)
+        self.seconds = float(seconds)
+        self.start_ts = start_ts if start_ts is not None else datetime.datetime.now().timestamp()
+
+    def get_remaining_time(self):
+        return self.start_ts + self.seconds - datetime.datetime.now().timestamp()
+
+    def check(self):
+        remaining_time = self.get_remaining_time()
+        self.status = f'remaining time: {remaining_time:.2f}'
+        return remaining_time <= 0
+
+    def get_max_retry_time(self):
+        return min(self.max_retry_time, self.get_remaining_time())
+
+
+class StreamSizeCondition(WaitCondition):
+    # all the streams backlogs (not delivered to their consumer groups) have the stream_size
+
+    def __init__(self, name, stream_task, stream_keys, stream_size=0, **kwargs):
+        super(StreamSizeCondition, self).__init__(name, **kwargs)
+        self.stream_task = stream_task
+        self.stream_keys = stream_keys
+        self.stream_size = int(stream_size)
+
+    def check(self):
+        streams_sizes = {}
+        for stream_key in self.stream_keys:
+            streams_sizes[stream_key] = self.stream_task.get_total_pending_cg_stream(stream_key, self.stream_size)
+            if streams_sizes[stream_key] != self.stream_size:
+                # no need to check the other streams
+                break
+        self.status = f'streams sizes: {streams_sizes}'
+        return len(streams_sizes) == len(self.stream_keys) and \
+            all(size == self.stream_size for size in streams_sizes.values())
+
+
+class EventTraceCountCondition(WaitCondition):
+
+    def __init__(self, name, trace_task, service, operation, event_count, watermark_overlap=10, poll_limit=1000,
+                 start_ts=None, **kwargs):
+        super(EventTraceCountCondition, self).__init__(name, **kwargs)
+        self.trace_task = trace_task
+        self.service = service
+        self.operation = operation
+        self.event_count = int(event_count)
+        self.watermark_overlap = float(watermark_overlap)
+        self.poll_limit = int(poll_limit)
+        start_ts = start_ts if start_ts is not None else datetime.datetime.now().timestamp()
+        self.watermark_ts = start_ts - 18000
+        if self.trace_task.benchmark_start_time is not None:
+            self.watermark_ts = max(self.watermark_ts, self.trace_task.benchmark_start_time)
+        self.seen_trace_ids = set()
+
+    def check(self):
+        now_ts = datetime.datetime.now().timestamp()
+        self.trace_task.count_new_event_traces(
+            self.service, self.operation, int(self.watermark_ts * 10**6), int(now_ts * 10**6),
+            self.seen_trace_ids, self.poll_limit)
+        self.watermark_ts = max(self.watermark_ts, now_ts - self.watermark_overlap)
+        self.status = f'event trace count: {len(self.seen_trace_ids)}'
+        return len(self.seen_trace_ids) >= self.event_count
+
+
+class EventTraceTimeoutCondition(WaitCondition):
+    # no new event traces of the service operation for event_timeout seconds
+
+    def __init__(self, name, trace_task, service, operation, event_timeout, start_ts=None, **kwargs):
+        super(EventTraceTimeoutCondition, self).__init__(name, **kwargs)
+        self.trace_task = trace_task
+        self.service = service
+        self.operation = operation
+        self.event_timeout = float(event_timeout)
+        self.last_ts = start_ts if start_ts is not None else datetime.datetime.now().timestamp()
+        self.last_check_ts = self.last_ts
+
+    def check(self):
+        now_ts = datetime.datetime.now().timestamp()
+        lookback_seconds = now_ts - self.last_check_ts + 1
+        traces = self.trace_task.get_traces_last_seconds(self.service, self.operation, lookback_seconds)['data']
+        self.last_check_ts = now_ts
+        if len(traces) != 0:
+            last_span = traces[0]['spans'][-1]
+            self.last_ts = max(self.last_ts, (last_span['startTime'] + last_span['duration']) / 10**6)
+        current_timeout = now_ts - self.last_ts
+        self.status = f'current timeout: {current_timeout:.2f}'
+        return current_timeout > self.event_timeout
+
+    def get_max_retry_time(self):
+        # without new traces, the timeout is reached at last_ts + event_timeout
+        remaining_time = self.last_ts + self.event_timeout - datetime.datetime.now().timestamp()
+        return min(self.max_retry_time, max(remaining_time, self.min_retry_time))
+
+
+def get_expression_conditions_names(expression):
+    if isinstance(expression, str):
+        return {expression}
+    if not isinstance(expression, dict) or len(expression) != 1:
+        raise Exception(f'Invalid wait expression "{expression}". Use a condition name or one of: {EXPRESSION_OPERATORS}')
+    operator, operands = list(expression.items())[0]
+    if operator not in EXPRESSION_OPERATORS:
+        raise Exception(f'Unknown wait expression operator "{operator}". Use one of: {EXPRESSION_OPERATORS}')
+    if operator == 'not':
+        return get_expression_conditions_names(operands)
+    names = set()
+    for operand in operands:
+        names.update(get_expression_conditions_names(operand))
+    return names
+
+
+def evaluate_expression(expression, results):
+    if isinstance(expression, str):
+        return results[expression]
+    operator, operands = list(expression.items())[0]
+    if operator == 'not':
+        return not evaluate_expression(operands, results)
+    operands_results = (evaluate_expression(operand, results) for operand in operands)
+    if operator == 'all':
+        return all(operands_results)
+    return any(operands_results)
@@ -0,0 +1,212 @@
+import itertools
+import threading
+
+from benchmark_tools.logging import setup_logging
+from benchmark_tools.traces.span_table import SpanTable
+
+
+class RunningMoments():
+    # count, average and sample std of a stream of values, merged chunk by chunk (Chan et al. parallel variance)
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        count = len(values)
+        if count == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def result(self):
+        return {
+            'count': self.count,
+            'avg': self.mean if self.count > 0 else None,
+            'std': (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else None,
+        }
+
+
+class TraceAggregation():
+    # aggregations are fed with chunks of the query traces (as span tables), and are identified by their key,
+    # so the same aggregation registered by different evaluations is only computed once
+
+    def __init__(self):
+        self.query_key = None
+        self.error = None
+
+    def get_key(self):
+        return (self.__class__.__name__,)
+
+    def update(self, span_table):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class TraceLatencyAggregation(TraceAggregation):
+
+    def __init__(self):
+        super(TraceLatencyAggregation, self).__init__()
+        self.latencies = RunningMoments()
+
+    def update(self, span_table):
+        self.latencies.update(span_table.trace_latencies())
+
+    def result(self):
+        return self.latencies.result()
+
+
+class TraceTimeRangeAggregation(TraceAggregation):
+
+    def __init__(self):
+        super(TraceTimeRangeAggregation, self).__init__()
+        self.total_traces = 0
+        self.first_start_time = None
+        self.last_end_time = None
+
+    def update(self, span_table):
+        if span_table.n_traces == 0:
+            return
+        self.total_traces += span_table.n_traces
+        first_start_time = int(span_table.trace_first_start_times().min())
+        # the last span to finish may not be on the last trace
+        last_end_time = int(span_table.trace_max_end_times().max())
+        if self.first_start_time is None or first_start_time < self.first_start_time:
+            self.first_start_time = first_start_time
+        if self.last_end_time is None or last_end_time > self.last_end_time:
+            self.last_end_time = last_end_time
+
+    def result(self):
+        return {
+            'total_traces': self.total_traces,
+            'first_start_time': self.first_start_time,
+            'last_end_time': self.last_end_time,
+        }
+
+
+class TracesWithOperationAggregation(TraceAggregation):
+
+    def __init__(self, operation):
+        super(TracesWithOperationAggregation, self).__init__()
+        self.operation = operation
+        self.total_traces = 0
+        self.traces_with_operation = 0
+
+    def get_key(self):
+        return super(TracesWithOperationAggregation, self).get_key() + (self.operation,)
+
+    def update(self, span_table):
+        self.total_traces += span_table.n_traces
+        operation_spans = span_table.span_mask(operation=self.operation)
+        self.traces_with_operation += int(span_table.traces_with_spans(operation_spans).sum())
+
+    def result(self):
+        return {
+            'total_traces': self.total_traces,
+            'traces_with_operation': self.traces_with_operation,
+        }
+
+
+class OperationDurationsAggregation(TraceAggregation):
+
+    def __init__(self, service):
+        super(OperationDurationsAggregation, self).__init__()
+        self.service = service
+        self.durations_by_operation = {}
+
+    def get_key(self):
+        return super(OperationDurationsAggregation, self).get_key() + (self.service,)
+
+    def update(self, span_table):
+        for operation, durations in span_table.durations_by_operation(self.service).items():
+            self.durations_by_operation.setdefault(operation, RunningMoments()).update(durations / 10**6)
+
+    def result(self):
+        return {operation: durations.result() for operation, durations in self.durations_by_operation.items()}
+
+
+class TraceMetricsEngine():
+    # evaluations register the aggregations they need on each query, and a single pass over the query traces
+    # stream feeds all the aggregations registered on it until then
+
+    def __init__(self, *args, **kwargs):
+        self.logging_level = kwargs.get('logging_level', 'ERROR')
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+        self.trace_store = kwargs['trace_store']
+        self.chunk_size = kwargs.get('chunk_size') or 5000
+        self.queries = {}
+        self.query_passes = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('logger')
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+        self._lock = threading.Lock()
+
+    def register(self, aggregation, jaeger_api_host, service, operation=None, tags=None, lookback='6h'):
+        query_params = {
+            'jaeger_api_host': jaeger_api_host,
+            'service': service,
+            'operation': operation,
+            'tags': tags,
+            'lookback': lookback,
+        }
+        query_key = self.trace_store.get_query_key(**query_params)
+        with self._lock:
+            query = self.queries.setdefault(
+                query_key, {'params': query_params, 'aggregations': {}, 'pending': []})
+            registered_aggregation = query['aggregations'].get(aggregation.get_key())
+            if registered_aggregation is None:
+                aggregation.query_key = query_key
+                query['aggregations'][aggregation.get_key()] = aggregation
+                query['pending'].append(aggregation)
+                registered_aggregation = aggregation
+        return registered_aggregation
+
+    def iter_span_table_chunks(self, query_params):
+        traces = iter(self.trace_store.iter_traces(**query_params))
+        while True:
+            traces_chunk = list(itertools.islice(traces, self.chunk_size))
+            if not traces_chunk:
+                return
+            yield SpanTable.from_traces(traces_chunk)
+
+    def run_query_pass(self, query_key):
+        with self.trace_store.get_query_lock(query_key):
+            with self._lock:
+                query = self.queries[query_key]
+                pending_aggregations = query['pending']
+                query['pending'] = []
+            if not pending_aggregations:
+                return
+
+            self.query_passes[query_key] = self.query_passes.get(query_key, 0) + 1
+            self.logger.debug(f'Computing {len(pending_aggregations)} aggregations in one pass on {query_key}')
+            try:
+                for span_table in self.iter_span_table_chunks(query['params']):
+                    for aggregation in pending_aggregations:
+                        aggregation.update(span_table)
+            except Exception as e:
+                for aggregation in pending_aggregations:
+                    aggregation.error = e
+                raise
+
+    def get_result(self, aggregation):
+        self.run_query_pass(aggregation.query_key)
+        if aggregation.error is not None:
+            raise aggregation.error
+        return aggregation.result()
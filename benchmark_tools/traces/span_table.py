@@ -0,0 +1,129 @@
+from array import array
+
+import numpy as np
+
+
+class SpanTable():
+    # columnar representation of the spans of a list of Jaeger traces,
+    # where the spans of each trace are contiguous and keep the order in which Jaeger returned them
+
+    def __init__(self, trace_ids, trace_offsets, start_time, duration,
+                 service_code, operation_code, services, operations, tags):
+        self.trace_ids = trace_ids
+        self.trace_offsets = trace_offsets
+        self.start_time = start_time
+        self.duration = duration
+        self.end_time = start_time + duration
+        self.service_code = service_code
+        self.operation_code = operation_code
+        self.services = services
+        self.operations = operations
+        self.service_codes = {service: code for code, service in enumerate(services)}
+        self.operation_codes = {operation: code for code, operation in enumerate(operations)}
+        self.tags = tags
+        self.trace_index = np.repeat(np.arange(self.n_traces), np.diff(trace_offsets))
+
+    @classmethod
+    def from_traces(cls, traces, tag_keys=()):
+        service_codes = {}
+        operation_codes = {}
+        trace_ids = []
+        trace_offsets = array('q', [0])
+        start_time = array('q')
+        duration = array('q')
+        service_code = array('q')
+        operation_code = array('q')
+        tags = {tag_key: [] for tag_key in tag_keys}
+        for trace in traces:
+            if not trace['spans']:
+                continue
+            process_codes = {
+                process_id: service_codes.setdefault(process['serviceName'], len(service_codes))
+                for process_id, process in trace['processes'].items()
+            }
+            for span in trace['spans']:
+                start_time.append(span['startTime'])
+                duration.append(span['duration'])
+                service_code.append(process_codes[span['processID']])
+                operation_code.append(operation_codes.setdefault(span['operationName'], len(operation_codes)))
+                if tags:
+                    span_tags = {tag['key']: tag['value'] for tag in span.get('tags', []) if tag['key'] in tags}
+                    for tag_key, tag_values in tags.items():
+                        tag_values.append(span_tags.get(tag_key))
+            trace_ids.append(trace['traceID'])
+            trace_offsets.append(len(start_time))
+
+        return cls(
+            trace_ids=trace_ids,
+            trace_offsets=np.frombuffer(trace_offsets, dtype=np.int64),
+            start_time=np.frombuffer(start_time, dtype=np.int64),
+            duration=np.frombuffer(duration, dtype=np.int64),
+            service_code=np.frombuffer(service_code, dtype=np.int64).astype(np.int32),
+            operation_code=np.frombuffer(operation_code, dtype=np.int64).astype(np.int32),
+            services=list(service_codes.keys()),
+            operations=list(operation_codes.keys()),
+            tags={tag_key: np.array(tag_values, dtype=object) for tag_key, tag_values in tags.items()},
+        )
+
+    @property
+    def n_traces(self):
+        return len(self.trace_offsets) - 1
+
+    @property
+    def n_spans(self):
+        return len(self.start_time)
+
+    def span_mask(self, services=None, operation=None):
+        mask = np.ones(self.n_spans, dtype=bool)
+        if services is not None:
+            codes = [self.service_codes[s] for s in services if s in self.service_codes]
+            mask &= np.isin(self.service_code, codes)
+        if operation is not None:
+            mask &= self.operation_code == self.operation_codes.get(operation, -1)
+        return mask
+
+    def traces_with_spans(self, span_mask):
+        has_spans = np.zeros(self.n_traces, dtype=bool)
+        has_spans[self.trace_index[span_mask]] = True
+        return has_spans
+
+    def trace_min_start_times(self):
+        return np.minimum.reduceat(self.start_time, self.trace_offsets[:-1])
+
+    def trace_first_start_times(self):
+        return self.start_time[self.trace_offsets[:-1]]
+
+    def trace_last_end_times(self):
+        return self.end_time[self.trace_offsets[1:] - 1]
+
+    def trace_max_end_times(self):
+        return np.maximum.reduceat(self.end_time, self.trace_offsets[:-1])
+
+    def trace_latencies(self):
+        # from the start of the first span until the end of the last span of each trace, in seconds
+        return (self.trace_last_end_times() - self.trace_first_start_times()) / 10**6
+
+    def durations_by_operation(self, service):
+        service_mask = self.span_mask(services=[service])
+        service_operation_code = self.operation_code[service_mask]
+        service_duration = self.duration[service_mask]
+        return {
+            self.operations[code]: service_duration[service_operation_code == code]
+            for code in np.unique(service_operation_code)
+        }
+
+    def spans_ordered_by_start_time(self):
+        # stable ordering of the span indexes by their start time inside each trace (traces stay contiguous)
+        return np.lexsort((np.arange(self.n_spans), self.start_time, self.trace_index))
+
+    def first_span_per_trace(self, span_indexes):
+        # first of the given (ordered) span indexes of each trace, -1 for traces without any of them
+        first_spans = np.full(self.n_traces, -1, dtype=np.int64)
+        span_traces = self.trace_index[span_indexes]
+        traces, positions = np.unique(span_traces, return_index=True)
+        first_spans[traces] = span_indexes[positions]
+        return first_spans
+
+    def last_span_per_trace(self, span_indexes):
+        # last of the given (ordered) span indexes of each trace, -1 for traces without any of them
+        return self.first_span_per_trace(span_indexes[::-1])
@@ -0,0 +1,262 @@
+import codecs
+import concurrent.futures
+import json
+import queue
+import resource
+import threading
+
+import requests
+
+from benchmark_tools.logging import setup_logging
+
+
+class IncompleteJSONError(Exception):
+    pass
+
+
+class JaegerResponseTracesParser():
+    # incrementally parses a Jaeger API response ({"data": [trace, ...], "total": ..., ...}),
+    # yielding each trace of the "data" list as soon as it is complete, without loading the whole response
+
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, text_chunks):
+        self.text_chunks = iter(text_chunks)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def read_more(self, min_size=0):
+        # reads until at least min_size new characters are available, so that
+        # re-decoding a big pending value doesn't become quadratic on the chunks number
+        read_size = 0
+        while not self.eof and read_size <= min_size:
+            try:
+                chunk = next(self.text_chunks)
+            except StopIteration:
+                self.eof = True
+                break
+            read_size += len(chunk)
+            if self.position:
+                self.buffer = self.buffer[self.position:]
+                self.position = 0
+            self.buffer += chunk
+        return read_size
+
+    def skip_whitespace(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return
+            if self.eof:
+                raise IncompleteJSONError('Unexpected end of the Jaeger response.')
+            self.read_more()
+
+    def expect_char(self, expected_chars):
+        self.skip_whitespace()
+        char = self.buffer[self.position]
+        if char not in expected_chars:
+            raise ValueError(f'Unexpected character "{char}" on Jaeger response, expected one of "{expected_chars}".')
+        self.position += 1
+        return char
+
+    def decode_value(self):
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a value at the end of the buffer may still continue on the next chunk (eg: numbers)
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read_more(min_size=len(self.buffer) - self.position)
+
+    def iter_data_list(self):
+        self.skip_whitespace()
+        if self.buffer.startswith('null', self.position):
+            self.decode_value()
+            return
+        self.expect_char('[')
+        self.skip_whitespace()
+        if self.buffer[self.position] == ']':
+            self.position += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self.expect_char(',]') == ']':
+                return
+
+    def __iter__(self):
+        self.expect_char('{')
+        self.skip_whitespace()
+        if self.buffer[self.position] == '}':
+            return
+        while True:
+            key = self.decode_value()
+            self.expect_char(':')
+            if key == 'data':
+                yield from self.iter_data_list()
+            else:
+                self.decode_value()
+            if self.expect_char(',}') == '}':
+                return
+
+
+class JaegerTraceSource():
+    SLICE_DONE = object()
+
+    def __init__(self, *args, **kwargs):
+        self.logging_level = kwargs.get('logging_level', 'ERROR')
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+        self.slice_seconds = kwargs.get('slice_seconds') or 60
+        self.max_workers = kwargs.get('max_workers') or 4
+        self.max_queued_traces = kwargs.get('max_queued_traces') or 1000
+        self.read_chunk_size = kwargs.get('read_chunk_size') or 64 * 1024
+        # (connect, read) timeouts in seconds of each jaeger request, so a hung slice doesn't block the pass
+        self.connect_timeout = kwargs.get('connect_timeout') or 10
+        self.read_timeout = kwargs.get('read_timeout') or 300
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('logger')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+
+    def get_time_slices(self, start_mm_timestamp, end_mm_timestamp):
+        # jaeger start/end are inclusive, so slices don't share their limits
+        slice_mm_seconds = int(self.slice_seconds * 10**6)
+        time_slices = []
+        slice_start = start_mm_timestamp
+        while slice_start <= end_mm_timestamp:
+            slice_end = min(slice_start + slice_mm_seconds - 1, end_mm_timestamp)
+            time_slices.append((slice_start, slice_end))
+            slice_start = slice_end + 1
+        return time_slices
+
+    def get_rss_kb(self):
+        # current (not peak) resident memory of the process, None where /proc is not available
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * resource.getpagesize() // 1024
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def iter_response_text_chunks(self, response):
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+        for chunk in response.iter_content(chunk_size=self.read_chunk_size):
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+    def iter_url_traces(self, traces_url):
+        with requests.get(traces_url, stream=True, timeout=(self.connect_timeout, self.read_timeout)) as response:
+            response.raise_for_status()
+            yield from JaegerResponseTracesParser(self.iter_response_text_chunks(response))
+
+    def put_on_queue(self, traces_queue, item, stop_event):
+        while not stop_event.is_set():
+            try:
+                traces_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get_tag_value_text(self, value):
+        # jaeger compares the tag values as text, with json booleans
+        return json.dumps(value) if isinstance(value, bool) else str(value)
+
+    def is_query_span(self, trace, span, span_query):
+        process = trace.get('processes', {}).get(span.get('processID'), {})
+        if process.get('serviceName') != span_query['service']:
+            return False
+        if span_query.get('operation') is not None and span.get('operationName') != span_query['operation']:
+            return False
+        # jaeger matches the query tags on the span tags, its process tags or its logs fields
+        span_tags = list(span.get('tags', [])) + list(process.get('tags', []))
+        for log in span.get('logs', []):
+            span_tags.extend(log.get('fields', []))
+        span_tags_texts = {(tag['key'], self.get_tag_value_text(tag['value'])) for tag in span_tags}
+        return all(
+            (key, self.get_tag_value_text(value)) in span_tags_texts
+            for key, value in (span_query.get('tags') or {}).items()
+        )
+
+    def get_trace_start(self, trace, span_query):
+        # a slice only returns a trace if one of its spans matching the query starts inside it,
+        # so the earliest of those spans is always on a slice that returned the trace
+        spans = trace['spans']
+        if span_query is not None:
+            spans = [span for span in spans if self.is_query_span(trace, span, span_query)] or spans
+        return min(span['startTime'] for span in spans)
+
+    def is_slice_trace(self, trace, time_slice, is_first_slice, is_last_slice, span_query=None):
+        # traces with query spans on more than one slice are returned by each of those slices, so each trace is only
+        # yielded by the slice with its earliest query span (the first and last slices also own the traces outside them)
+        if time_slice is None:
+            return True
+        slice_start, slice_end = time_slice
+        trace_start = self.get_trace_start(trace, span_query)
+        return (is_first_slice or trace_start >= slice_start) and (is_last_slice or trace_start <= slice_end)
+
+    def fetch_slice_traces(self, traces_url, time_slice, is_first_slice, is_last_slice, span_query, traces_queue,
+                           stop_event):
+        try:
+            for trace in self.iter_url_traces(traces_url):
+                if not self.is_slice_trace(trace, time_slice, is_first_slice, is_last_slice, span_query):
+                    continue
+                if not self.put_on_queue(traces_queue, trace, stop_event):
+                    return
+        except Exception as e:
+            self.put_on_queue(traces_queue, e, stop_event)
+        finally:
+            self.put_on_queue(traces_queue, self.SLICE_DONE, stop_event)
+
+    def iter_traces(self, traces_urls, stats=None, time_slices=None, span_query=None):
+        # span_query ({'service', 'operation', 'tags'}) is the query of the sliced traces urls
+        if stats is None:
+            stats = {}
+        if time_slices is None:
+            time_slices = [None] * len(traces_urls)
+        # the bounded queue keeps the fetching threads from parsing more traces than the consumer can handle
+        traces_queue = queue.Queue(maxsize=self.max_queued_traces)
+        stop_event = threading.Event()
+        total_traces = 0
+        pending_slices = len(traces_urls)
+        start_rss_kb = self.get_rss_kb()
+        max_rss_kb = start_rss_kb
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for slice_index, (traces_url, time_slice) in enumerate(zip(traces_urls, time_slices)):
+                executor.submit(
+                    self.fetch_slice_traces, traces_url, time_slice, slice_index == 0,
+                    slice_index == len(traces_urls) - 1, span_query, traces_queue, stop_event)
+
+            while pending_slices:
+                item = traces_queue.get()
+                if item is self.SLICE_DONE:
+                    pending_slices -= 1
+                    if start_rss_kb is not None:
+                        max_rss_kb = max(max_rss_kb, self.get_rss_kb())
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                total_traces += 1
+                yield item
+        finally:
+            stop_event.set()
+            executor.shutdown(wait=True)
+            stats.update({
+                'total_traces': total_traces,
+                'total_slices': len(traces_urls),
+                # resident memory growth during the pass (sampled after each slice), not the process lifetime peak
+                'rss_growth_kb': max_rss_kb - start_rss_kb if start_rss_kb is not None else None,
+            })
+            self.logger.info(f'Traces ingestion stats: {stats}')
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+from benchmark_tools.logging import setup_logging
+from benchmark_tools.traces.span_table import SpanTable
+from benchmark_tools.traces.trace_source import JaegerTraceSource
+
+
+class JaegerTraceStore():
+    JAEGER_TRACES_URL_FORMAT = (
+        'api/traces?'
+        'limit=700000000&{time_window}&maxDuration&minDuration&'
+        'service={service}'
+    )
+    JAEGER_LOOKBACK_URL_FORMAT = 'lookback={lookback}'
+    JAEGER_START_END_URL_FORMAT = 'start={start_mm_timestamp}&end={end_mm_timestamp}'
+    JAEGER_OPERATION_URL_FORMAT = '&operation={operation}'
+    JAEGER_TAGS_URL_FORMAT = '&tags={tags}'
+
+    def __init__(self, *args, **kwargs):
+        self.logging_level = kwargs.get('logging_level', 'ERROR')
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+        self.cache_dir = kwargs.get('cache_dir')
+        # benchmark time window (timestamps in seconds) used instead of each query lookback
+        self.start_time = kwargs.get('start_time')
+        self.end_time = kwargs.get('end_time')
+        self.trace_source = JaegerTraceSource(
+            slice_seconds=kwargs.get('slice_seconds'),
+            max_workers=kwargs.get('max_workers'),
+            connect_timeout=kwargs.get('connect_timeout'),
+            read_timeout=kwargs.get('read_timeout'),
+            logging_level=self.logging_level
+        )
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.traces_by_id = {}
+        self.query_trace_ids = {}
+        self.span_tables = {}
+        self.ingestion_stats = {}
+        self._lock = threading.Lock()
+        self._query_locks = {}
+
+    def __getstate__(self):
+        # only the configurations are sent to other processes, they can still reuse the on-disk cache
+        state = self.__dict__.copy()
+        for key in ['logger', 'traces_by_id', 'query_trace_ids', 'span_tables', 'ingestion_stats', '_lock', '_query_locks']:
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = setup_logging(self.__class__.__name__, self.logging_level)
+        self.traces_by_id = {}
+        self.query_trace_ids = {}
+        self.span_tables = {}
+        self.ingestion_stats = {}
+        self._lock = threading.Lock()
+        self._query_locks = {}
+
+    def get_time_window(self, lookback):
+        if self.start_time is None or self.end_time is None:
+            return lookback
+        return (int(self.start_time * 10**6), int(self.end_time * 10**6))
+
+    def get_query_key(self, jaeger_api_host, service, operation=None, tags=None, lookback='6h'):
+        tags_json = json.dumps(tags, sort_keys=True) if tags else None
+        time_window = self.get_time_window(lookback)
+        return (jaeger_api_host, service, operation, tags_json, time_window)
+
+    def get_query_time_window_params(self, time_window):
+        if isinstance(time_window, str):
+            return self.JAEGER_LOOKBACK_URL_FORMAT.format(lookback=time_window)
+        start_mm_timestamp, end_mm_timestamp = time_window
+        return self.JAEGER_START_END_URL_FORMAT.format(
+            start_mm_timestamp=start_mm_timestamp, end_mm_timestamp=end_mm_timestamp)
+
+    def get_query_url(self, query_key):
+        jaeger_api_host, service, operation, tags_json, time_window = query_key
+        end_point = self.JAEGER_TRACES_URL_FORMAT.format(
+            service=service, time_window=self.get_query_time_window_params(time_window))
+        if operation is not None:
+            end_point += self.JAEGER_OPERATION_URL_FORMAT.format(operation=operation)
+        if tags_json is not None:
+            end_point += self.JAEGER_TAGS_URL_FORMAT.format(tags=tags_json)
+        return f'{jaeger_api_host}/{end_point}'
+
+    def get_query_time_slices(self, query_key):
+        time_window = query_key[-1]
+        if isinstance(time_window, str):
+            return None
+        return self.trace_source.get_time_slices(*time_window)
+
+    def get_query_span_query(self, query_key):
+        _, service, operation, tags_json, _ = query_key
+        return {'service': service, 'operation': operation, 'tags': json.loads(tags_json) if tags_json else None}
+
+    def get_query_traces_urls(self, query_key):
+        time_slices = self.get_query_time_slices(query_key)
+        if time_slices is None:
+            return [self.get_query_url(query_key)]
+        return [self.get_query_url(query_key[:-1] + (time_slice,)) for time_slice in time_slices]
+
+    def get_query_cache_file(self, query_key):
+        if self.cache_dir is None:
+            return None
+        query_hash = hashlib.md5(repr(query_key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'traces_{query_hash}.pickle')
+
+    def get_query_lock(self, query_key):
+        with self._lock:
+            return self._query_locks.setdefault(query_key, threading.RLock())
+
+    def iter_cached_traces(self, cache_file):
+        with open(cache_file, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def iter_fetched_traces(self, query_key, cache_file):
+        stats = self.ingestion_stats.setdefault(query_key, {})
+        traces = self.trace_source.iter_traces(
+            self.get_query_traces_urls(query_key), stats=stats, time_slices=self.get_query_time_slices(query_key),
+            span_query=self.get_query_span_query(query_key))
+        if cache_file is None:
+            yield from traces
+            return
+
+        # traces are written to the cache file while they are streamed,
+        # and the file is only used as cache once all of them were fetched
+        tmp_cache_file = f'{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        completed = False
+        try:
+            with open(tmp_cache_file, 'wb') as f:
+                for trace in traces:
+                    pickle.dump(trace, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield trace
+            completed = True
+        finally:
+            if completed:
+                os.replace(tmp_cache_file, cache_file)
+            elif os.path.exists(tmp_cache_file):
+                os.remove(tmp_cache_file)
+
+    def add_traces(self, traces):
+        trace_ids = []
+        with self._lock:
+            for trace in traces:
+                trace_id = trace['traceID']
+                stored_trace = self.traces_by_id.get(trace_id)
+                # a trace fetched later on may have more spans than the same trace from a previous query
+                if stored_trace is None or len(trace['spans']) > len(stored_trace['spans']):
+                    self.traces_by_id[trace_id] = trace
+                trace_ids.append(trace_id)
+        return trace_ids
+
+    def iter_query_traces(self, query_key):
+        cache_file = self.get_query_cache_file(query_key)
+        if cache_file is not None and os.path.exists(cache_file):
+            self.logger.debug(f'Loading traces for {query_key} from cache file: {cache_file}')
+            return self.iter_cached_traces(cache_file)
+
+        self.logger.debug(f'Fetching traces for {query_key}')
+        return self.iter_fetched_traces(query_key, cache_file)
+
+    def get_traces(self, jaeger_api_host, service, operation=None, tags=None, lookback='6h'):
+        query_key = self.get_query_key(jaeger_api_host, service, operation=operation, tags=tags, lookback=lookback)
+        with self.get_query_lock(query_key):
+            trace_ids = self.query_trace_ids.get(query_key)
+            if trace_ids is None:
+                traces = list(self.iter_query_traces(query_key))
+                trace_ids = self.add_traces(traces)
+                self.query_trace_ids[query_key] = trace_ids
+            else:
+                self.logger.debug(f'Reusing {len(trace_ids)} traces already loaded for {query_key}')
+        return [self.traces_by_id[trace_id] for trace_id in trace_ids]
+
+    def iter_traces(self, jaeger_api_host, service, operation=None, tags=None, lookback='6h'):
+        # streams the traces without keeping them in memory, for evaluations that only need a single pass on them
+        query_key = self.get_query_key(jaeger_api_host, service, operation=operation, tags=tags, lookback=lookback)
+        with self.get_query_lock(query_key):
+            trace_ids = self.query_trace_ids.get(query_key)
+            if trace_ids is not None:
+                self.logger.debug(f'Reusing {len(trace_ids)} traces already loaded for {query_key}')
+                traces = (self.traces_by_id[trace_id] for trace_id in trace_ids)
+            else:
+                traces = self.iter_query_traces(query_key)
+            yield from traces
+
+    def get_span_table(self, jaeger_api_host, service, operation=None, tags=None, lookback='6h', tag_keys=()):
+        # the span table of each query (and indexed tags) is built only once, straight from the traces stream
+        query_key = self.get_query_key(jaeger_api_host, service, operation=operation, tags=tags, lookback=lookback)
+        span_table_key = (query_key, tuple(sorted(tag_keys)))
+        with self.get_query_lock(query_key):
+            span_table = self.span_tables.get(span_table_key)
+            if span_table is None:
+                traces = self.iter_traces(
+                    jaeger_api_host, service, operation=operation, tags=tags, lookback=lookback)
+                span_table = SpanTable.from_traces(traces, tag_keys=tag_keys)
+                self.span_tables[span_table_key] = span_table
+                self.logger.debug(
+                    f'Span table for {query_key}: {span_table.n_traces} traces and {span_table.n_spans} spans')
+        return span_table
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from benchmark_tools.columnar_data import get_data_path, load_data_frame, save_data_frame
+
+
+class ColumnarDataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output_path = tempfile.mkdtemp()
+        self.data_frame = pd.DataFrame({
+            'worker_stream_key': ['worker-000-data', 'worker-001-data'],
+            'latency': [0.5, 0.25],
+            'worker_finished_process': [True, False],
+        })
+
+    def test_npy_data_frame_is_loaded_back_memory_mapped(self):
+        path = save_data_frame(self.data_frame, os.path.join(self.output_path, 'events_results'), 'npy')
+        self.assertTrue(os.path.isdir(path))
+        ret = load_data_frame(path)
+        self.assertListEqual(list(ret.columns), list(self.data_frame.columns))
+        self.assertListEqual(ret['worker_stream_key'].tolist(), ['worker-000-data', 'worker-001-data'])
+        self.assertListEqual(ret['latency'].tolist(), [0.5, 0.25])
+        self.assertEqual(ret['worker_finished_process'].dtype, np.bool_)
+        mmapped = np.load(os.path.join(path, 'latency.npy'), mmap_mode='r')
+        self.assertIsInstance(mmapped, np.memmap)
+
+    def test_csv_data_frame(self):
+        path = save_data_frame(self.data_frame, os.path.join(self.output_path, 'events_results'), 'csv')
+        self.assertTrue(path.endswith('events_results.csv'))
+        ret = load_data_frame(path)
+        self.assertListEqual(ret['latency'].tolist(), [0.5, 0.25])
+
+    def test_npy_null_values_are_kept(self):
+        data_frame = pd.DataFrame({
+            'worker': ['worker-000', None, 'worker-002'],
+            'latency': [0.5, None, 1],
+            'count': [1, np.nan, 3],
+        }).astype({'latency': object, 'count': object})
+        path = save_data_frame(data_frame, os.path.join(self.output_path, 'events_results'), 'npy')
+        ret = load_data_frame(path)
+        self.assertListEqual(ret['worker'].isna().tolist(), [False, True, False])
+        self.assertListEqual(ret['worker'].dropna().tolist(), ['worker-000', 'worker-002'])
+        self.assertListEqual(ret['latency'].isna().tolist(), [False, True, False])
+        self.assertEqual(ret['count'].dtype, np.float64)
+        csv_ret = load_data_frame(save_data_frame(data_frame, os.path.join(self.output_path, 'events_results'), 'csv'))
+        self.assertListEqual(ret.isna().values.tolist(), csv_ret.isna().values.tolist())
+
+    def test_npy_only_replaces_columns_directories(self):
+        base_path = os.path.join(self.output_path, 'events_results')
+        save_data_frame(self.data_frame, base_path, 'npy')
+        save_data_frame(self.data_frame, base_path, 'npy')
+        other_dir = os.path.join(self.output_path, 'other')
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, 'keep.txt'), 'w') as f:
+            f.write('keep')
+        with self.assertRaises(Exception):
+            save_data_frame(self.data_frame, other_dir, 'npy')
+        self.assertTrue(os.path.exists(os.path.join(other_dir, 'keep.txt')))
+
+    def test_parquet_data_format_needs_pyarrow(self):
+        with patch('benchmark_tools.columnar_data.importlib.util.find_spec', return_value=None):
+            with self.assertRaisesRegex(Exception, 'pyarrow'):
+                get_data_path(self.output_path, 'parquet')
+
+    def test_unknown_data_format(self):
+        with self.assertRaises(Exception):
+            get_data_path(self.output_path, 'xlsx')
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
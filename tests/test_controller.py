@@ -1,9 +1,23 @@
+import functools
+import os
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from benchmark_tools.controller import controller
 
 
+def mocked_evaluation(passed):
+    return {'passed': passed}
+
+
+def mocked_failing_evaluation():
+    raise Exception('some error')
+
+
+def mocked_evaluation_with_trace_store(threshold_functions, logging_level, trace_store=None):
+    return {'passed': trace_store is not None}
+
+
 class ControllerTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -39,6 +53,96 @@ class ControllerTestCase(unittest.TestCase):
         }
         self.assertDictEqual(res, expected)
 
+    @patch('benchmark_tools.controller.controller.get_evaluations')
+    def test_run_evaluations_sequentially_isolates_errors(self, mocked_get_evaluations):
+        mocked_get_evaluations.return_value = [
+            ({'module': 'eval_a'}, functools.partial(mocked_evaluation, True)),
+            ({'module': 'eval_b'}, mocked_failing_evaluation),
+        ]
+        res = controller.run_evaluations({}, {})
+        expected = {
+            'passed': False,
+            'eval_a': {'passed': True},
+            'eval_b': {'passed': False, 'error': 'some error'},
+        }
+        self.assertDictEqual(res, expected)
+
+    @patch('benchmark_tools.controller.controller.get_evaluations')
+    def test_run_evaluations_concurrently_keeps_results_per_module(self, mocked_get_evaluations):
+        mocked_get_evaluations.return_value = [
+            ({'module': 'eval_a'}, functools.partial(mocked_evaluation, True)),
+            ({'module': 'eval_b', 'executor': 'process'}, functools.partial(mocked_evaluation, True)),
+            ({'module': 'eval_c', 'executor': 'thread'}, mocked_failing_evaluation),
+            ({'module': 'eval_d', 'executor': 'unknown'}, functools.partial(mocked_evaluation, True)),
+        ]
+        res = controller.run_evaluations({'evaluations_max_workers': 2}, {})
+        self.assertFalse(res['passed'])
+        self.assertDictEqual(res['eval_a'], {'passed': True})
+        self.assertDictEqual(res['eval_b'], {'passed': True})
+        self.assertDictEqual(res['eval_c'], {'passed': False, 'error': 'some error'})
+        self.assertFalse(res['eval_d']['passed'])
+        self.assertListEqual(list(res.keys()), ['passed', 'eval_a', 'eval_b', 'eval_c', 'eval_d'])
+
+    def test_add_run_function_injected_kwargs_only_for_accepted_kwargs(self):
+        kwargs = {'threshold_functions': {}, 'logging_level': 'ERROR'}
+        injected = {'trace_store': 'store', 'other': 'value'}
+        ret = controller.add_run_function_injected_kwargs(mocked_evaluation_with_trace_store, kwargs, injected)
+        expected = {'threshold_functions': {}, 'logging_level': 'ERROR', 'trace_store': 'store'}
+        self.assertDictEqual(ret, expected)
+        self.assertNotIn('trace_store', kwargs)
+
+        ret = controller.add_run_function_injected_kwargs(mocked_evaluation, {'passed': True}, injected)
+        self.assertDictEqual(ret, {'passed': True})
+
+    def test_register_evaluations_aggregations_before_running_them(self):
+        trace_store = controller.create_trace_store({})
+        metrics_engine = controller.create_metrics_engine({}, trace_store)
+        benchmark = {
+            'evaluations': [
+                {
+                    'module': 'benchmark_tools.evaluation.latency_evaluation',
+                    'kwargs': {'jaeger_api_host': 'host', 'threshold_functions': {}, 'logging_level': 'ERROR'}
+                },
+                {
+                    'module': 'benchmark_tools.evaluation.throughput_evaluation',
+                    'kwargs': {'jaeger_api_host': 'host', 'threshold_functions': {}, 'logging_level': 'ERROR'}
+                },
+                {
+                    'module': 'benchmark_tools.evaluation.slr_worker_ranking_evaluation',
+                    'kwargs': {}
+                },
+            ]
+        }
+        injected = {'trace_store': trace_store, 'metrics_engine': metrics_engine}
+        controller.register_evaluations_aggregations(benchmark, injected)
+        registered_services = sorted(query_key[1] for query_key in metrics_engine.queries.keys())
+        self.assertListEqual(registered_services, ['Forwarder', 'PreProcessing'])
+        self.assertNotIn('metrics_engine', benchmark['evaluations'][0]['kwargs'])
+
+    def test_stop_background_tasks_isolates_errors(self):
+        failing_task = MagicMock()
+        failing_task.stop.side_effect = Exception('some error')
+        task = MagicMock()
+        controller.stop_background_tasks([failing_task, task])
+        failing_task.stop.assert_called_once_with()
+        task.stop.assert_called_once_with()
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_default_trace_store_fetches_each_query_once_per_run(self, mocked_fetch):
+        trace = {'traceID': 'a', 'spans': [{'startTime': 1, 'duration': 1, 'processID': 'p1',
+                                            'operationName': 'op'}], 'processes': {'p1': {'serviceName': 'S'}}}
+        mocked_fetch.side_effect = lambda url: iter([trace])
+        trace_store = controller.create_trace_store({})
+        try:
+            first_pass = list(trace_store.iter_traces('host', service='S', operation='op'))
+            second_pass = list(trace_store.iter_traces('host', service='S', operation='op'))
+            trace_store.get_span_table('host', service='S', operation='op')
+            self.assertEqual(mocked_fetch.call_count, 1)
+            self.assertListEqual(second_pass, first_pass)
+        finally:
+            controller.remove_trace_store_run_cache({}, trace_store)
+        self.assertFalse(os.path.exists(trace_store.cache_dir))
+
     def tearDown(self):
         # os.close(self.db_fd)
         # os.unlink(controller.app.config['DATABASE'])
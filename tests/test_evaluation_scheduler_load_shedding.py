@@ -13,7 +13,7 @@ class SchedulerLoadSheddingTestCase(unittest.TestCase):
             jaeger_api_host='jaeger_api_host'
         )
 
-    @patch('benchmark_tools.evaluation.scheduler_load_shedding_evaluation.SchedulerLoadSheddingEvaluation.get_traces')
+    @patch('benchmark_tools.traces.metrics_engine.TraceMetricsEngine.get_result')
     @patch('benchmark_tools.evaluation.scheduler_load_shedding_evaluation.SchedulerLoadSheddingEvaluation.calculate_load_shedding_rate')
     @patch('benchmark_tools.evaluation.scheduler_load_shedding_evaluation.SchedulerLoadSheddingEvaluation.verify_thresholds')
     def test_run_should_call_necessary_functions(self, mocked_threshold, mocked_calculate, mocked_get):
@@ -22,13 +22,9 @@ class SchedulerLoadSheddingTestCase(unittest.TestCase):
         self.assertTrue(mocked_calculate.called)
         self.assertTrue(mocked_get.called)
 
-    @patch('benchmark_tools.evaluation.scheduler_load_shedding_evaluation.SchedulerLoadSheddingEvaluation.get_total_load_shedding')
-    def test_calculate_load_shedding_rate_should_return_correctly(self, mocked_get):
-
-        traces = ['fake trace', 'fake LS trace']
-        mocked_get.return_value = 1
-        ret = self.evaluation.calculate_load_shedding_rate(traces)
-        self.assertTrue(mocked_get.called)
+    def test_calculate_load_shedding_rate_should_return_correctly(self):
+        load_shedding = {'total_traces': 2, 'traces_with_operation': 1}
+        ret = self.evaluation.calculate_load_shedding_rate(load_shedding)
 
         expected_ret = {
             'data_points': 2,
@@ -37,34 +33,6 @@ class SchedulerLoadSheddingTestCase(unittest.TestCase):
 
         self.assertDictEqual(ret, expected_ret)
 
-
-    def test_has_load_shedding_checks_for_operation_in_trace_spans_correctly(self):
-        trace1 = {
-            "spans": [
-                {
-                    "operationName": "process_data_event",
-                },
-                {
-                    "operationName": "log_event_load_shedding",
-                },
-            ]
-        }
-        trace2 =  {
-            "spans": [
-                {
-                    "operationName": "process_data_event",
-                },
-                {
-                    "operationName": "otherOperation",
-                },
-            ]
-        }
-        ret = self.evaluation.has_load_shedding(trace1)
-        self.assertTrue(ret)
-
-        ret2 = self.evaluation.has_load_shedding(trace2)
-        self.assertFalse(ret2)
-
 #     def test_calculate_average_should_return_correctly(self):
 #         values = [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
 #         ret = self.evaluation.calculate_average(values)
@@ -0,0 +1,135 @@
+import unittest
+
+import numpy as np
+
+from benchmark_tools.evaluation.workers_scheduling_evaluation import WorkersSchedulingEvaluation, simulate_workers_queues
+from benchmark_tools.traces.span_table import SpanTable
+
+
+def make_trace(trace_id, init_time, worker_stream_key, worker_duration=None):
+    spans = [
+        {'startTime': init_time, 'duration': 100, 'processID': 'p1', 'operationName': 'process_data_event'},
+        {
+            'startTime': init_time + 100, 'duration': 50, 'processID': 'p1',
+            'operationName': 'serialize_and_write_event_with_trace',
+            'tags': [{'key': 'message_bus.destination', 'value': worker_stream_key}]
+        },
+    ]
+    if worker_duration is not None:
+        spans.append({
+            'startTime': init_time + 200, 'duration': worker_duration, 'processID': 'p2', 'operationName': 'consume_stream'
+        })
+    return {
+        'traceID': trace_id,
+        'processes': {'p1': {'serviceName': 'Scheduler'}, 'p2': {'serviceName': 'MockedStreamConsumer'}},
+        'spans': spans
+    }
+
+
+class WorkersSchedulingEvaluationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluation = WorkersSchedulingEvaluation(
+            jaeger_api_host='jaeger_api_host',
+            output_path='/tmp',
+            workers_configuration_profile={
+                'worker-000-data': {
+                    'throughput': 2, 'throughput_std': 0.1, 'accuracy': 21,
+                    'energy_consumption': 10, 'energy_consumption_std': 0.4, 'energy_consumption_standby': 2,
+                },
+                'worker-001-data': {
+                    'throughput': 4, 'throughput_std': 0.1, 'accuracy': 37,
+                    'energy_consumption': 20, 'energy_consumption_std': 0.4, 'energy_consumption_standby': 2,
+                },
+            },
+            workers_service_types=['MockedStreamConsumer'],
+            pre_consume_stream_process_name='serialize_and_write_event_with_trace',
+            consume_stream_process_name='consume_stream',
+            experiment_time=10,
+            khw_to_coe_rate=None,
+            energy_cost=None,
+            apply_worker_config_variation=False,
+            threshold_functions={},
+            logging_level='ERROR'
+        )
+        self.span_table = SpanTable.from_traces([
+            make_trace('a', 10**6, 'worker-000-data', worker_duration=500000),
+            make_trace('b', 2 * 10**6, 'worker-001-data', worker_duration=250000),
+            make_trace('c', 3 * 10**6, 'worker-000-data'),
+            make_trace('d', 4 * 10**6, 'worker-000-data'),
+        ], tag_keys=('message_bus.destination',))
+
+    def test_get_base_results_data_frame_calculates_processed_events_columns(self):
+        ret = self.evaluation.get_base_results_data_frame(self.span_table)
+        self.assertEqual(self.evaluation.total_traces, 4)
+        self.assertListEqual(ret['worker_stream_key'].tolist(), ['worker-000-data', 'worker-001-data'])
+        self.assertListEqual(ret['processing_time_sec'].tolist(), [0.5, 0.25])
+        self.assertListEqual(ret['throughput'].tolist(), [2.0, 4.0])
+        self.assertListEqual(ret['latency'].tolist(), [0.5002, 0.2502])
+        self.assertListEqual(ret['energy_consumption_w_s'].tolist(), [5.0, 5.0])
+        self.assertListEqual(ret['accuracy'].tolist(), [21, 37])
+        self.assertListEqual(ret['scheduled_time_sec'].tolist(), [1.00015, 2.00015])
+        non_processed_workers = self.evaluation.non_proc_events_details['worker_stream_key'].tolist()
+        self.assertListEqual(non_processed_workers, ['worker-000-data', 'worker-000-data'])
+
+    def test_get_non_processes_results_data_frame_queues_events_after_last_processed(self):
+        self.evaluation.base_results_df = self.evaluation.get_base_results_data_frame(self.span_table)
+        ret = self.evaluation.get_non_processes_results_data_frame()
+        last_processed_end_time = 10**6 + 200 + 500000
+        expected_end_times = [
+            last_processed_end_time + 4 + 500000,
+            last_processed_end_time + 4 + 500000 + 4 + 500000,
+        ]
+        self.assertListEqual(ret['worker_end_time_sec'].tolist(), [t / 10**6 for t in expected_end_times])
+        self.assertListEqual(ret['worker_finished_process'].tolist(), [False, False])
+        non_processed_events = self.evaluation.get_non_processed_traces_by_workers()['worker-000-data']
+        self.assertEqual(non_processed_events[0]['worker_start_time'], last_processed_end_time + 4)
+        self.assertEqual(non_processed_events[1]['worker_end_time'], expected_end_times[1])
+
+    def test_simulate_workers_queues_accumulates_each_worker_queue_separately(self):
+        worker_codes = np.array([0, 0, 0, 1, 1])
+        processing_time = np.array([10.0, 20.0, 30.0, 100.0, 200.0])
+        workers_last_end_time = np.array([1000.0, 5000.0])
+        start_time, end_time = simulate_workers_queues(
+            worker_codes, processing_time, workers_last_end_time)
+        self.assertListEqual(start_time.tolist(), [1004, 1018, 1042, 5004, 5108])
+        self.assertListEqual(end_time.tolist(), [1014, 1038, 1072, 5104, 5308])
+
+    def test_simulate_workers_queues_without_events(self):
+        start_time, end_time = simulate_workers_queues(
+            np.array([], dtype=np.int64), np.array([]), np.array([1000.0, 5000.0]))
+        self.assertEqual(len(start_time), 0)
+        self.assertEqual(len(end_time), 0)
+
+    def test_monte_carlo_samples_without_profile_variation_match_the_results(self):
+        for worker_profile in self.evaluation.workers_configuration_profile.values():
+            worker_profile.update({'throughput_std': 0, 'energy_consumption_std': 0})
+        self.evaluation.monte_carlo_samples = 3
+        ret = self.evaluation.calculate_results(self.span_table)
+        self.assertEqual(ret['monte_carlo_samples'], 3)
+        for metric in ['total_energy_kwh', 'ext_sys_throughput', 'ext_latency_avg', 'ext_latency_std']:
+            self.assertAlmostEqual(ret[f'{metric}_mc_avg'], ret[metric])
+            self.assertAlmostEqual(ret[f'{metric}_mc_ci_low'], ret[metric])
+            self.assertAlmostEqual(ret[f'{metric}_mc_ci_high'], ret[metric])
+
+    def test_monte_carlo_samples_are_reproducible_with_random_seed(self):
+        self.evaluation.monte_carlo_samples = 120
+        self.evaluation.random_seed = 42
+        self.evaluation.calculate_results(self.span_table)
+        schedule = self.evaluation.get_monte_carlo_schedule()
+        samples_a = self.evaluation.run_monte_carlo_samples(schedule)
+        samples_b = self.evaluation.run_monte_carlo_samples(schedule)
+        self.assertEqual(len(samples_a['total_energy_kwh']), 120)
+        self.assertListEqual(samples_a['ext_sys_throughput'].tolist(), samples_b['ext_sys_throughput'].tolist())
+        self.assertGreater(samples_a['ext_sys_throughput'].std(), 0)
+
+    def test_calculate_results(self):
+        ret = self.evaluation.calculate_results(self.span_table)
+        self.assertEqual(ret['total_traces'], 4)
+        self.assertEqual(ret['total_processed'], 2)
+        self.assertEqual(ret['ext_total_processed'], 4)
+        self.assertAlmostEqual(ret['accuracy_avg'], 29)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import MagicMock
+
+from benchmark_tools.task_generator.event_routing import EventRouter
+
+
+def make_stream(stream_key):
+    stream = MagicMock()
+    stream.key = stream_key
+    return stream
+
+
+class EventRouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output_streams = [make_stream('stream-a'), make_stream('stream-b'), make_stream('stream-c')]
+
+    def get_routed_stream_keys(self, router, events):
+        return [[stream.key for stream in router.get_event_output_streams(event)] for event in events]
+
+    def test_round_robin_routing(self):
+        router = EventRouter(self.output_streams)
+        ret = self.get_routed_stream_keys(router, [{'id': i} for i in range(4)])
+        self.assertListEqual(ret, [['stream-a'], ['stream-b'], ['stream-c'], ['stream-a']])
+        self.assertDictEqual(router.forwarded_events, {'stream-a': 2, 'stream-b': 1, 'stream-c': 1})
+
+    def test_by_field_routing_sends_same_field_value_to_same_stream(self):
+        router = EventRouter(self.output_streams, routing='by_field', routing_field='publisher_id')
+        events = [{'publisher_id': f'publisher-{i % 5}'} for i in range(20)]
+        ret = self.get_routed_stream_keys(router, events)
+        for event, stream_keys in zip(events[5:], ret[5:]):
+            self.assertListEqual(stream_keys, ret[int(event['publisher_id'].rsplit('-', 1)[-1])])
+        self.assertEqual(sum(router.forwarded_events.values()), 20)
+
+    def test_broadcast_routing(self):
+        router = EventRouter(self.output_streams, routing='broadcast')
+        ret = self.get_routed_stream_keys(router, [{'id': 1}])
+        self.assertListEqual(ret, [['stream-a', 'stream-b', 'stream-c']])
+
+    def test_invalid_routing(self):
+        with self.assertRaises(Exception):
+            EventRouter(self.output_streams, routing='unknown')
+        with self.assertRaises(Exception):
+            EventRouter(self.output_streams, routing='by_field')
+
+
+if __name__ == '__main__':
+    unittest.main()
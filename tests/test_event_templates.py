@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from benchmark_tools.task_generator.event_templates import PreSerializedEventTemplate
+
+
+class PreSerializedEventTemplateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.event_template = {
+            'publisher_id': 'publisher-id-1',
+            'vekg': {'nodes': [['person', {'bbox': [1, 2, 3, 4]}]]},
+            'width': 640,
+            'query_ids': [],
+        }
+
+    def test_serialized_event_is_the_same_as_serializing_the_whole_event(self):
+        for pub_id in ['pub-id', 'pub "quoted" id']:
+            for event_template in [self.event_template, dict(id='old-id', **self.event_template)]:
+                serialized_template = PreSerializedEventTemplate(event_template, pub_id)
+                event_data = event_template.copy()
+                event_data['id'] = f'{pub_id}:123'
+                self.assertEqual(serialized_template.serialize(123), json.dumps(event_data).encode('utf-8'))
+
+    def test_per_event_fields(self):
+        serialized_template = PreSerializedEventTemplate(
+            self.event_template, 'pub-id', per_event_fields=['send_timestamp', 'sequence_number'])
+        ret = json.loads(serialized_template.serialize(7))
+        self.assertEqual(ret['id'], 'pub-id:7')
+        self.assertEqual(ret['sequence_number'], 7)
+        self.assertIsInstance(ret['send_timestamp'], float)
+        self.assertEqual(ret['vekg'], self.event_template['vekg'])
+
+    def test_unknown_per_event_field(self):
+        with self.assertRaises(Exception):
+            PreSerializedEventTemplate(self.event_template, 'pub-id', per_event_fields=['unknown'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmark_tools.task_generator.load_profiles import get_load_profile_schedule
+
+
+class LoadProfilesTestCase(unittest.TestCase):
+
+    def test_constant_schedule(self):
+        ret = get_load_profile_schedule({'type': 'constant', 'fps': 4}, max_time=1)
+        self.assertListEqual(ret.tolist(), [0, 0.25, 0.5, 0.75])
+
+    def test_ramp_schedule_follows_the_rate_and_then_stays_at_end_fps(self):
+        ret = get_load_profile_schedule(
+            {'type': 'ramp', 'start_fps': 0, 'end_fps': 10, 'ramp_time': 10}, max_time=12)
+        # during the ramp the k-th event is published when 0.5 * t**2 = k
+        np.testing.assert_allclose(ret[:50], np.sqrt(2 * np.arange(50)))
+        np.testing.assert_allclose(ret[50:], 10 + np.arange(20) / 10)
+
+    def test_ramp_schedule_without_fps_change_is_constant(self):
+        ret = get_load_profile_schedule(
+            {'type': 'ramp', 'start_fps': 5, 'end_fps': 5, 'ramp_time': 1}, max_events=10)
+        np.testing.assert_allclose(ret, np.arange(10) / 5)
+
+    def test_ramp_schedule_needs_a_positive_ramp_time(self):
+        with self.assertRaisesRegex(Exception, 'positive ramp_time'):
+            get_load_profile_schedule({'type': 'ramp', 'start_fps': 0, 'end_fps': 10, 'ramp_time': 0}, max_time=1)
+
+    def test_step_schedule(self):
+        steps = [{'fps': 2, 'duration': 1}, {'fps': 0, 'duration': 1}, {'fps': 4, 'duration': 0.5}]
+        ret = get_load_profile_schedule({'type': 'step', 'steps': steps})
+        self.assertListEqual(ret.tolist(), [0, 0.5, 2, 2.25])
+
+    def test_poisson_schedule_has_the_mean_rate_and_is_reproducible(self):
+        ret = get_load_profile_schedule({'type': 'poisson', 'fps': 1000, 'seed': 42}, max_time=10)
+        same = get_load_profile_schedule({'type': 'poisson', 'fps': 1000, 'seed': 42}, max_time=10)
+        self.assertListEqual(ret.tolist(), same.tolist())
+        self.assertAlmostEqual(len(ret) / 10, 1000, delta=50)
+        self.assertTrue((np.diff(ret) >= 0).all())
+        self.assertLess(ret[-1], 10)
+
+    def test_bursty_schedule(self):
+        ret = get_load_profile_schedule(
+            {'type': 'bursty', 'on_fps': 4, 'on_time': 0.5, 'off_time': 1.5}, max_events=5)
+        self.assertListEqual(ret.tolist(), [0, 0.25, 2, 2.25, 4])
+
+    def test_trace_replay_schedule(self):
+        traces = [
+            {
+                'traceID': trace_id,
+                'processes': {'p1': {'serviceName': 'Scheduler'}},
+                'spans': [{'startTime': start_time, 'duration': 1, 'processID': 'p1', 'operationName': 'op'}]
+            }
+            for trace_id, start_time in [('a', 3 * 10**6), ('b', 10**6), ('c', 2 * 10**6)]
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'data': traces}, f)
+        try:
+            ret = get_load_profile_schedule({'type': 'trace_replay', 'traces_file': f.name, 'speedup': 2})
+        finally:
+            os.remove(f.name)
+        self.assertListEqual(ret.tolist(), [0, 0.5, 1])
+
+    def test_unknown_load_profile(self):
+        with self.assertRaises(Exception):
+            get_load_profile_schedule({'type': 'unknown'}, max_time=1)
+        with self.assertRaises(Exception):
+            get_load_profile_schedule({'type': 'poisson', 'fps': 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmark_tools.traces.metrics_engine import (
+    OperationDurationsAggregation,
+    RunningMoments,
+    TraceLatencyAggregation,
+    TraceMetricsEngine,
+    TracesWithOperationAggregation,
+    TraceTimeRangeAggregation
+)
+from benchmark_tools.traces.span_table import SpanTable
+from benchmark_tools.traces.trace_store import JaegerTraceStore
+
+
+def make_trace(trace_id, spans, service='Scheduler'):
+    return {
+        'traceID': trace_id,
+        'processes': {'p1': {'serviceName': service}},
+        'spans': [
+            {'startTime': start_time, 'duration': duration, 'processID': 'p1', 'operationName': operation}
+            for start_time, duration, operation in spans
+        ]
+    }
+
+
+class TraceAggregationsTestCase(unittest.TestCase):
+
+    def test_running_moments_merges_chunks_correctly(self):
+        values = np.random.RandomState(42).lognormal(size=1000)
+        moments = RunningMoments()
+        for chunk in np.array_split(values, 7):
+            moments.update(chunk)
+        ret = moments.result()
+        self.assertEqual(ret['count'], 1000)
+        self.assertAlmostEqual(ret['avg'], values.mean())
+        self.assertAlmostEqual(ret['std'], values.std(ddof=1))
+
+    def test_running_moments_without_enough_values(self):
+        moments = RunningMoments()
+        self.assertDictEqual(moments.result(), {'count': 0, 'avg': None, 'std': None})
+        moments.update(np.array([2.0]))
+        self.assertDictEqual(moments.result(), {'count': 1, 'avg': 2.0, 'std': None})
+
+    def test_latency_aggregation_uses_first_and_last_spans_of_trace(self):
+        aggregation = TraceLatencyAggregation()
+        aggregation.update(SpanTable.from_traces([
+            make_trace('1', [
+                (1571981717759324, 1000, 'op'),  # start time x
+                (1571981717769324, 1000, 'op'),
+                (1571981727759324, 2000, 'op'),  # start time x+10.002 seconds
+            ]),
+        ]))
+        aggregation.update(SpanTable.from_traces([
+            make_trace('2', [(1571981717759324, 1000, 'op'), (1571981727759324, 2000, 'op')]),
+        ]))
+        ret = aggregation.result()
+        self.assertEqual(ret['count'], 2)
+        self.assertAlmostEqual(ret['avg'], 10.002)
+        self.assertAlmostEqual(ret['std'], 0)
+
+    def test_time_range_aggregation_when_last_trace_is_not_last_processed(self):
+        start_time1 = 10**6
+        start_time2 = start_time1 + 50
+        aggregation = TraceTimeRangeAggregation()
+        aggregation.update(SpanTable.from_traces([
+            make_trace('1', [(start_time1, 1000, 'op'), (start_time1 + 1000, 3000, 'op')]),
+        ]))
+        aggregation.update(SpanTable.from_traces([
+            make_trace('2', [(start_time2, 1000, 'op'), (start_time2 + 1000, 2000, 'op')]),
+        ]))
+        aggregation.update(SpanTable.from_traces([]))
+        ret = aggregation.result()
+        self.assertDictEqual(ret, {
+            'total_traces': 2,
+            'first_start_time': start_time1,
+            'last_end_time': start_time1 + 4000,
+        })
+
+    def test_traces_with_operation_aggregation(self):
+        aggregation = TracesWithOperationAggregation('log_event_load_shedding')
+        aggregation.update(SpanTable.from_traces([
+            make_trace('1', [(0, 1, 'process_data_event'), (1, 1, 'log_event_load_shedding')]),
+            make_trace('2', [(0, 1, 'process_data_event'), (1, 1, 'otherOperation')]),
+            make_trace('3', [(0, 1, 'log_event_load_shedding'), (1, 1, 'log_event_load_shedding')]),
+        ]))
+        self.assertDictEqual(aggregation.result(), {'total_traces': 3, 'traces_with_operation': 2})
+
+    def test_operation_durations_aggregation(self):
+        aggregation = OperationDurationsAggregation('Scheduler')
+        aggregation.update(SpanTable.from_traces([
+            make_trace('1', [(0, 1 * 10**6, 'a'), (0, 3 * 10**6, 'a'), (0, 10**6, 'b')]),
+            make_trace('2', [(0, 1 * 10**6, 'a')], service='Other'),
+        ]))
+        ret = aggregation.result()
+        self.assertDictEqual(ret['a'], {'count': 2, 'avg': 2.0, 'std': 2 ** 0.5})
+        self.assertDictEqual(ret['b'], {'count': 1, 'avg': 1.0, 'std': None})
+
+
+class TraceMetricsEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.trace_store = JaegerTraceStore(logging_level='ERROR')
+        self.engine = TraceMetricsEngine(trace_store=self.trace_store, chunk_size=2, logging_level='ERROR')
+        self.traces = [
+            make_trace(str(i), [(i * 10, 5, 'process_data_event'), (i * 10 + 1, 2, 'log_event_load_shedding')])
+            for i in range(5)
+        ]
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_registered_aggregations_are_computed_in_a_single_pass(self, mocked_fetch):
+        mocked_fetch.side_effect = lambda url: iter(self.traces)
+        time_range = self.engine.register(TraceTimeRangeAggregation(), 'host', service='Scheduler')
+        load_shedding = self.engine.register(
+            TracesWithOperationAggregation('log_event_load_shedding'), 'host', service='Scheduler')
+        same_time_range = self.engine.register(TraceTimeRangeAggregation(), 'host', service='Scheduler')
+        self.assertIs(time_range, same_time_range)
+
+        self.assertDictEqual(
+            self.engine.get_result(time_range), {'total_traces': 5, 'first_start_time': 0, 'last_end_time': 45})
+        self.assertDictEqual(
+            self.engine.get_result(load_shedding), {'total_traces': 5, 'traces_with_operation': 5})
+        self.assertEqual(mocked_fetch.call_count, 1)
+        self.assertListEqual(list(self.engine.query_passes.values()), [1])
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_aggregation_registered_after_the_pass_gets_its_own_pass(self, mocked_fetch):
+        mocked_fetch.side_effect = lambda url: iter(self.traces)
+        time_range = self.engine.register(TraceTimeRangeAggregation(), 'host', service='Scheduler')
+        self.engine.get_result(time_range)
+        latency = self.engine.register(TraceLatencyAggregation(), 'host', service='Scheduler')
+        self.assertEqual(self.engine.get_result(latency)['count'], 5)
+        self.assertListEqual(list(self.engine.query_passes.values()), [2])
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_pass_errors_are_raised_for_all_its_aggregations(self, mocked_fetch):
+        mocked_fetch.side_effect = Exception('jaeger is down')
+        time_range = self.engine.register(TraceTimeRangeAggregation(), 'host', service='Scheduler')
+        latency = self.engine.register(TraceLatencyAggregation(), 'host', service='Scheduler')
+        with self.assertRaises(Exception):
+            self.engine.get_result(time_range)
+        with self.assertRaises(Exception):
+            self.engine.get_result(latency)
+        self.assertEqual(mocked_fetch.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmark_tools.task_generator.pacing import EventPacer
+
+
+class EventPacerTestCase(unittest.TestCase):
+
+    @patch('benchmark_tools.task_generator.pacing.time.monotonic')
+    def test_events_are_paced_on_absolute_deadlines_after_a_stall(self, mocked_monotonic):
+        pacer = EventPacer(10, init_ts=100.0)
+        pacer.register_event_sent(send_ts=100.0)
+        # stall of 0.35 seconds: the next events are already late, so they are sent without waiting
+        mocked_monotonic.return_value = 100.35
+        self.assertAlmostEqual(pacer.get_wait_time(), -0.25)
+        pacer.register_event_sent(send_ts=100.35)
+        pacer.register_event_sent(send_ts=100.35)
+        pacer.register_event_sent(send_ts=100.35)
+        # caught up: the 5th event deadline is at 100.4, independently of when the previous ones were sent
+        self.assertAlmostEqual(pacer.get_wait_time(), 0.05)
+        self.assertAlmostEqual(pacer.max_lateness, 0.25)
+        self.assertAlmostEqual(pacer.total_lateness, 0.25 + 0.15 + 0.05)
+
+    @patch('benchmark_tools.task_generator.pacing.time.monotonic')
+    def test_stats_have_achieved_rate_and_lateness_histogram(self, mocked_monotonic):
+        pacer = EventPacer(100, init_ts=0.0)
+        for event_index in range(10):
+            pacer.register_event_sent(send_ts=event_index * 0.01 + 0.0003)
+        pacer.register_event_sent(send_ts=0.1 + 0.03)
+        mocked_monotonic.return_value = 0.13
+        ret = pacer.get_stats()
+        self.assertEqual(ret['total_events'], 11)
+        self.assertAlmostEqual(ret['achieved_fps'], 11 / 0.13)
+        self.assertAlmostEqual(ret['lateness_max'], 0.03)
+        self.assertEqual(ret['lateness_histogram']['<=0.5ms'], 10)
+        self.assertEqual(ret['lateness_histogram']['<=50ms'], 1)
+        self.assertEqual(sum(ret['lateness_histogram'].values()), 11)
+
+    def test_batch_size_has_the_events_due_within_the_batch_latency(self):
+        pacer = EventPacer(1000, init_ts=0.0)
+        self.assertEqual(pacer.get_batch_size(1, 0.005), 1)
+        self.assertEqual(pacer.get_batch_size(100, 0.005), 6)
+        self.assertEqual(pacer.get_batch_size(4, 0.005), 4)
+        pacer = EventPacer(schedule=np.array([0, 0.001, 0.002, 0.5, 0.5005]), init_ts=0.0)
+        self.assertEqual(pacer.get_batch_size(100, 0.005), 3)
+        pacer.register_events_sent(3, send_ts=0.002)
+        self.assertEqual(pacer.get_batch_size(100, 0.005), 2)
+        self.assertAlmostEqual(pacer.total_lateness, 0.002 + 0.001)
+        self.assertEqual(pacer.total_batches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from benchmark_tools.task_generator.service_time import ServiceTimeEmulator, ServiceTimeSampler
+
+
+class ServiceTimeEmulatorTestCase(unittest.TestCase):
+
+    def test_cpu_mode_burns_cpu_for_the_missing_time(self):
+        emulator = ServiceTimeEmulator(mode='cpu')
+        cpu_start_time = time.process_time()
+        start_time = time.perf_counter()
+        emulator.emulate(0.05)
+        self.assertGreaterEqual(time.perf_counter() - start_time, 0.05)
+        self.assertGreater(time.process_time() - cpu_start_time, 0.03)
+
+    def test_sleep_mode_does_not_burn_cpu(self):
+        emulator = ServiceTimeEmulator(mode='sleep')
+        cpu_start_time = time.process_time()
+        emulator.emulate(0.05)
+        self.assertLess(time.process_time() - cpu_start_time, 0.02)
+
+    def test_cpu_mode_touches_the_working_set(self):
+        emulator = ServiceTimeEmulator(mode='cpu', working_set_size=256 * 1024)
+        emulator.emulate(0.01)
+        self.assertGreater(int(emulator.working_set.sum()), 256 * 1024)
+
+    def test_stats_compare_achieved_and_target_service_times(self):
+        emulator = ServiceTimeEmulator()
+        emulator.register_service_time(0.1, 0.11)
+        emulator.register_service_time(0.2, 0.19)
+        ret = emulator.get_stats()
+        self.assertAlmostEqual(ret['service_time_target_avg'], 0.15)
+        self.assertAlmostEqual(ret['service_time_achieved_avg'], 0.15)
+        self.assertAlmostEqual(ret['service_time_error_max'], 0.01)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(Exception):
+            ServiceTimeEmulator(mode='unknown')
+
+
+
+class ServiceTimeSamplerTestCase(unittest.TestCase):
+
+    def get_samples(self, distribution, total_samples=20000):
+        sampler = ServiceTimeSampler(distribution, block_size=1000)
+        return np.array([sampler.sample() for _ in range(total_samples)])
+
+    def test_lognormal_and_gamma_samples_have_the_distribution_mean_and_std(self):
+        for distribution_type in ['lognormal', 'gamma']:
+            ret = self.get_samples({'type': distribution_type, 'mean': 0.1, 'std': 0.05, 'seed': 42})
+            self.assertAlmostEqual(ret.mean(), 0.1, delta=0.002)
+            self.assertAlmostEqual(ret.std(), 0.05, delta=0.003)
+            self.assertTrue((ret > 0).all())
+
+    def test_histogram_samples_are_inside_the_bins(self):
+        ret = self.get_samples({'type': 'histogram', 'bins': [0.1, 0.2, 1.0], 'counts': [3, 1], 'seed': 42})
+        self.assertTrue(((ret >= 0.1) & (ret < 1.0)).all())
+        self.assertAlmostEqual((ret < 0.2).mean(), 0.75, delta=0.02)
+
+    def test_trace_replay_samples_the_consume_stream_spans_durations(self):
+        traces = [
+            {
+                'traceID': trace_id,
+                'processes': {'p1': {'serviceName': 'Scheduler'}, 'p2': {'serviceName': 'MockedStreamConsumer'}},
+                'spans': [
+                    {'startTime': 0, 'duration': 999, 'processID': 'p1', 'operationName': 'consume_stream'},
+                    {'startTime': 1, 'duration': duration, 'processID': 'p2', 'operationName': 'consume_stream'},
+                ]
+            }
+            for trace_id, duration in [('a', 100000), ('b', 300000)]
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'data': traces}, f)
+        try:
+            ret = self.get_samples({'type': 'trace_replay', 'traces_file': f.name, 'seed': 42}, total_samples=100)
+        finally:
+            os.remove(f.name)
+        self.assertSetEqual(set(ret.tolist()), {0.1, 0.3})
+
+    def test_samples_are_reproducible_with_seed(self):
+        distribution = {'type': 'gamma', 'mean': 0.1, 'std': 0.05, 'seed': 1}
+        self.assertListEqual(
+            self.get_samples(distribution, 1500).tolist(), self.get_samples(distribution, 1500).tolist())
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(Exception):
+            ServiceTimeSampler({'type': 'unknown'})
+
+
+if __name__ == '__main__':
+    unittest.main()
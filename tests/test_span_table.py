@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from benchmark_tools.traces.span_table import SpanTable
+
+
+class SpanTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.traces = [
+            {
+                'traceID': 'a',
+                'processes': {'p1': {'serviceName': 'Scheduler'}, 'p2': {'serviceName': 'Worker'}},
+                'spans': [
+                    {'startTime': 10, 'duration': 5, 'processID': 'p1', 'operationName': 'schedule',
+                     'tags': [{'key': 'message_bus.destination', 'value': 'worker-0'}]},
+                    {'startTime': 2, 'duration': 3, 'processID': 'p1', 'operationName': 'process'},
+                    {'startTime': 20, 'duration': 30, 'processID': 'p2', 'operationName': 'consume'},
+                ]
+            },
+            {'traceID': 'empty', 'processes': {}, 'spans': []},
+            {
+                'traceID': 'b',
+                'processes': {'p1': {'serviceName': 'Worker'}},
+                'spans': [
+                    {'startTime': 100, 'duration': 50, 'processID': 'p1', 'operationName': 'consume'},
+                    {'startTime': 110, 'duration': 10, 'processID': 'p1', 'operationName': 'consume'},
+                ]
+            },
+        ]
+        self.span_table = SpanTable.from_traces(self.traces, tag_keys=('message_bus.destination',))
+
+    def test_from_traces_builds_columns(self):
+        self.assertEqual(self.span_table.n_traces, 2)
+        self.assertEqual(self.span_table.n_spans, 5)
+        self.assertListEqual(self.span_table.trace_ids, ['a', 'b'])
+        self.assertListEqual(self.span_table.trace_offsets.tolist(), [0, 3, 5])
+        self.assertListEqual(self.span_table.trace_index.tolist(), [0, 0, 0, 1, 1])
+        self.assertListEqual(self.span_table.end_time.tolist(), [15, 5, 50, 150, 120])
+        self.assertListEqual(self.span_table.services, ['Scheduler', 'Worker'])
+        self.assertListEqual(self.span_table.service_code.tolist(), [0, 0, 1, 1, 1])
+        self.assertListEqual(
+            self.span_table.tags['message_bus.destination'].tolist(), ['worker-0', None, None, None, None])
+
+    def test_span_mask_and_traces_with_spans(self):
+        mask = self.span_table.span_mask(services=['Worker'], operation='consume')
+        self.assertListEqual(mask.tolist(), [False, False, True, True, True])
+        mask = self.span_table.span_mask(operation='schedule')
+        self.assertListEqual(self.span_table.traces_with_spans(mask).tolist(), [True, False])
+        mask = self.span_table.span_mask(services=['Unknown'], operation='unknown')
+        self.assertFalse(mask.any())
+
+    def test_trace_times(self):
+        self.assertListEqual(self.span_table.trace_first_start_times().tolist(), [10, 100])
+        self.assertListEqual(self.span_table.trace_min_start_times().tolist(), [2, 100])
+        self.assertListEqual(self.span_table.trace_last_end_times().tolist(), [50, 120])
+        self.assertListEqual(self.span_table.trace_max_end_times().tolist(), [50, 150])
+        self.assertListEqual(self.span_table.trace_latencies().tolist(), [40 / 10**6, 20 / 10**6])
+
+    def test_durations_by_operation(self):
+        ret = self.span_table.durations_by_operation('Worker')
+        self.assertListEqual(sorted(ret.keys()), ['consume'])
+        self.assertListEqual(ret['consume'].tolist(), [30, 50, 10])
+
+    def test_first_and_last_span_per_trace_in_start_time_order(self):
+        ordered_spans = self.span_table.spans_ordered_by_start_time()
+        self.assertListEqual(ordered_spans.tolist(), [1, 0, 2, 3, 4])
+        scheduler_mask = self.span_table.span_mask(services=['Scheduler'])
+        scheduler_spans = ordered_spans[scheduler_mask[ordered_spans]]
+        self.assertListEqual(self.span_table.first_span_per_trace(scheduler_spans).tolist(), [1, -1])
+        self.assertListEqual(self.span_table.last_span_per_trace(scheduler_spans).tolist(), [0, -1])
+
+    def test_empty_span_table(self):
+        span_table = SpanTable.from_traces([])
+        self.assertEqual(span_table.n_traces, 0)
+        self.assertEqual(span_table.trace_max_end_times().tolist(), [])
+        self.assertEqual(span_table.first_span_per_trace(np.array([], dtype=np.int64)).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
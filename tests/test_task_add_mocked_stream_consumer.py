@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+try:
+    from benchmark_tools.task_generator.task_add_mocked_stream_consumer import TaskAddBackgroundMockedStreamConsumer
+except Exception:
+    # the jaeger client doesn't import on every python version
+    TaskAddBackgroundMockedStreamConsumer = None
+
+
+class IdleConsumerGroup():
+    # consumer group of a stream without new events, recording when each consumer starts reading
+
+    def __init__(self, consumer_name=None, reads=None):
+        self.name = 'cg-stream'
+        self.consumer_name = consumer_name
+        self.reads = reads if reads is not None else {}
+        self.lock = threading.Lock()
+
+    def consumer(self, consumer_name):
+        return IdleConsumerGroup(consumer_name, self.reads)
+
+    def read(self, count=None, block=None):
+        with self.lock:
+            self.reads.setdefault(self.consumer_name, []).append(time.monotonic())
+        time.sleep(block / 1000)
+        return []
+
+
+@unittest.skipIf(TaskAddBackgroundMockedStreamConsumer is None, 'jaeger client is not importable')
+class TaskAddBackgroundMockedStreamConsumerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.consumer_group = IdleConsumerGroup()
+        self.stream = MagicMock()
+        self.stream.key = 'stream'
+        self.stream.input_consumer_group = self.consumer_group
+        self.stream_factory = MagicMock()
+        self.stream_factory.create.return_value = self.stream
+        self.task = TaskAddBackgroundMockedStreamConsumer(
+            actions=[],
+            stream_factory=self.stream_factory,
+            tracer_configs={},
+            logging_level='ERROR'
+        )
+        self.task.read_block_time = 50
+        self.task.pool_stop_timeout = 2
+
+    @patch('benchmark_tools.task_generator.task_add_mocked_stream_consumer.init_tracer')
+    def test_consumer_on_idle_stream_stops_after_max_time(self, mocked_init_tracer):
+        start_time = time.monotonic()
+        stats = self.task.consume_stream_events(self.stream, processing_time=0, max_time=0.2, variation=0)
+        self.assertLess(time.monotonic() - start_time, 1)
+        self.assertEqual(stats['total_events'], 0)
+        self.assertGreater(stats['total_reads'], 1)
+
+    @patch('benchmark_tools.task_generator.task_add_mocked_stream_consumer.init_tracer')
+    def test_scaled_down_consumer_reads_nothing_after_the_stop(self, mocked_init_tracer):
+        consume_kwargs = {'processing_time': 0, 'max_time': 0.6, 'variation': 0}
+        start_time = time.monotonic()
+        stats = self.task.consume_events_with_pool(
+            'stream', consume_kwargs, concurrency=2, concurrency_mode='thread',
+            scaling=[{'time': 0.2, 'concurrency': 1}])
+        self.assertEqual(len(stats), 2)
+        reads = self.consumer_group.reads
+        # the removed consumer only finishes the read it was blocked on when it was stopped
+        self.assertLess(max(reads['stream-consumer-1']) - start_time, 0.2 + self.task.read_block_time / 1000)
+        self.assertGreater(max(reads['stream-consumer-0']) - start_time, 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from benchmark_tools.task_generator.task_add_mocked_stream_publishing import TaskAddBackgroundMockedStream
+
+
+def publish_action(stream_key, max_events):
+    return {
+        'action': 'publishToStream',
+        'pub_id': f'pub-{stream_key}',
+        'stream_key': stream_key,
+        'fps': 200,
+        'max_events': max_events,
+        'event_template': {'vekg': {}},
+    }
+
+
+class TaskAddBackgroundMockedStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.streams = {}
+        self.stream_factory = MagicMock()
+        self.stream_factory.create.side_effect = lambda key, stype: self.streams.setdefault(key, MagicMock())
+        self.task = TaskAddBackgroundMockedStream(
+            actions=[],
+            stream_factory=self.stream_factory,
+            publisher_workers=2,
+            publisher_connections=2,
+            logging_level='ERROR'
+        )
+
+    def test_multiplexed_publish_events_keeps_each_stream_rate(self):
+        publishers = [
+            {k: v for k, v in publish_action(f'stream-{i}', 5).items() if k != 'action'}
+            for i in range(3)
+        ]
+        ret = self.task.multiplexed_publish_events(publishers)
+        self.assertListEqual([stats['stream_key'] for stats in ret], ['stream-0', 'stream-1', 'stream-2'])
+        for stats in ret:
+            self.assertEqual(stats['total_events'], 5)
+            # 5 events at 200 FPS are published in (at least) 4 event intervals
+            self.assertLessEqual(stats['achieved_fps'], 5 / (4 / 200))
+            self.assertEqual(self.streams[stats['stream_key']].write_events.call_count, 5)
+        event = self.streams['stream-1'].write_events.call_args_list[-1][0][0]
+        self.assertIn(b'"id": "pub-stream-1:4"', event['event'])
+
+    def test_publish_events_saves_publishing_stats(self):
+        self.task.output_path = tempfile.mkdtemp()
+        try:
+            self.task.publish_events('pub-id', 'stream-0', 200, {'vekg': {}}, max_events=5)
+            with open(os.path.join(self.task.output_path, 'publishing_stats_stream-0.json')) as f:
+                ret = json.load(f)
+        finally:
+            shutil.rmtree(self.task.output_path)
+        self.assertEqual(ret['pub_id'], 'pub-id')
+        self.assertEqual(ret['total_events'], 5)
+        self.assertEqual(sum(ret['lateness_histogram'].values()), 5)
+        self.assertEqual(self.streams['stream-0'].write_events.call_count, 5)
+
+    def test_publish_events_following_a_load_profile(self):
+        steps = [{'fps': 200, 'duration': 0.02}, {'fps': 100, 'duration': 0.02}]
+        ret = self.task.publish_events(
+            'pub-id', 'stream-0', None, {'vekg': {}}, load_profile={'type': 'step', 'steps': steps})
+        self.assertEqual(ret['scheduled_events'], 6)
+        self.assertEqual(ret['total_events'], 6)
+        self.assertGreaterEqual(ret['total_time'], 0.03)
+
+    def test_publish_events_in_batches_on_redis_pipelines(self):
+        self.task.max_batch_size = 4
+        self.task.max_batch_latency = 0.02
+        ret = self.task.publish_events('pub-id', 'stream-0', 200, {'vekg': {}}, max_events=10)
+        pipeline = self.streams['stream-0'].redis_db.pipeline.return_value
+        # batches of 4, 4 and 2 events (limited by max_events)
+        self.assertEqual(ret['total_round_trips'], 3)
+        self.assertEqual(pipeline.execute.call_count, 3)
+        self.assertEqual(pipeline.xadd.call_count, 10)
+        self.assertEqual(self.streams['stream-0'].write_events.call_count, 0)
+        self.assertIn(b'"id": "pub-id:9"', pipeline.xadd.call_args[0][1]['event'])
+
+    @patch('benchmark_tools.task_generator.task_add_mocked_stream_publishing.Process')
+    def test_consecutive_publish_actions_are_distributed_between_workers(self, mocked_process):
+        self.task.actions = [
+            publish_action('stream-0', 1),
+            publish_action('stream-1', 1),
+            publish_action('stream-2', 1),
+            {'action': 'task_gen_wait_for', 'sleep_time': 0},
+            publish_action('stream-3', 1),
+        ]
+        self.task.execute_actions()
+        workers_streams = [
+            [publisher['stream_key'] for publisher in call[1]['args'][0]]
+            for call in mocked_process.call_args_list
+        ]
+        self.assertListEqual(workers_streams, [['stream-0', 'stream-2'], ['stream-1'], ['stream-3']])
+        self.assertListEqual(self.task.pending_publishers, [])
+
+    @patch('benchmark_tools.task_generator.task_add_mocked_stream_publishing.Process')
+    def test_invalid_load_profiles_fail_on_the_publish_action(self, mocked_process):
+        action = publish_action('stream-0', 1)
+        action.pop('fps', None)
+        action.pop('max_events', None)
+        action.pop('max_time', None)
+        action['load_profile'] = {'type': 'poisson', 'fps': 10}
+        with self.assertRaisesRegex(Exception, 'max_events or max_time'):
+            self.task.process_action(action)
+        action['load_profile'] = {'type': 'ramp', 'start_fps': 0, 'end_fps': 10, 'ramp_time': 0}
+        action['max_time'] = 10
+        with self.assertRaisesRegex(Exception, 'positive ramp_time'):
+            self.task.process_action(action)
+        self.assertListEqual(self.task.pending_publishers, [])
+        mocked_process.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
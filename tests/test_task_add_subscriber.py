@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from benchmark_tools.task_generator.task_add_subscriber import TaskAddBackgroundSubscriberEventsExporter
+
+
+class FakeConsumerGroup():
+    # returns the events batches while the stream is published, and then the events still on the stream
+    # once the exporter is stopped
+
+    def __init__(self, stream_key, batches, stop_event, drain_batches):
+        self.stream_key = stream_key
+        self.batches = list(batches)
+        self.stop_event = stop_event
+        self.drain_batches = list(drain_batches)
+        self.reads_blocks = []
+
+    def read(self, count=None, block=None):
+        self.reads_blocks.append(block)
+        if self.batches:
+            return [(self.stream_key, self.batches.pop(0))]
+        if not self.stop_event.is_set():
+            self.stop_event.wait(block / 1000)
+            return []
+        if self.drain_batches:
+            return [(self.stream_key, self.drain_batches.pop(0))]
+        return []
+
+
+def create_events(start, total):
+    return [(f'1-{i}'.encode('utf-8'), {b'event': json.dumps({'id': i}).encode('utf-8')})
+            for i in range(start, start + total)]
+
+
+class TaskAddBackgroundSubscriberEventsExporterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.task = TaskAddBackgroundSubscriberEventsExporter(
+            actions=[],
+            stream_factory=MagicMock(),
+            output_path=self.output_dir.name,
+            read_block_time=50,
+            drain_timeout=5,
+            logging_level='ERROR'
+        )
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def create_stream(self, stream_key, batches, drain_batches):
+        stream = MagicMock()
+        stream.key = stream_key
+        stream.input_consumer_group = FakeConsumerGroup(stream_key, batches, self.task.stop_event, drain_batches)
+        return stream
+
+    def read_ids(self, output_file):
+        with open(output_file, 'r') as f:
+            return [json.loads(line)['id'] for line in f]
+
+    def test_subscription_export_drains_the_stream_after_stopping(self):
+        stream = self.create_stream('s1', [create_events(0, 3), create_events(3, 2)], [create_events(5, 4)])
+        output_file = os.path.join(self.output_dir.name, 'subscription_s1.jl')
+        self.task.stop_event.set()
+        stats = self.task.subscription_export('sub', stream, output_file)
+        self.assertEqual(stats['total_events'], 9)
+        self.assertEqual(self.read_ids(output_file), list(range(9)))
+        self.assertEqual(stream.input_consumer_group.reads_blocks, [None] * 4)
+
+    def test_stop_drains_the_exporter_process_and_reports_each_subscription(self):
+        self.task.subscriptions = [
+            ('sub', self.create_stream('s1', [create_events(0, 3)], [create_events(3, 1)]),
+             os.path.join(self.output_dir.name, 'subscription_s1.jl')),
+            ('sub', self.create_stream('s2', [], [create_events(0, 2)]),
+             os.path.join(self.output_dir.name, 'subscription_s2.jl')),
+        ]
+        self.task.start_exporter_process()
+        stats = self.task.stop()
+        self.assertFalse(self.task.exporter_process.is_alive())
+        self.assertEqual({key: s['total_events'] for key, s in stats.items()}, {'s1': 4, 's2': 2})
+        self.assertEqual(self.read_ids(os.path.join(self.output_dir.name, 'subscription_s1.jl')), [0, 1, 2, 3])
+        with open(os.path.join(self.output_dir.name, 'subscriptions_stats.json'), 'r') as f:
+            self.assertEqual(json.load(f)['s2']['total_events'], 2)
+        # stopping again only returns the same stats
+        self.assertIs(self.task.stop(), stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
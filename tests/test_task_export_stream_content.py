@@ -0,0 +1,106 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from benchmark_tools.task_generator.task_export_stream_content import TaskExportStreamContent
+
+
+class FakeStreamsRedis():
+
+    def __init__(self, streams):
+        self.streams = streams
+        self.xrange_calls = []
+
+    def parse_id(self, entry_id):
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode('utf-8')
+        timestamp, sequence = entry_id.split('-')
+        return int(timestamp), int(sequence)
+
+    def xrevrange(self, stream_key, count=None):
+        return list(reversed(self.streams.get(stream_key, [])))[:count]
+
+    def xrange(self, stream_key, min='-', max='+', count=None):
+        self.xrange_calls.append((stream_key, min, max, count))
+        events = [
+            (event_id, event) for event_id, event in self.streams[stream_key]
+            if (min == '-' or self.parse_id(event_id) >= self.parse_id(min)) and
+            (max == '+' or self.parse_id(event_id) <= self.parse_id(max))
+        ]
+        return events[:count]
+
+
+def create_stream(total_events):
+    return [
+        (f'1000-{i}'.encode('utf-8'), {b'event': json.dumps({'id': i}).encode('utf-8')})
+        for i in range(total_events)
+    ]
+
+
+class TaskExportStreamContentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.redis_db = FakeStreamsRedis({'stream-a': create_stream(25), 'stream-b': create_stream(7), 'empty': []})
+        self.stream_factory = MagicMock()
+        self.stream_factory.redis_db = self.redis_db
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def create_task(self, actions, **kwargs):
+        return TaskExportStreamContent(
+            actions=actions,
+            stream_factory=self.stream_factory,
+            output_path=self.output_dir.name,
+            logging_level='ERROR',
+            **kwargs
+        )
+
+    def read_export(self, stream_key, compressed=False):
+        output_file = os.path.join(self.output_dir.name, f'export_{stream_key}.jl')
+        if compressed:
+            with gzip.open(output_file + '.gz', 'rt') as f:
+                return [json.loads(line) for line in f]
+        with open(output_file, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    def test_stream_is_exported_in_pages(self):
+        task = self.create_task([], page_size=10)
+        stats = task.stream_export('stream-a', os.path.join(self.output_dir.name, 'export_stream-a.jl'))
+        self.assertEqual(self.read_export('stream-a'), [{'id': i} for i in range(25)])
+        self.assertEqual(stats['total_events'], 25)
+        self.assertEqual([call[1] for call in self.redis_db.xrange_calls], ['-', '1000-10', '1000-20'])
+
+    def test_events_added_after_the_export_start_are_not_exported(self):
+        task = self.create_task([], page_size=10)
+        original_xrange = self.redis_db.xrange
+
+        def xrange_while_publishing(*args, **kwargs):
+            self.redis_db.streams['stream-b'].append((b'2000-0', {b'event': b'{"id": "late"}'}))
+            return original_xrange(*args, **kwargs)
+        self.redis_db.xrange = xrange_while_publishing
+        task.stream_export('stream-b', os.path.join(self.output_dir.name, 'export_stream-b.jl'))
+        self.assertEqual(self.read_export('stream-b'), [{'id': i} for i in range(7)])
+
+    def test_consecutive_exports_run_together(self):
+        actions = [
+            {'action': 'exportQueryStream', 'subscriber_id': 's', 'query_name': 'a', 'stream_key': 'stream-a'},
+            {'action': 'exportQueryStream', 'subscriber_id': 's', 'query_name': 'b', 'stream_key': 'stream-b'},
+            {'action': 'exportQueryStream', 'subscriber_id': 's', 'query_name': 'e', 'stream_key': 'empty'},
+        ]
+        task = self.create_task(actions, compression='gzip', export_workers=2)
+        task.execute_actions()
+        self.assertEqual(len(self.read_export('stream-a', compressed=True)), 25)
+        self.assertEqual(len(self.read_export('stream-b', compressed=True)), 7)
+        self.assertEqual(self.read_export('empty', compressed=True), [])
+        self.assertEqual({k: v['total_events'] for k, v in task.exports_stats.items()},
+                         {'stream-a': 25, 'stream-b': 7, 'empty': 0})
+        self.assertEqual(task.pending_exports, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import MagicMock
+
+from benchmark_tools.task_generator.task_wait_conditions import WaitConditionsTimeout
+from benchmark_tools.task_generator.wait_conditions import (
+    ElapsedTimeCondition,
+    WaitCondition,
+    evaluate_expression,
+    get_expression_conditions_names,
+)
+
+
+class WaitConditionsTestCase(unittest.TestCase):
+
+    def test_expression_conditions_names(self):
+        expression = {'any': [{'all': ['drained', {'not': 'busy'}]}, 'max_time']}
+        self.assertEqual(get_expression_conditions_names(expression), {'drained', 'busy', 'max_time'})
+        with self.assertRaises(Exception):
+            get_expression_conditions_names({'xor': ['a', 'b']})
+
+    def test_evaluate_expression(self):
+        expression = {'any': [{'all': ['drained', {'not': 'busy'}]}, 'max_time']}
+        self.assertTrue(evaluate_expression(expression, {'drained': True, 'busy': False, 'max_time': False}))
+        self.assertFalse(evaluate_expression(expression, {'drained': True, 'busy': True, 'max_time': False}))
+        self.assertTrue(evaluate_expression(expression, {'drained': False, 'busy': True, 'max_time': True}))
+
+    def test_retry_time_backs_off_while_the_result_does_not_change(self):
+        condition = WaitCondition('c', min_retry_time=1, max_retry_time=5, backoff_factor=2)
+        retry_times = [condition.get_retry_time(result) for result in [False, False, False, False, True, True]]
+        self.assertEqual(retry_times, [1, 2, 4, 5, 1, 2])
+
+    def test_elapsed_condition_is_checked_by_its_deadline(self):
+        condition = ElapsedTimeCondition('max_time', 3, max_retry_time=10)
+        self.assertFalse(condition.check())
+        self.assertLessEqual(condition.get_retry_time(False), 3)
+        condition = ElapsedTimeCondition('max_time', 0)
+        self.assertTrue(condition.check())
+
+
+class WaitConditionsTimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stream_factory = MagicMock()
+        self.task = WaitConditionsTimeout(
+            actions=[],
+            stream_factory=self.stream_factory,
+            logging_level='ERROR'
+        )
+
+    def test_wait_ends_when_the_expression_is_true(self):
+        self.stream_factory.redis_db.xlen.return_value = 0
+        wait_result = self.task.wait_conditions({
+            'conditions': {
+                'drained': {'type': 'stream_size', 'stream_keys': ['s1', 's2'], 'stream_size': 0},
+                'max_time': {'type': 'elapsed', 'seconds': 60},
+            },
+            'expression': {'any': ['drained', 'max_time']},
+            'forced_stop_timeout_limit': 10,
+        })
+        self.assertEqual(wait_result['ended_by'], ['drained'])
+        self.assertEqual(wait_result['conditions'], {'drained': True, 'max_time': False})
+
+    def test_wait_reports_the_condition_that_ended_it(self):
+        self.stream_factory.redis_db.xlen.return_value = 10
+        wait_result = self.task.wait_conditions({
+            'conditions': {
+                'drained': {'type': 'stream_size', 'stream_key': 's1', 'stream_size': 0},
+                'max_time': {'type': 'elapsed', 'seconds': 0.2},
+            },
+            'expression': {'any': ['drained', 'max_time']},
+            'min_retry_time': 0.05,
+            'forced_stop_timeout_limit': 10,
+        })
+        self.assertEqual(wait_result['ended_by'], ['max_time'])
+        self.assertLess(wait_result['total_wait'], 5)
+
+    def test_wait_ends_on_the_forced_stop_timeout_limit(self):
+        self.stream_factory.redis_db.xlen.return_value = 10
+        wait_result = self.task.wait_conditions({
+            'conditions': {'drained': {'type': 'stream_size', 'stream_key': 's1'}},
+            'expression': 'drained',
+            'min_retry_time': 0.05,
+            'forced_stop_timeout_limit': 0.2,
+        })
+        self.assertEqual(wait_result['ended_by'], ['forced_stop_timeout_limit'])
+
+    def test_undefined_and_unavailable_conditions(self):
+        with self.assertRaises(Exception):
+            self.task.wait_conditions({'conditions': {}, 'expression': 'drained'})
+        with self.assertRaises(Exception):
+            self.task.wait_conditions({
+                'conditions': {'idle': {'type': 'event_trace_timeout', 'service': 'S', 'operation': 'o',
+                                        'event_timeout': 1}},
+                'expression': 'idle',
+            })
+
+
+if __name__ == '__main__':
+    unittest.main()
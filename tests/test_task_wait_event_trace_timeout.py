@@ -0,0 +1,101 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from benchmark_tools.task_generator.task_wait_event_trace_timeout import WaitEventTraceTimeuot
+
+
+def parse_url_window(traces_url):
+    params = dict(param.split('=') for param in traces_url.split('?')[1].split('&') if '=' in param)
+    return int(params['start']), int(params['end']), int(params['limit'])
+
+
+class WaitEventTraceTimeuotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.task = WaitEventTraceTimeuot(
+            actions=[],
+            jaeger_api_host='http://jaeger:16686',
+            benchmark_start_time=1000,
+            logging_level='ERROR'
+        )
+        # traces on jaeger, by their start time in microseconds
+        self.traces_timestamps = {}
+        self.task.trace_source.iter_url_traces = MagicMock(side_effect=self.iter_url_traces)
+
+    def iter_url_traces(self, traces_url):
+        start, end, limit = parse_url_window(traces_url)
+        traces = [
+            {'traceID': trace_id, 'spans': []}
+            for trace_id, timestamp in sorted(self.traces_timestamps.items()) if start <= timestamp <= end
+        ]
+        return iter(traces[:limit])
+
+    def test_window_with_more_traces_than_the_limit_is_split(self):
+        self.traces_timestamps = {f't{i}': 100 + i for i in range(10)}
+        trace_ids = self.task.get_window_trace_ids('Service', 'op', 0, 1000, 3)
+        self.assertEqual(trace_ids, set(self.traces_timestamps.keys()))
+
+    def test_already_counted_traces_are_not_counted_again(self):
+        seen_trace_ids = set()
+        self.traces_timestamps = {'t1': 100, 't2': 200}
+        self.assertEqual(self.task.count_new_event_traces('Service', 'op', 0, 300, seen_trace_ids, 100), 2)
+        self.traces_timestamps['t3'] = 250
+        self.assertEqual(self.task.count_new_event_traces('Service', 'op', 150, 300, seen_trace_ids, 100), 1)
+        self.assertEqual(seen_trace_ids, {'t1', 't2', 't3'})
+
+    @patch('benchmark_tools.task_generator.task_wait_event_trace_timeout.time.sleep')
+    def test_polls_only_fetch_traces_after_the_watermark(self, mocked_sleep):
+        self.task.benchmark_start_time = time.time() - 60
+        polls = []
+
+        def add_traces_on_sleep(seconds):
+            # one new trace each poll
+            self.traces_timestamps[f't{len(polls)}'] = int(time.time() * 10**6)
+            polls.append(seconds)
+        mocked_sleep.side_effect = add_traces_on_sleep
+
+        self.task.wait_count_event_trace({
+            'service': 'Service',
+            'operation': 'op',
+            'wait_retry_time': 1,
+            'event_count': 3,
+            'forced_stop_timeout_limit': 5,
+            'watermark_overlap': 0,
+        })
+        self.assertEqual(len(polls), 3)
+        windows = [parse_url_window(call[0][0]) for call in self.task.trace_source.iter_url_traces.call_args_list]
+        self.assertEqual(windows[0][0], int(self.task.benchmark_start_time * 10**6))
+        self.assertGreater(windows[1][0], windows[0][0])
+        self.assertGreaterEqual(windows[1][0], windows[0][1] - 1)
+
+    @patch('benchmark_tools.task_generator.task_wait_event_trace_timeout.time.sleep')
+    def test_failed_poll_is_retried_on_the_same_window(self, mocked_sleep):
+        self.task.benchmark_start_time = time.time() - 60
+        self.traces_timestamps = {'t0': int((time.time() - 30) * 10**6), 't1': int((time.time() - 20) * 10**6)}
+        iter_url_traces = self.iter_url_traces
+        polls = []
+
+        def failing_first_poll(traces_url):
+            polls.append(parse_url_window(traces_url))
+            if len(polls) == 1:
+                raise requests.HTTPError('503 Server Error')
+            return iter_url_traces(traces_url)
+        self.task.trace_source.iter_url_traces = MagicMock(side_effect=failing_first_poll)
+
+        self.task.wait_count_event_trace({
+            'service': 'Service',
+            'operation': 'op',
+            'wait_retry_time': 1,
+            'event_count': 2,
+            'forced_stop_timeout_limit': 5,
+            'watermark_overlap': 0,
+        })
+        self.assertEqual(mocked_sleep.call_count, 2)
+        self.assertEqual(polls[0][0], polls[1][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+
+from benchmark_tools.task_generator.task_wait_redis_stream_size_timeout import WaitRedisStreamSizeTimeout
+
+
+class WaitRedisStreamSizeTimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stream_factory = MagicMock()
+        self.redis_db = self.stream_factory.redis_db
+        self.redis_db.xlen.return_value = 100
+        self.task = WaitRedisStreamSizeTimeout(
+            actions=[],
+            stream_factory=self.stream_factory,
+            logging_level='ERROR'
+        )
+
+    def test_backlog_is_the_consumer_group_lag(self):
+        self.redis_db.xinfo_groups.return_value = [
+            {'name': b'cg-other', 'last-delivered-id': b'1-0', 'lag': 1},
+            {'name': b'cg-stream-0', 'last-delivered-id': b'5-0', 'lag': 42},
+        ]
+        self.assertEqual(self.task.get_total_pending_cg_stream('stream-0', 0), 42)
+        self.redis_db.xrange.assert_not_called()
+        self.redis_db.xread.assert_not_called()
+
+    def test_backlog_without_lag_only_reads_up_to_the_target_size(self):
+        self.redis_db.xinfo_groups.return_value = [{'name': b'cg-stream-0', 'last-delivered-id': b'5-0'}]
+        self.redis_db.xrange.return_value = [(b'5-0', {}), (b'6-0', {}), (b'7-0', {})]
+        self.assertEqual(self.task.get_total_pending_cg_stream('stream-0', 1), 2)
+        self.redis_db.xrange.assert_called_once_with('stream-0', min=b'5-0', count=3)
+
+    def test_empty_stream_has_no_backlog(self):
+        self.redis_db.xlen.return_value = 0
+        self.assertEqual(self.task.get_total_pending_cg_stream('stream-0', 0), 0)
+        self.redis_db.xinfo_groups.assert_not_called()
+
+    def test_adaptive_wait_time_estimates_when_the_stream_size_is_reached(self):
+        ret = self.task.get_adaptive_wait_time(0, 100, 150, 0.5, 0.05, 5)
+        self.assertAlmostEqual(ret, 1)
+        ret = self.task.get_adaptive_wait_time(0, 100, 100, 0.5, 0.05, 5)
+        self.assertEqual(ret, 5)
+        ret = self.task.get_adaptive_wait_time(0, 100, None, 0, 0.05, 5)
+        self.assertEqual(ret, 0.05)
+
+    def test_adaptive_wait_stream_size_returns_as_soon_as_the_size_is_reached(self):
+        self.redis_db.xinfo_groups.return_value = [{'name': b'cg-stream-0', 'last-delivered-id': b'5-0', 'lag': 0}]
+        self.task.wait_stream_size({
+            'stream_key': 'stream-0',
+            'stream_size': 0,
+            'wait_retry_time': 60,
+            'forced_stop_timeout_limit': 120,
+            'wait_mode': 'adaptive',
+        })
+        self.assertEqual(self.redis_db.xinfo_groups.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
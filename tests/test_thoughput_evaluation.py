@@ -19,7 +19,7 @@ class ThroughputTestCase(unittest.TestCase):
             jaeger_api_host='jaeger_api_host'
         )
 
-    @patch('benchmark_tools.evaluation.throughput_evaluation.ThroughputEvaluation.get_traces')
+    @patch('benchmark_tools.traces.metrics_engine.TraceMetricsEngine.get_result')
     @patch('benchmark_tools.evaluation.throughput_evaluation.ThroughputEvaluation.calculate_throughput_metrics')
     @patch('benchmark_tools.evaluation.throughput_evaluation.ThroughputEvaluation.verify_thresholds')
     def test_run_should_call_necessary_functions(self, mocked_threshold, mocked_calculate, mocked_get):
@@ -28,13 +28,13 @@ class ThroughputTestCase(unittest.TestCase):
         self.assertTrue(mocked_calculate.called)
         self.assertTrue(mocked_get.called)
 
-    @patch('benchmark_tools.evaluation.throughput_evaluation.ThroughputEvaluation.get_initial_time')
-    @patch('benchmark_tools.evaluation.throughput_evaluation.ThroughputEvaluation.get_end_time')
-    def test_calculate_throughput_metrics_should_return_correctly(self, mocked_end, mocked_init):
-        traces = [{}, {}]
-        mocked_init.return_value = 1000000
-        mocked_end.return_value = 11000000
-        ret = self.evaluation.calculate_throughput_metrics(traces)
+    def test_calculate_throughput_metrics_should_return_correctly(self):
+        time_range = {
+            'total_traces': 2,
+            'first_start_time': 1000000,
+            'last_end_time': 11000000,
+        }
+        ret = self.evaluation.calculate_throughput_metrics(time_range)
 
         expected_ret = {
             'throughput_fps': 0.2,
@@ -42,91 +42,6 @@ class ThroughputTestCase(unittest.TestCase):
 
         self.assertDictEqual(ret, expected_ret)
 
-    def test_get_initial_time(self):
-        start_time1_a = 10**6
-        start_time1_b = start_time1_a + 1000
-
-        start_time2_a = start_time1_b + 2000
-        start_time2_b = start_time2_a + 1000
-
-        traces = [
-            {
-                'spans': [
-                    {'startTime': start_time1_a, 'duration': 1000},  # start time x
-                    {'some_other_span'},
-                    {'some_other_span'},
-                    {'some_other_span'},
-                    {'startTime': start_time1_b, 'duration': 2000},  # start time x+10.002 seconds
-                ]
-            },
-            {
-                'spans': [
-                    {'startTime': start_time2_a, 'duration': 1000},  # start time x
-                    {'some_other_span'},
-                    {'some_other_span'},
-                    {'some_other_span'},
-                    {'startTime': start_time2_b, 'duration': 2000},  # start time x+10.002 seconds
-                ]
-            }
-        ]
-        ret = self.evaluation.get_initial_time(traces)
-        self.assertEqual(ret, start_time1_a)
-
-    def test_get_end_time(self):
-        start_time1_a = 10**6
-        start_time1_b = start_time1_a + 1000
-
-        start_time2_a = start_time1_b + 2000
-        start_time2_b = start_time2_a + 1000
-        end_time = start_time2_b + 2000
-
-        traces = [
-            {
-                'spans': [
-                    {'startTime': start_time1_a, 'duration': 1000},  # start time x
-                    {'startTime': start_time1_b, 'duration': 2000},  # start time x+10.002 seconds
-                ]
-            },
-            {
-                'spans': [
-                    {'startTime': start_time2_a, 'duration': 1000},  # start time x
-                    {'startTime': start_time2_b, 'duration': 2000},  # start time x+10.002 seconds
-                ]
-            }
-        ]
-        ret = self.evaluation.get_end_time(traces)
-        self.assertEqual(ret, end_time)
-
-    def test_get_end_time_when_last_trace_is_not_last_processed(self):
-        start_time1_a = 10**6
-
-        start_time2_a = start_time1_a + 50
-
-        start_time1_b = start_time1_a + 1000
-
-        start_time2_b = start_time2_a + 1000
-
-        end_time = start_time1_b + 3000
-
-        # start_time2 will finish 950 before start_time1
-
-        traces = [
-            {
-                'spans': [
-                    {'startTime': start_time1_a, 'duration': 1000},  # start time x
-                    {'startTime': start_time1_b, 'duration': 3000},  # start time x+10.002 seconds
-                ]
-            },
-            {
-                'spans': [
-                    {'startTime': start_time2_a, 'duration': 1000},  # start time x
-                    {'startTime': start_time2_b, 'duration': 2000},  # start time x+10.002 seconds
-                ]
-            }
-        ]
-        ret = self.evaluation.get_end_time(traces)
-        self.assertEqual(ret, end_time)
-
     def tearDown(self):
         pass
 
@@ -0,0 +1,111 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from benchmark_tools.traces.trace_source import JaegerResponseTracesParser, JaegerTraceSource
+
+
+class JaegerResponseTracesParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.traces = [
+            {'traceID': f'trace-{i}', 'spans': [{'startTime': 1571981717759324 + i, 'duration': 1000 * i}]}
+            for i in range(20)
+        ]
+        self.response_json = json.dumps(
+            {'data': self.traces, 'total': 0, 'limit': 0, 'offset': 0, 'errors': None}, indent=1)
+
+    def split_in_chunks(self, text, chunk_size):
+        return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    def test_parser_yields_all_traces_for_any_chunk_size(self):
+        for chunk_size in [1, 7, 64, len(self.response_json)]:
+            chunks = self.split_in_chunks(self.response_json, chunk_size)
+            ret = list(JaegerResponseTracesParser(chunks))
+            self.assertListEqual(ret, self.traces)
+
+    def test_parser_handles_data_after_other_keys_and_empty_data(self):
+        chunks = self.split_in_chunks('{"total": 12345, "data": [{"traceID": "a"}], "errors": null}', 3)
+        self.assertListEqual(list(JaegerResponseTracesParser(chunks)), [{'traceID': 'a'}])
+        self.assertListEqual(list(JaegerResponseTracesParser(['{"data": []}'])), [])
+        self.assertListEqual(list(JaegerResponseTracesParser(['{"data": null}'])), [])
+
+    def test_parser_raises_error_on_truncated_response(self):
+        chunks = self.split_in_chunks(self.response_json[:-40], 10)
+        with self.assertRaises(Exception):
+            list(JaegerResponseTracesParser(chunks))
+
+
+class JaegerTraceSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.source = JaegerTraceSource(slice_seconds=10, max_workers=2, max_queued_traces=2, logging_level='ERROR')
+
+    def test_get_time_slices_dont_overlap_and_cover_window(self):
+        ret = self.source.get_time_slices(0, 25 * 10**6)
+        expected = [(0, 10**7 - 1), (10**7, 2 * 10**7 - 1), (2 * 10**7, 25 * 10**6)]
+        self.assertListEqual(ret, expected)
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_iter_traces_yields_each_trace_only_from_the_slice_of_its_earliest_span(self, mocked_iter):
+        def trace(trace_id, *starts):
+            return {'traceID': trace_id, 'spans': [{'startTime': start} for start in starts]}
+        slices_traces = {
+            # "z" starts before the first slice and "e" after the last one, but they still have spans inside them
+            'slice1': [trace('z', -5, 2), trace('a', 1), trace('b', 5), trace('c', 12, 8)],
+            'slice2': [trace('c', 8, 12), trace('d', 15), trace('e', 25, 19)],
+        }
+        mocked_iter.side_effect = lambda url: iter(slices_traces[url])
+        stats = {}
+        ret = list(self.source.iter_traces(['slice1', 'slice2'], stats=stats, time_slices=[(0, 9), (10, 20)]))
+        self.assertListEqual(sorted(t['traceID'] for t in ret), ['a', 'b', 'c', 'd', 'e', 'z'])
+        self.assertEqual(stats['total_traces'], 6)
+        self.assertEqual(stats['total_slices'], 2)
+        self.assertIn('rss_growth_kb', stats)
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_iter_traces_keeps_traces_only_returned_by_the_slice_of_their_query_span(self, mocked_iter):
+        def trace(trace_id, *spans):
+            return {
+                'traceID': trace_id,
+                'processes': {'p1': {'serviceName': 'ClientManager'}, 'p2': {'serviceName': 'Scheduler'}},
+                'spans': [
+                    {'processID': process_id, 'operationName': operation, 'startTime': start, 'tags': tags}
+                    for process_id, operation, start, tags in spans
+                ],
+            }
+        query_span = ('p2', 'process_data_event', 12, [{'key': 'event', 'value': 'data'}])
+        other_span = ('p2', 'process_data_event', 3, [{'key': 'event', 'value': 'other'}])
+        # "a" starts on the first slice (upstream span and a span with other tags), but only the second slice
+        # has its query span, so only the second slice returns it
+        slices_traces = {
+            'slice1': [],
+            'slice2': [trace('a', ('p1', 'publish', 5, []), other_span, query_span)],
+        }
+        mocked_iter.side_effect = lambda url: iter(slices_traces[url])
+        span_query = {'service': 'Scheduler', 'operation': 'process_data_event', 'tags': {'event': 'data'}}
+        ret = list(self.source.iter_traces(
+            ['slice1', 'slice2'], time_slices=[(0, 9), (10, 20)], span_query=span_query))
+        self.assertListEqual([t['traceID'] for t in ret], ['a'])
+
+    @patch('benchmark_tools.traces.trace_source.requests.get')
+    def test_iter_url_traces_uses_the_request_timeouts(self, mocked_get):
+        source = JaegerTraceSource(connect_timeout=3, read_timeout=30, logging_level='ERROR')
+        response = mocked_get.return_value.__enter__.return_value
+        response.encoding = 'utf-8'
+        response.iter_content.return_value = iter([b'{"data": [{"traceID": "a"}]}'])
+        self.assertListEqual(list(source.iter_url_traces('url')), [{'traceID': 'a'}])
+        mocked_get.assert_called_once_with('url', stream=True, timeout=(3, 30))
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_iter_traces_raises_slice_errors(self, mocked_iter):
+        def failing_iter(url):
+            yield {'traceID': 'a'}
+            raise ValueError('broken response')
+        mocked_iter.side_effect = failing_iter
+        with self.assertRaises(ValueError):
+            list(self.source.iter_traces(['slice1']))
+
+
+if __name__ == '__main__':
+    unittest.main()
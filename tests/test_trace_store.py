@@ -0,0 +1,96 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from benchmark_tools.traces.trace_store import JaegerTraceStore
+
+
+class JaegerTraceStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = JaegerTraceStore(cache_dir=self.cache_dir, logging_level='ERROR')
+        self.trace_a = {'traceID': 'a', 'spans': [{'startTime': 1, 'duration': 1}], 'processes': {}}
+        self.trace_b = {'traceID': 'b', 'spans': [{'startTime': 2, 'duration': 1}], 'processes': {}}
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_get_traces_fetches_each_query_only_once(self, mocked_fetch):
+        mocked_fetch.side_effect = lambda url: iter([self.trace_a, self.trace_b])
+        ret1 = self.store.get_traces('host', service='Scheduler', operation='process_data_event')
+        ret2 = self.store.get_traces('host', service='Scheduler', operation='process_data_event')
+        self.assertEqual(mocked_fetch.call_count, 1)
+        self.assertListEqual(ret1, [self.trace_a, self.trace_b])
+        self.assertListEqual(ret2, ret1)
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_get_traces_deduplicates_traces_across_queries(self, mocked_fetch):
+        bigger_trace_a = dict(self.trace_a, spans=self.trace_a['spans'] * 2)
+        mocked_fetch.side_effect = [iter([self.trace_a]), iter([bigger_trace_a, self.trace_b])]
+        self.store.get_traces('host', service='Forwarder', operation='tracer_injection')
+        ret = self.store.get_traces('host', service='Scheduler')
+        self.assertEqual(len(self.store.traces_by_id), 2)
+        self.assertIs(ret[0], bigger_trace_a)
+        self.assertIs(self.store.get_traces('host', service='Forwarder', operation='tracer_injection')[0], bigger_trace_a)
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_get_traces_reuses_disk_cache_on_new_store(self, mocked_fetch):
+        mocked_fetch.side_effect = lambda url: iter([self.trace_a, self.trace_b])
+        list(self.store.iter_traces('host', service='Scheduler', tags={'a': 'b'}))
+        other_store = pickle.loads(pickle.dumps(self.store))
+        ret = other_store.get_traces('host', service='Scheduler', tags={'a': 'b'})
+        self.assertEqual(mocked_fetch.call_count, 1)
+        self.assertListEqual(ret, [self.trace_a, self.trace_b])
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_iter_traces_doesnt_cache_partially_consumed_traces(self, mocked_fetch):
+        mocked_fetch.side_effect = lambda url: iter([self.trace_a, self.trace_b])
+        traces = self.store.iter_traces('host', service='Scheduler')
+        next(traces)
+        traces.close()
+        ret = list(self.store.iter_traces('host', service='Scheduler'))
+        self.assertEqual(mocked_fetch.call_count, 2)
+        self.assertListEqual(ret, [self.trace_a, self.trace_b])
+
+    @patch('benchmark_tools.traces.trace_source.JaegerTraceSource.iter_url_traces')
+    def test_get_span_table_builds_each_query_table_only_once(self, mocked_fetch):
+        trace_c = {
+            'traceID': 'c',
+            'spans': [{'startTime': 3, 'duration': 2, 'processID': 'p1', 'operationName': 'op'}],
+            'processes': {'p1': {'serviceName': 'Scheduler'}}
+        }
+        mocked_fetch.side_effect = lambda url: iter([trace_c])
+        ret1 = self.store.get_span_table('host', service='Scheduler')
+        ret2 = self.store.get_span_table('host', service='Scheduler')
+        self.assertEqual(mocked_fetch.call_count, 1)
+        self.assertIs(ret1, ret2)
+        self.assertListEqual(ret1.trace_ids, ['c'])
+        self.assertListEqual(ret1.end_time.tolist(), [5])
+
+    def test_get_query_url(self):
+        query_key = self.store.get_query_key(
+            'http://host', service='ClientManager', operation='process_action', tags={'a': 'b'}, lookback='10h')
+        ret = self.store.get_query_url(query_key)
+        expected = (
+            'http://host/api/traces?limit=700000000&lookback=10h&maxDuration&minDuration&'
+            'service=ClientManager&operation=process_action&tags={"a": "b"}'
+        )
+        self.assertEqual(ret, expected)
+
+    def test_get_query_url_uses_benchmark_time_window_instead_of_lookback(self):
+        store = JaegerTraceStore(start_time=1600000000.5, end_time=1600000090.25, logging_level='ERROR')
+        query_key = store.get_query_key('http://host', service='Forwarder', operation='tracer_injection')
+        ret = store.get_query_url(query_key)
+        expected = (
+            'http://host/api/traces?limit=700000000&start=1600000000500000&end=1600000090250000&'
+            'maxDuration&minDuration&service=Forwarder&operation=tracer_injection'
+        )
+        self.assertEqual(ret, expected)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()